@@ -0,0 +1,170 @@
+"""
+Incrementally maintained page and link stats.
+
+``UserPageStats`` keeps each user's pages per status and total links, and
+``UserDomainCount`` how many of those links point to each domain, so the
+stats panel reads a handful of rows whatever the size of ``PageLink``:
+
+- status totals move in ``ScrapedPage.save()``, the manager's
+  ``bulk_create()`` and ``update_status()``
+- each scrape computes its page's domain histogram from the links it
+  extracted, in memory, and applies the difference from the previous one
+  to the user's links and domain totals
+- deleting a page takes its status and histogram back out
+
+Updates are deltas applied in the transaction that makes the change, so a
+crash or a race between writers can leave totals off; the
+``rebuild_page_stats`` command recomputes them from the stored pages and
+links.
+"""
+from collections import Counter
+from urllib.parse import urlsplit
+from django.db import transaction
+from django.db.models import Count, Sum, OuterRef, Subquery
+from django.utils import timezone
+from .models import (
+    ScrapedPage, PageLink, PageDomainCount, UserDomainCount, UserPageStats,
+)
+from .linkstore import CompactLinkList
+from .constants import ScrapingStatus, LinkStorage, LINK_BATCH_SIZE, TOP_DOMAINS
+
+
+def link_domain(url):
+    """The host a link points to, or blank for links without one"""
+    try:
+        return (urlsplit(url).hostname or '')[:255]
+    except ValueError:
+        return ''
+
+
+def domain_histogram(urls):
+    """Counter of links per domain"""
+    return Counter(link_domain(url) for url in urls)
+
+
+def adjust_user_domains(user_id, changes):
+    """Add a {domain: change} mapping to a user's domain totals"""
+    changes = {domain: change for domain, change in changes.items() if change}
+    if not changes:
+        return
+    with transaction.atomic():
+        # Lock in a fixed order so concurrent scrapes of one user cannot deadlock
+        existing = {
+            row.domain: row for row in UserDomainCount.objects.select_for_update().filter(
+                user_id=user_id, domain__in=list(changes)).order_by('domain')
+        }
+        for domain, row in existing.items():
+            row.link_count += changes[domain]
+        UserDomainCount.objects.bulk_update(
+            [row for row in existing.values() if row.link_count > 0], ['link_count'],
+            batch_size=LINK_BATCH_SIZE)
+        UserDomainCount.objects.filter(
+            pk__in=[row.pk for row in existing.values() if row.link_count <= 0]).delete()
+        UserDomainCount.objects.bulk_create(
+            (UserDomainCount(user_id=user_id, domain=domain, link_count=change)
+             for domain, change in changes.items() if domain not in existing and change > 0),
+            batch_size=LINK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def record_link_domains(page, links):
+    """
+    Replace a page's domain histogram with that of the links a scrape just
+    stored, and move its user's totals by the difference
+    """
+    histogram = domain_histogram(links)
+    with transaction.atomic():
+        previous = Counter(dict(PageDomainCount.objects.filter(
+            page=page).values_list('domain', 'link_count')))
+        PageDomainCount.objects.filter(page=page).delete()
+        PageDomainCount.objects.bulk_create(
+            (PageDomainCount(page=page, domain=domain, link_count=count)
+             for domain, count in histogram.items()),
+            batch_size=LINK_BATCH_SIZE,
+        )
+        if ScrapedPage.objects.filter(pk=page.pk).exists():
+            changes = Counter(histogram)
+            changes.subtract(previous)
+            adjust_user_domains(page.user_id, changes)
+            UserPageStats.objects.adjust(
+                page.user_id, links=sum(histogram.values()) - sum(previous.values()))
+    return histogram
+
+
+def forget_pages(user_id, pages):
+    """Take deleted pages, as (id, status) pairs, out of their user's totals"""
+    page_ids = [pk for pk, status in pages]
+    histogram = dict(
+        PageDomainCount.objects.filter(page_id__in=page_ids).values_list(
+            'domain').annotate(total=Sum('link_count')).order_by()
+    )
+    statuses = Counter()
+    statuses.subtract(status for pk, status in pages)
+    UserPageStats.objects.adjust(user_id, statuses, links=-sum(histogram.values()))
+    adjust_user_domains(user_id, {domain: -count for domain, count in histogram.items()})
+
+
+def get_page_stats(user, top=TOP_DOMAINS):
+    """A user's totals and most linked domains, read from the aggregates"""
+    stats = UserPageStats.objects.filter(user=user).first() or UserPageStats(user=user)
+    domains = list(UserDomainCount.objects.filter(user=user).exclude(domain='').order_by(
+        '-link_count').values_list('domain', 'link_count')[:top])
+    return stats, domains
+
+
+def histogram_link_total():
+    """
+    Expression for a page's stored links as counted by its domain
+    histogram; None for pages with no links or not scraped since
+    histograms were added
+    """
+    return Subquery(
+        PageDomainCount.objects.filter(page=OuterRef('pk')).order_by().values(
+            'page').annotate(total=Sum('link_count')).values('total')
+    )
+
+
+def stored_link_urls(page):
+    """URLs of the links stored for a page, in either storage"""
+    if page.link_storage == LinkStorage.COMPACT:
+        return (link.url for link in CompactLinkList(page))
+    return PageLink.objects.filter(page=page).values_list(
+        'url', flat=True).iterator(chunk_size=LINK_BATCH_SIZE)
+
+
+def rebuild_user_stats(user, histograms=True):
+    """
+    Recompute a user's totals from their pages, and with histograms each
+    page's domain histogram from its stored links, which scans them all
+    """
+    pages = ScrapedPage.objects.filter(user=user)
+    if histograms:
+        for page in pages.only('pk', 'link_storage').order_by('pk').iterator():
+            counts = domain_histogram(stored_link_urls(page))
+            with transaction.atomic():
+                PageDomainCount.objects.filter(page=page).delete()
+                PageDomainCount.objects.bulk_create(
+                    (PageDomainCount(page=page, domain=domain, link_count=count)
+                     for domain, count in counts.items()),
+                    batch_size=LINK_BATCH_SIZE,
+                )
+
+    statuses = dict(pages.values_list('status').annotate(total=Count('pk')).order_by())
+    domains = dict(
+        PageDomainCount.objects.filter(page__user=user, page__deleted_at__isnull=True)
+        .values_list('domain').annotate(total=Sum('link_count')).order_by()
+    )
+    with transaction.atomic():
+        UserPageStats.objects.update_or_create(user=user, defaults=dict(
+            {status: statuses.get(status, 0) for status in ScrapingStatus.CHOICES},
+            links=sum(domains.values()),
+            updated_at=timezone.now(),
+        ))
+        UserDomainCount.objects.filter(user=user).delete()
+        UserDomainCount.objects.bulk_create(
+            (UserDomainCount(user=user, domain=domain, link_count=count)
+             for domain, count in domains.items() if count > 0),
+            batch_size=LINK_BATCH_SIZE,
+        )
+    return statuses, domains
@@ -0,0 +1,121 @@
+"""
+Helpers for the read-only JSON API: cursors, sparse fieldsets and filters
+"""
+import base64
+import binascii
+import json
+from django.utils.dateparse import parse_datetime
+from .constants import API_PAGE_SIZE, API_MAX_PAGE_SIZE
+
+
+class ApiError(ValueError):
+    """Raised when a query parameter is invalid"""
+
+
+def encode_cursor(last_id):
+    """Encode the last seen primary key as an opaque cursor"""
+    payload = json.dumps({'id': last_id}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into the last seen primary key"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return int(payload['id'])
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeEncodeError):
+        raise ApiError('Invalid cursor.')
+
+
+def parse_fields(value, allowed, default):
+    """Parse a comma separated ?fields= list against the allowed field names"""
+    if not value:
+        return list(default)
+
+    fields = []
+    for field in value.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        if field not in allowed:
+            raise ApiError(f'Unknown field: {field}')
+        if field not in fields:
+            fields.append(field)
+    return fields or list(default)
+
+
+def parse_limit(value):
+    """Parse the page size, clamped to the configured maximum"""
+    if not value:
+        return API_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ApiError('Invalid limit.')
+    if limit < 1:
+        raise ApiError('Invalid limit.')
+    return min(limit, API_MAX_PAGE_SIZE)
+
+
+def parse_since(value):
+    """Parse an ISO 8601 updated-since timestamp"""
+    if not value:
+        return None
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        since = None
+    if since is None:
+        raise ApiError('Invalid updated_since timestamp.')
+    return since
+
+
+def paginate(queryset, fields, cursor, limit, descending=False):
+    """
+    Keyset paginate a queryset by primary key and return only the requested
+    columns, fetching a single extra row to know whether there is a next page
+    """
+    if cursor:
+        last_id = decode_cursor(cursor)
+        lookup = 'pk__lt' if descending else 'pk__gt'
+        queryset = queryset.filter(**{lookup: last_id})
+
+    columns = ['id'] + [field for field in fields if field != 'id']
+    rows = list(
+        queryset.order_by('-pk' if descending else 'pk')
+        .values_list(*columns)[:limit + 1]
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0])
+
+    results = []
+    for row in rows:
+        item = dict(zip(columns, row))
+        results.append({field: item[field] for field in fields})
+
+    return {'results': results, 'next_cursor': next_cursor}
+
+
+def paginate_compact_links(links, fields, cursor, limit):
+    """
+    Paginate a compact link set the same way as link rows, using the
+    1-based position in the sorted set as the link id
+    """
+    start = decode_cursor(cursor) if cursor else 0
+    window = links[start:start + limit + 1]
+
+    next_cursor = None
+    if len(window) > limit:
+        window = window[:limit]
+        next_cursor = encode_cursor(start + limit)
+
+    results = []
+    for position, link in enumerate(window, start=start + 1):
+        item = {'id': position, 'url': link.url, 'name': link.name,
+                'created_at': None}
+        results.append({field: item[field] for field in fields})
+
+    return {'results': results, 'next_cursor': next_cursor}
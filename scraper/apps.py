@@ -1,6 +1,30 @@
+from importlib import import_module
 from django.apps import AppConfig
 
 
+def preload_worker_modules(**kwargs):
+    """Import the scraping stack in the worker's parent, before the pool forks"""
+    from .constants import WORKER_PRELOAD_MODULES
+
+    for module in WORKER_PRELOAD_MODULES:
+        import_module(module)
+
+
 class ScraperConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scraper'
+
+    def ready(self):
+        from celery import signals as celery_signals
+        from django.core import signals as request_signals
+        from django.db.backends.signals import connection_created
+        from . import connections
+
+        connection_created.connect(connections.record_connection_opened)
+        request_signals.request_started.connect(connections.on_request_started)
+        request_signals.request_finished.connect(connections.on_request_finished)
+        celery_signals.worker_init.connect(connections.on_worker_init)
+        celery_signals.worker_init.connect(preload_worker_modules)
+        celery_signals.worker_process_init.connect(connections.on_worker_process_init)
+        celery_signals.task_prerun.connect(connections.on_task_prerun)
+        celery_signals.task_postrun.connect(connections.on_task_postrun)
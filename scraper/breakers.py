@@ -0,0 +1,125 @@
+"""
+Per-host circuit breakers shared by every worker through Redis.
+
+A host's circuit is closed while fetches succeed. After
+``CIRCUIT_FAILURE_THRESHOLD`` transient failures (timeouts, connection
+errors, 5xx, 429) within ``CIRCUIT_FAILURE_WINDOW`` seconds it opens: for
+``CIRCUIT_OPEN_SECONDS`` no request is sent to the host and scrapes are
+deferred instead of tying up a worker until they time out. It then turns
+half-open, letting exactly one probe request through; the probe's outcome
+closes the circuit again or re-opens it.
+
+Redis keys per host, under ``CIRCUIT_KEY_PREFIX``:
+
+- ``<host>:failures``: recent transient failures, expiring with the window
+- ``<host>:open``: present while the circuit is open, expiring when it turns half-open
+- ``<host>:tripped``: present while the circuit is open or half-open
+- ``<host>:probe``: taken (SET NX) by the one request probing a half-open host
+
+If Redis is unreachable every circuit counts as closed.
+"""
+import logging
+import redis
+from django.conf import settings
+from .retries import classify_failure
+from .connections import redis_client
+from .constants import (
+    FailureClass, CIRCUIT_KEY_PREFIX, CIRCUIT_PROBE_TIMEOUT, CIRCUIT_TRIPPED_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """No request was made: the host's circuit is open"""
+
+    def __init__(self, host, retry_in):
+        super().__init__(f'Circuit open for {host}, retrying in {retry_in}s')
+        self.host = host
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, host, client=None):
+        self.host = host
+        self.client = client or redis_client()
+        self.key = f'{CIRCUIT_KEY_PREFIX}{host}:'
+
+    def state(self):
+        if self.client.exists(self.key + 'open'):
+            return CircuitState.OPEN
+        if self.client.exists(self.key + 'tripped'):
+            return CircuitState.HALF_OPEN
+        return CircuitState.CLOSED
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request to the host may be sent now"""
+        try:
+            retry_in = self.client.ttl(self.key + 'open')
+            if retry_in > 0:
+                raise CircuitOpenError(self.host, retry_in)
+            if self.client.exists(self.key + 'tripped') and not self.client.set(
+                    self.key + 'probe', 1, nx=True, ex=CIRCUIT_PROBE_TIMEOUT):
+                # Another worker is probing; its outcome decides for everyone
+                retry_in = max(self.client.ttl(self.key + 'probe'), 1)
+                raise CircuitOpenError(self.host, retry_in)
+        except redis.RedisError as e:
+            logger.debug(f"Circuit breaker unavailable for {self.host}: {str(e)}")
+
+    def record(self, exc=None):
+        """Feed the outcome of a request: None for a response, else the exception"""
+        try:
+            if exc is not None and classify_failure(exc).failure_class == FailureClass.TRANSIENT:
+                self.record_failure()
+            else:
+                # Any answer, even a 404, shows the host is up
+                self.client.delete(self.key + 'failures', self.key + 'tripped', self.key + 'probe')
+        except redis.RedisError as e:
+            logger.debug(f"Circuit breaker unavailable for {self.host}: {str(e)}")
+
+    def record_failure(self):
+        if self.client.exists(self.key + 'tripped'):
+            # A failed probe re-opens the circuit
+            self.trip()
+            return
+        pipe = self.client.pipeline()
+        pipe.incr(self.key + 'failures')
+        pipe.expire(self.key + 'failures', settings.CIRCUIT_FAILURE_WINDOW, nx=True)
+        failures = pipe.execute()[0]
+        if failures >= settings.CIRCUIT_FAILURE_THRESHOLD:
+            self.trip()
+
+    def trip(self):
+        logger.warning(
+            f"Opening circuit for {self.host} for {settings.CIRCUIT_OPEN_SECONDS}s")
+        pipe = self.client.pipeline()
+        pipe.set(self.key + 'open', 1, ex=settings.CIRCUIT_OPEN_SECONDS)
+        pipe.set(self.key + 'tripped', 1, ex=CIRCUIT_TRIPPED_TTL)
+        pipe.delete(self.key + 'failures', self.key + 'probe')
+        pipe.execute()
+
+
+def get_tripped_circuits(client=None):
+    """Return the hosts whose circuit is open or half-open as a list of rows"""
+    try:
+        client = client or redis_client()
+        suffix = ':tripped'
+        rows = []
+        for key in sorted(client.scan_iter(match=f'{CIRCUIT_KEY_PREFIX}*{suffix}')):
+            host = key.decode()[len(CIRCUIT_KEY_PREFIX):-len(suffix)]
+            retry_in = client.ttl(f'{CIRCUIT_KEY_PREFIX}{host}:open')
+            rows.append({
+                'host': host,
+                'state': CircuitState.OPEN if retry_in > 0 else CircuitState.HALF_OPEN,
+                'retry_in': max(retry_in, 0),
+            })
+        return rows
+    except redis.RedisError as e:
+        logger.warning(f"Could not read circuit breakers: {str(e)}")
+        return []
@@ -0,0 +1,103 @@
+"""
+Decoding fetched pages to text before they are parsed.
+
+Handing BeautifulSoup raw bytes makes it run UnicodeDammit, which guesses
+the encoding with statistical detection over the whole document whenever
+the page does not declare it in a ``<meta>`` tag, including pages whose
+``Content-Type`` header already names it. Pages are decoded here
+instead, taking the first of:
+
+- a byte order mark
+- the ``charset`` of the ``Content-Type`` header
+- a ``<meta>`` declaration in the first ``CHARSET_SNIFF_BYTES`` bytes
+- full detection by UnicodeDammit
+
+A declared encoding is only used if the page decodes with it without
+errors; otherwise the next source is tried, so a wrong declaration costs
+a failed decode but never garbles the page.
+"""
+import codecs
+import re
+import time
+from collections import namedtuple
+from bs4 import UnicodeDammit
+from .constants import CharsetSource, CHARSET_SNIFF_BYTES
+
+DecodedPage = namedtuple('DecodedPage', ['text', 'encoding', 'source', 'seconds'])
+
+# Longest first, so a UTF-32 BOM is not read as a UTF-16 one
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Browsers decode pages labelled Latin-1 or ASCII as windows-1252, and
+# servers rely on it
+LEGACY_ENCODINGS = {'iso8859-1': 'cp1252', 'ascii': 'cp1252'}
+
+CONTENT_TYPE_CHARSET = re.compile(r';\s*charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+# <meta charset="..."> and <meta http-equiv="Content-Type" content="...; charset=...">
+META_CHARSET = re.compile(rb'<meta[^>]*?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+def normalize_encoding(label):
+    """Python's codec name for an encoding label, or None if it is unknown"""
+    if isinstance(label, bytes):
+        label = label.decode('ascii', 'replace')
+    try:
+        name = codecs.lookup(label.strip()).name
+    except LookupError:
+        return None
+    return LEGACY_ENCODINGS.get(name, name)
+
+
+def header_encoding(content_type):
+    match = CONTENT_TYPE_CHARSET.search(content_type or '')
+    return normalize_encoding(match.group(1)) if match else None
+
+
+def bom_encoding(data):
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
+            return encoding
+    return None
+
+
+def meta_encoding(data):
+    match = META_CHARSET.search(data, 0, CHARSET_SNIFF_BYTES)
+    if match is None:
+        return None
+    encoding = normalize_encoding(match.group(1))
+    # A document that could be searched as ASCII is not UTF-16 or UTF-32,
+    # whatever it says
+    if encoding and encoding.startswith(('utf-16', 'utf-32')):
+        return 'utf-8'
+    return encoding
+
+
+def decode_html(data, content_type=None):
+    """Decode a fetched page, using the cheapest source that names its encoding"""
+    start = time.perf_counter()
+    for source, find_encoding in (
+            (CharsetSource.BOM, lambda: bom_encoding(data)),
+            (CharsetSource.HEADER, lambda: header_encoding(content_type)),
+            (CharsetSource.META, lambda: meta_encoding(data))):
+        encoding = find_encoding()
+        if encoding is None:
+            continue
+        try:
+            text = data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+        return DecodedPage(text, encoding, source, time.perf_counter() - start)
+
+    dammit = UnicodeDammit(data, is_html=True)
+    if dammit.unicode_markup is None:
+        text, encoding = data.decode('utf-8', 'replace'), 'utf-8'
+    else:
+        text = dammit.unicode_markup
+        encoding = normalize_encoding(dammit.original_encoding or 'utf-8')
+    return DecodedPage(text, encoding, CharsetSource.DETECTED, time.perf_counter() - start)
@@ -0,0 +1,205 @@
+"""
+Database connection lifecycle for web processes and Celery workers.
+
+Each process counts, per database alias, how many connections it opened and
+how many requests or tasks started on an already open connection. The
+counters are published to Redis every few seconds so the queue status page
+can show them for every web process and pool child, which is what the
+persistent connection and pool sizes should be tuned against.
+
+Between Celery tasks connections are only closed when they are broken or
+older than ``CONN_MAX_AGE``, never unconditionally, except under green-thread
+pools (gevent, eventlet). There every task runs in a new greenlet with its
+own connections, so they are closed when the task ends and, through
+``release_connections``, while the task waits on the network, so a worker
+running hundreds of greenlets holds only as many connections as are
+actually querying.
+"""
+import json
+import logging
+from importlib import import_module
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+import redis
+from django.conf import settings
+from django.db import connections
+from .constants import (
+    CONNECTION_STATS_INTERVAL, CONNECTION_STATS_KEY_PREFIX, CONNECTION_STATS_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters = defaultdict(lambda: {'opened': 0, 'reused': 0})
+_last_published = 0.0
+_role = 'web'
+_green_pool = None
+_client_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+GREEN_POOLS = ('gevent', 'eventlet')
+
+
+def redis_client():
+    """
+    A Redis client shared by the threads of this process, created again
+    after a fork, for state read or written on every scrape
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = redis.Redis.from_url(
+                settings.REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+            _client_pid = os.getpid()
+        return _client
+
+
+def connection_counters():
+    """Return a copy of this process's counters keyed by database alias"""
+    with _lock:
+        return {alias: dict(counts) for alias, counts in _counters.items()}
+
+
+def reset_connection_counters():
+    global _last_published
+    with _lock:
+        _counters.clear()
+        _last_published = 0.0
+
+
+def record_connection_opened(sender, connection, **kwargs):
+    """``connection_created`` receiver: a new connection was opened"""
+    with _lock:
+        _counters[connection.alias]['opened'] += 1
+
+
+def record_reused_connections():
+    """Count the aliases that already hold an open connection"""
+    for conn in connections.all(initialized_only=True):
+        if conn.connection is not None:
+            with _lock:
+                _counters[conn.alias]['reused'] += 1
+
+
+def recycle_connections():
+    """Close only the connections that are broken or past CONN_MAX_AGE"""
+    for conn in connections.all(initialized_only=True):
+        conn.close_if_unusable_or_obsolete()
+
+
+def publish_connection_stats(force=False):
+    """Store this process's counters in Redis, at most every few seconds"""
+    global _last_published
+    now = time.monotonic()
+    with _lock:
+        if not force and now - _last_published < CONNECTION_STATS_INTERVAL:
+            return
+        _last_published = now
+
+    key = f'{CONNECTION_STATS_KEY_PREFIX}{_role}:{socket.gethostname()}:{os.getpid()}'
+    try:
+        client = redis_client()
+        client.set(key, json.dumps(connection_counters()), ex=CONNECTION_STATS_TTL)
+    except redis.RedisError as e:
+        logger.debug(f"Could not publish connection stats: {str(e)}")
+
+
+def green_pool_name(pool_cls):
+    """'gevent' or 'eventlet' for a green-thread worker pool, else None"""
+    name = pool_cls if isinstance(pool_cls, str) else pool_cls.__module__
+    return next((pool for pool in GREEN_POOLS if pool in name), None)
+
+
+def release_connections():
+    """
+    Under a green-thread pool, close this greenlet's connections before a
+    long network wait; they are reopened by the next query
+    """
+    if _green_pool is None:
+        return
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            conn.close()
+
+
+def get_connection_stats():
+    """
+    Return the published counters of all live processes as a list of rows
+    """
+    try:
+        client = redis_client()
+        keys = sorted(client.scan_iter(match=f'{CONNECTION_STATS_KEY_PREFIX}*'))
+        values = client.mget(keys) if keys else []
+    except redis.RedisError as e:
+        logger.warning(f"Could not read connection stats: {str(e)}")
+        return []
+
+    rows = []
+    for key, value in zip(keys, values):
+        if value is None:
+            continue
+        process = key.decode()[len(CONNECTION_STATS_KEY_PREFIX):]
+        for alias, counts in sorted(json.loads(value).items()):
+            checkouts = counts['opened'] + counts['reused']
+            rows.append({
+                'process': process,
+                'database': alias,
+                'opened': counts['opened'],
+                'reused': counts['reused'],
+                'reuse_ratio': counts['reused'] / checkouts if checkouts else 0,
+            })
+    return rows
+
+
+def on_request_started(**kwargs):
+    # Django's own close_old_connections receiver runs first, so expired
+    # connections are already closed and not counted as reused.
+    record_reused_connections()
+
+
+def on_request_finished(**kwargs):
+    publish_connection_stats()
+
+
+def on_worker_init(sender=None, **kwargs):
+    global _role, _green_pool
+    _role = 'worker'
+    _green_pool = green_pool_name(sender.pool_cls) if sender is not None else None
+    if _green_pool is None:
+        return
+    # psycopg2 blocks the whole event loop while it waits on the server
+    # unless its wait callback yields to other greenlets
+    try:
+        import_module(f'psycogreen.{_green_pool}').patch_psycopg()
+    except ImportError:
+        logger.warning(
+            f"psycogreen is not installed, database calls will block the {_green_pool} hub")
+
+
+def on_worker_process_init(**kwargs):
+    # Pool children start with the counters inherited from the parent
+    reset_connection_counters()
+
+
+def on_task_prerun(task=None, **kwargs):
+    # Eager tasks run inside the caller's request and its transaction
+    if getattr(task.request, 'is_eager', False):
+        return
+    recycle_connections()
+    record_reused_connections()
+
+
+def on_task_postrun(task=None, **kwargs):
+    if getattr(task.request, 'is_eager', False):
+        return
+    if _green_pool is not None:
+        # The task's greenlet ends here and nothing would reuse its connections
+        for conn in connections.all(initialized_only=True):
+            conn.close()
+    else:
+        recycle_connections()
+    publish_connection_stats()
@@ -9,13 +9,145 @@ class ScrapingStatus:
     COMPLETED = 'completed'
     FAILED = 'failed'
 
+    CHOICES = (PENDING, PROCESSING, COMPLETED, FAILED)
+
 # Pagination constants
 PAGES_PER_PAGE = 10
 LINKS_PER_PAGE = 20
+TOP_DOMAINS = 5  # most linked domains shown in the stats panel
+
+# Link storage constants
+class LinkStorage:
+    ROWS = 'rows'
+    COMPACT = 'compact'
+
+
+LINK_BATCH_SIZE = 1000
+COMPACT_CHUNK_SIZE = 5000  # links per compressed chunk of a compact link set
+URL_MAX_LENGTH = 2000
+
+
+# Extractors a page can enable; all of them run in one pass over the document
+class Extractor:
+    LINKS = 'links'
+    IMAGES = 'images'
+    SCRIPTS = 'scripts'
+    STYLESHEETS = 'stylesheets'
+    ALTERNATES = 'alternates'
+    CANONICAL = 'canonical'
+    META = 'meta'
+
+    CHOICES = (LINKS, IMAGES, SCRIPTS, STYLESHEETS, ALTERNATES, CANONICAL, META)
+    # Extractors whose URLs are stored as PageResource rows
+    RESOURCES = (IMAGES, SCRIPTS, STYLESHEETS, ALTERNATES)
+    DEFAULT = [LINKS]
+
+# Export constants
+EXPORT_CHUNK_SIZE = 2000
+
+
+class ExportFormat:
+    CSV = 'csv'
+    JSONL = 'jsonl'
+
+    CHOICES = (CSV, JSONL)
+
+# JSON API constants
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+PAGE_API_FIELDS = ('id', 'url', 'title', 'status',
+                   'error_message', 'created_at', 'updated_at',
+                   'canonical_url', 'meta_description', 'meta_robots')
+PAGE_API_DEFAULT_FIELDS = ('id', 'url', 'title', 'status', 'updated_at')
+LINK_API_FIELDS = ('id', 'url', 'name', 'created_at')
+LINK_API_DEFAULT_FIELDS = ('id', 'url', 'name')
+
+# Scheduled re-scraping
+REFRESH_HISTORY_WINDOW = 10  # recent scrapes used to estimate the change rate
+REFRESH_HISTORY_KEEP = 100  # history rows kept per page
+REFRESH_BACKOFF = 2  # interval multiplier after an unchanged or failed scrape
+REFRESH_JITTER = 0.1  # +/- fraction added so pages drift apart over time
+REFRESH_LEASE = 3600  # seconds a swept page waits before it can be swept again
+
+# Link health checks
+LINK_CHECK_BATCH_SIZE = 1000  # URLs claimed and checked per event loop run
+LINK_CHECK_LEASE = 900  # seconds a claimed URL is left to its checker
+HEAD_FALLBACK_STATUSES = (405, 501)  # servers that reject HEAD get a GET
+
+# Sitemap imports
+SITEMAP_CHUNK_SIZE = 1000  # sitemap URLs looked up, created and queued together
+SITEMAP_MAX_DEPTH = 2  # sitemap indexes followed below the imported sitemap
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Scrape failures, by how a retry would fare
+class FailureClass:
+    TRANSIENT = 'transient'  # timeouts, connection errors, 5xx, 429: retry with backoff
+    PERMANENT = 'permanent'  # other 4xx and invalid URLs: retrying cannot help
+    BUG = 'bug'  # anything else: dead-letter until the code is fixed
+
+    CHOICES = (TRANSIENT, PERMANENT, BUG)
+
+
+TRANSIENT_HTTP_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+# Scheduling lanes and the Celery queue of each
+class Lane:
+    INTERACTIVE = 'interactive'  # pages a user adds or re-scrapes
+    BULK = 'bulk'  # sitemap imports, dispatched fairly between users
 
-# Timeout constants
-DEFAULT_SCRAPING_TIMEOUT = 30
-DEFAULT_REQUEST_TIMEOUT = 10
+    CHOICES = (INTERACTIVE, BULK)
+    QUEUES = {INTERACTIVE: 'interactive', BULK: 'scraping'}
+
+
+SCHEDULER_KEY_PREFIX = 'scheduler:'
+SCHEDULER_WAIT_SAMPLES = 1000  # recent queue waits kept per lane
+
+# Pages marked by the web server while the broker was down, published per run
+RECONCILE_BATCH_SIZE = 500
+
+# Deleted pages are purged in the background
+DELETE_BATCH_SIZE = 5000  # links or resources removed per statement and transaction
+PURGE_BATCH_SIZE = 100  # deleted pages purged per sweep
+
+# Per-host circuit breakers kept in Redis
+CIRCUIT_KEY_PREFIX = 'circuit:'
+CIRCUIT_PROBE_TIMEOUT = 60  # seconds a half-open probe may take before another is let through
+CIRCUIT_TRIPPED_TTL = 86400  # forget hosts that were never probed again
+
+# Libraries a page fetch can use (SCRAPER_FETCH_BACKEND)
+class FetchBackend:
+    REQUESTS = 'requests'  # HTTP/1.1 through the shared requests session
+    HTTPX = 'httpx'  # HTTP/2 when the origin offers it, multiplexed per origin
+
+    CHOICES = (REQUESTS, HTTPX)
+
+
+# Content codings advertised, most preferred first, if they can be decoded
+CONTENT_CODINGS = ('zstd', 'br', 'gzip', 'deflate')
+
+# How a page's character encoding was found, cheapest first
+class CharsetSource:
+    BOM = 'bom'  # byte order mark
+    HEADER = 'header'  # charset parameter of the Content-Type header
+    META = 'meta'  # <meta charset> or http-equiv near the top of the document
+    DETECTED = 'detected'  # statistical detection over the whole document
+
+    CHOICES = (BOM, HEADER, META, DETECTED)
+
+
+CHARSET_SNIFF_BYTES = 1024  # bytes searched for a <meta> declaration, as browsers do
+
+# Sent with scraping and link check requests
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+# Per-host latency sketches behind adaptive fetch timeouts
+LATENCY_KEY_PREFIX = 'latency:'
+LATENCY_RANKING_KEY = 'latency_p99'  # hosts scored by their current p99
+LATENCY_ALPHA = 0.05  # weight of each new sample once warmed up
+LATENCY_MIN_SAMPLES = 5  # samples before a host's own deadlines are used
+LATENCY_TTL = 7 * 86400  # forget hosts not fetched for a week
+LATENCY_TIMEOUT_FACTOR = 3  # deadlines are this many times the p50 / p99
 
 # Message constants
 class Messages:
@@ -27,6 +159,11 @@ class Messages:
     URL_SCRAPED_SUCCESS = 'URL scraped successfully!'
     RESCRAPE_SUCCESS = 'Re-scraping started successfully!'
     PAGE_DELETED_SUCCESS = 'Page deleted successfully!'
+    PAGES_DELETED_SUCCESS = '{} pages deleted successfully!'
+    NO_PAGES_SELECTED = 'Select the pages to delete first.'
+    LINK_CHECK_QUEUED = 'Link check started in the background.'
+    SITEMAP_IMPORT_QUEUED = 'Sitemap import started in the background.'
+    DEAD_LETTERS_REPLAYED = '{} failed pages queued for scraping again.'
 
     # Error messages
     INVALID_CREDENTIALS = 'Invalid email or password.'
@@ -35,4 +172,25 @@ class Messages:
     SCRAPING_FAILED = 'Failed to scrape URL: {}'
     RESCRAPE_FAILED = 'Failed to re-scrape page: {}'
     QUEUE_TASK_FAILED = 'Failed to queue scraping task: {}'
-    QUEUE_RETASK_FAILED = 'Failed to queue re-scraping task: {}'
\ No newline at end of file
+    QUEUE_RETASK_FAILED = 'Failed to queue re-scraping task: {}'
+    QUEUE_LINK_CHECK_FAILED = 'Failed to queue link check task: {}'
+    QUEUE_SITEMAP_FAILED = 'Failed to queue sitemap import: {}'
+    QUEUE_DELETE_FAILED = 'Failed to queue page deletion, it will be purged by the next sweep: {}'
+    QUEUE_UNAVAILABLE = 'The task queue is unavailable, so the page is being scraped on the web server. Refresh to see the result.'
+    SCRAPER_BUSY = 'The task queue is unavailable and the scraper is busy. The page will be scraped once the queue is back.'
+
+
+# Imported by the worker's parent process before it forks, so pool
+# processes share the fetching and parsing stack that web processes never load
+WORKER_PRELOAD_MODULES = ('scraper.utils', 'scraper.sitemaps')
+
+# Startup budget of a web process: Django set up and the URLconf imported
+WEB_IMPORT_BUDGET_SECONDS = 2.0
+WEB_RSS_BUDGET_MB = 90
+# Only ever imported by workers
+WEB_FORBIDDEN_MODULES = ('bs4', 'requests', 'httpx', 'urllib3', 'charset_normalizer', 'html5lib')
+
+# Database connection counters published by each web process and worker
+CONNECTION_STATS_KEY_PREFIX = 'db_connections:'
+CONNECTION_STATS_INTERVAL = 10  # seconds between publishes per process
+CONNECTION_STATS_TTL = 300  # forget processes that stopped publishing
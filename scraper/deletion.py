@@ -0,0 +1,65 @@
+"""
+Deleting pages without loading their links.
+
+``page.delete()`` makes Django's collector load every related link into
+memory before deleting it in one transaction, so deleting a page with a
+million links from a view could exhaust the web process and hold locks on
+the links table for the whole delete. Pages are soft-deleted instead:
+setting ``deleted_at`` hides them from ``ScrapedPage.objects`` at once,
+and a background task then removes their links and resources
+``DELETE_BATCH_SIZE`` rows at a time, each batch in its own transaction,
+before deleting the emptied page.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import ScrapedPage, PageLink, PageResource
+from .aggregates import forget_pages
+from .constants import DELETE_BATCH_SIZE, PURGE_BATCH_SIZE
+
+
+def soft_delete_pages(user, page_ids):
+    """Hide the given pages of a user, returning the ids of those hidden"""
+    with transaction.atomic():
+        pages = list(ScrapedPage.objects.select_for_update().filter(
+            user=user, pk__in=page_ids).values_list('pk', 'status'))
+        deleted = [pk for pk, status in pages]
+        ScrapedPage.objects.filter(pk__in=deleted).update(deleted_at=timezone.now())
+        forget_pages(user.pk, pages)
+    return deleted
+
+
+def delete_in_batches(queryset, batch_size=DELETE_BATCH_SIZE):
+    """Delete the rows of queryset batch_size at a time, returning how many"""
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        # Links and resources have no signal receivers and nothing depends
+        # on them, so the collector would only load the batch to delete it
+        deleted += queryset.model._base_manager.filter(pk__in=ids)._raw_delete(queryset.db)
+
+
+def purge_page(page_id, batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete a soft-deleted page with its links and resources, returning how
+    many links and resources were removed. Live pages are left alone.
+    """
+    if not ScrapedPage.all_objects.filter(pk=page_id, deleted_at__isnull=False).exists():
+        return 0
+    removed = delete_in_batches(PageLink._base_manager.filter(page_id=page_id), batch_size)
+    removed += delete_in_batches(PageResource._base_manager.filter(page_id=page_id), batch_size)
+    # What is left (history, dead letters, a compact link set, the domain
+    # histogram) is small enough for the collector
+    ScrapedPage.all_objects.filter(pk=page_id).delete()
+    return removed
+
+
+def deleted_pages_due(older_than, limit=PURGE_BATCH_SIZE):
+    """Ids of pages deleted more than older_than seconds ago, oldest first"""
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return list(
+        ScrapedPage.all_objects.filter(deleted_at__lte=cutoff).order_by(
+            'deleted_at').values_list('pk', flat=True)[:limit]
+    )
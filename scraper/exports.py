@@ -0,0 +1,118 @@
+"""
+Streaming exports of scraped links as CSV or JSON Lines
+"""
+import csv
+import json
+import zlib
+from django.http import StreamingHttpResponse
+from .models import ScrapedPage, PageLink
+from .linkstore import CompactLinkList, is_compact
+from .constants import EXPORT_CHUNK_SIZE, ExportFormat, LinkStorage
+
+
+class Echo:
+    """File-like object that returns what is written instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, header):
+    """Yield CSV encoded lines, starting with the header row"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_jsonl(rows, header):
+    """Yield one JSON object per line, keyed by the header names"""
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), ensure_ascii=False) + '\n'
+
+
+def iter_batched(lines, batch_size=EXPORT_CHUNK_SIZE):
+    """Join encoded lines into larger byte chunks to cut per-row overhead"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield ''.join(batch).encode('utf-8')
+            batch = []
+    if batch:
+        yield ''.join(batch).encode('utf-8')
+
+
+def iter_gzip(chunks):
+    """Compress a byte chunk stream into a single gzip member"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_rows(rows, header, export_format, compress=False):
+    """
+    Encode an iterable of row tuples as a byte stream in the given format
+    """
+    if export_format == ExportFormat.JSONL:
+        lines = iter_jsonl(rows, header)
+    else:
+        lines = iter_csv(rows, header)
+
+    chunks = iter_batched(lines)
+    if compress:
+        chunks = iter_gzip(chunks)
+    return chunks
+
+
+def page_link_rows(page, chunk_size=EXPORT_CHUNK_SIZE):
+    """Iterate (url, name) tuples of a page using a server-side cursor"""
+    if is_compact(page):
+        return (tuple(link) for link in CompactLinkList(page))
+
+    return (
+        page.links.order_by('pk')
+        .values_list('url', 'name')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def user_link_rows(user, chunk_size=EXPORT_CHUNK_SIZE):
+    """Iterate (page_url, url, name) tuples across all pages of a user"""
+    yield from (
+        PageLink.objects.filter(page__user=user, page__deleted_at__isnull=True)
+        .order_by('page_id', 'pk')
+        .values_list('page__url', 'url', 'name')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    compact_pages = ScrapedPage.objects.filter(
+        user=user, link_storage=LinkStorage.COMPACT).order_by('pk')
+    for page in compact_pages.iterator():
+        for link in CompactLinkList(page):
+            yield (page.url, link.url, link.name)
+
+
+def streaming_export_response(rows, header, filename, export_format, compress=False):
+    """
+    Build a StreamingHttpResponse that downloads the rows as a file
+    """
+    if export_format == ExportFormat.JSONL:
+        content_type = 'application/x-ndjson'
+    else:
+        content_type = 'text/csv'
+    filename = f'{filename}.{export_format}'
+
+    if compress:
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(
+        stream_rows(rows, header, export_format, compress=compress),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
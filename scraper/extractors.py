@@ -0,0 +1,184 @@
+"""
+Single-pass extraction of links, resources and metadata from a parsed page.
+
+Each extractor subscribes to the tag names it needs. ``run_extractors``
+walks the document once, with one ``find_all`` over the union of those tag
+names, and hands every matching tag to the extractors subscribed to it, so
+enabling more extractors adds dispatch work but no extra traversals.
+"""
+from collections import defaultdict
+from .constants import Extractor, URL_MAX_LENGTH
+
+
+def clean_link_text(text):
+    """Clean and truncate link text"""
+    if not text:
+        return 'No text'
+
+    # Remove extra whitespace and newlines
+    text = ' '.join(text.split())
+
+    # Truncate if too long
+    if len(text) > 200:
+        text = text[:197] + '...'
+
+    return text or 'No text'
+
+
+class BaseExtractor:
+    """Collects one kind of data from the tags it subscribes to"""
+    name = None
+    tags = ()
+
+    def __init__(self, normalizer):
+        self.normalizer = normalizer
+
+    def normalize(self, href):
+        """Canonical absolute URL for an attribute value, or None to skip it"""
+        if not href:
+            return None
+        url = self.normalizer.normalize(href)
+        if not url or len(url) > URL_MAX_LENGTH:
+            return None
+        return url
+
+    def feed(self, tag):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class LinkExtractor(BaseExtractor):
+    """Anchors as {url: text}, keeping the first text seen for each URL"""
+    name = Extractor.LINKS
+    tags = ('a',)
+
+    def __init__(self, normalizer):
+        super().__init__(normalizer)
+        self.links = {}
+
+    def feed(self, tag):
+        url = self.normalize(tag.get('href'))
+        if url and url not in self.links:
+            self.links[url] = clean_link_text(tag.get_text())
+
+    def result(self):
+        return self.links
+
+
+class ResourceExtractor(BaseExtractor):
+    """
+    URLs referenced by an attribute of a tag, optionally only for a given
+    rel, as {url: text} where text comes from a describing attribute
+    """
+    attribute = None
+    text_attribute = None
+    rel = None
+
+    def __init__(self, normalizer):
+        super().__init__(normalizer)
+        self.resources = {}
+
+    def feed(self, tag):
+        if self.rel is not None and self.rel not in (tag.get('rel') or ()):
+            return
+        url = self.normalize(tag.get(self.attribute))
+        if url and url not in self.resources:
+            self.resources[url] = ' '.join((tag.get(self.text_attribute) or '').split())[:500]
+
+    def result(self):
+        return self.resources
+
+
+class ImageExtractor(ResourceExtractor):
+    name = Extractor.IMAGES
+    tags = ('img',)
+    attribute = 'src'
+    text_attribute = 'alt'
+
+
+class ScriptExtractor(ResourceExtractor):
+    name = Extractor.SCRIPTS
+    tags = ('script',)
+    attribute = 'src'
+    text_attribute = 'type'
+
+
+class StylesheetExtractor(ResourceExtractor):
+    name = Extractor.STYLESHEETS
+    tags = ('link',)
+    attribute = 'href'
+    text_attribute = 'media'
+    rel = 'stylesheet'
+
+
+class AlternateExtractor(ResourceExtractor):
+    name = Extractor.ALTERNATES
+    tags = ('link',)
+    attribute = 'href'
+    text_attribute = 'hreflang'
+    rel = 'alternate'
+
+
+class CanonicalExtractor(BaseExtractor):
+    """The first link rel=canonical, as a URL or ''"""
+    name = Extractor.CANONICAL
+    tags = ('link',)
+
+    def __init__(self, normalizer):
+        super().__init__(normalizer)
+        self.url = ''
+
+    def feed(self, tag):
+        if not self.url and 'canonical' in (tag.get('rel') or ()):
+            self.url = self.normalize(tag.get('href')) or ''
+
+    def result(self):
+        return self.url
+
+
+class MetaExtractor(BaseExtractor):
+    """The description and robots meta tags, as {'description': ..., 'robots': ...}"""
+    name = Extractor.META
+    tags = ('meta',)
+    names = ('description', 'robots')
+
+    def __init__(self, normalizer):
+        super().__init__(normalizer)
+        self.meta = {name: '' for name in self.names}
+
+    def feed(self, tag):
+        name = (tag.get('name') or '').lower()
+        if name in self.meta and not self.meta[name]:
+            self.meta[name] = ' '.join((tag.get('content') or '').split())
+
+    def result(self):
+        return self.meta
+
+
+EXTRACTORS = {
+    extractor.name: extractor for extractor in (
+        LinkExtractor, ImageExtractor, ScriptExtractor, StylesheetExtractor,
+        AlternateExtractor, CanonicalExtractor, MetaExtractor,
+    )
+}
+
+
+def run_extractors(soup, names, normalizer):
+    """
+    Run the named extractors over a parsed document in one traversal and
+    return {name: result}
+    """
+    extractors = [EXTRACTORS[name](normalizer) for name in names if name in EXTRACTORS]
+    subscribers = defaultdict(list)
+    for extractor in extractors:
+        for tag_name in extractor.tags:
+            subscribers[tag_name].append(extractor)
+
+    if subscribers:
+        for tag in soup.find_all(list(subscribers)):
+            for extractor in subscribers[tag.name]:
+                extractor.feed(tag)
+
+    return {extractor.name: extractor.result() for extractor in extractors}
@@ -0,0 +1,111 @@
+"""
+In-process fallback for scrapes that could not be queued.
+
+When the broker is unreachable the page is marked as needing an enqueue
+(``ScrapedPage.needs_enqueue_at``) and handed to a small thread pool in
+the web process, so the request returns at once instead of scraping
+inline. The pool runs at most ``SCRAPE_FALLBACK_WORKERS`` scrapes with
+``SCRAPE_FALLBACK_QUEUE_SIZE`` more waiting; beyond that submissions are
+refused rather than queued without bound.
+
+A scrape run here moves the marker to when it started, and clears it when
+it finishes unless the page was marked again meanwhile. Pages still marked
+``SCRAPE_FALLBACK_GRACE`` seconds later, because the pool was full or busy
+or the process died, are published to Celery by
+``reconcile_pending_enqueues`` once the broker is back; the pool skips
+pages the reconciler took before it got to them.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from .models import ScrapedPage
+
+logger = logging.getLogger(__name__)
+
+
+class FallbackExecutor:
+    """A thread pool whose queue is capped: submit() never blocks"""
+
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='scrape-fallback')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the pool; False if it is saturated"""
+        if not self.slots.acquire(blocking=False):
+            return False
+        try:
+            future = self.executor.submit(self.run, fn, *args)
+        except RuntimeError:
+            # The pool is shutting down with the process
+            self.slots.release()
+            return False
+        future.add_done_callback(lambda future: self.slots.release())
+        return True
+
+    def run(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception:
+            logger.exception(f"Fallback task {fn.__name__} failed")
+        finally:
+            # Database connections are per thread; do not keep one open
+            # between fallback scrapes
+            connections.close_all()
+
+
+_executor_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+
+
+def get_fallback_executor():
+    """The fallback pool of this process, recreated in a forked child"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = FallbackExecutor(settings.SCRAPE_FALLBACK_WORKERS,
+                                         settings.SCRAPE_FALLBACK_QUEUE_SIZE)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def scrape_in_process(page_id, marked_at):
+    # The scraping stack is only loaded by web processes that need it
+    from .utils import scrape_page_links
+
+    # Claim the mark this job was submitted with: the reconciler leaves a
+    # started scrape alone for another grace period, and a page it already
+    # published, or that was marked again for a later job, is skipped
+    started_at = timezone.now()
+    if not ScrapedPage.objects.filter(pk=page_id, needs_enqueue_at=marked_at).update(
+            needs_enqueue_at=started_at):
+        return
+    page = ScrapedPage.objects.filter(pk=page_id).first()
+    if page is None:
+        return
+    try:
+        scrape_page_links(page)
+    finally:
+        ScrapedPage.objects.filter(pk=page_id, needs_enqueue_at=started_at).update(
+            needs_enqueue_at=None)
+
+
+def fallback_scrape(page):
+    """
+    Mark a page that could not be queued, then try to scrape it on the
+    fallback pool. Returns False if the pool is saturated; the page then
+    waits for the reconciler.
+    """
+    page.needs_enqueue_at = timezone.now()
+    ScrapedPage.objects.filter(pk=page.pk).update(needs_enqueue_at=page.needs_enqueue_at)
+    if get_fallback_executor().submit(scrape_in_process, page.pk, page.needs_enqueue_at):
+        logger.info(f"Scraping page {page.pk} in process while the queue is unavailable")
+        return True
+    logger.warning(f"Fallback pool saturated, page {page.pk} waits for the queue")
+    return False
@@ -0,0 +1,217 @@
+"""
+Page fetch backends.
+
+``SCRAPER_FETCH_BACKEND`` picks the library that downloads pages:
+
+- ``requests``: the shared requests session, over HTTP/1.1
+- ``httpx``: a shared httpx client speaking HTTP/2 where the origin offers
+  it, so concurrent fetches from one origin share a single connection
+
+Both advertise every content coding this process can decode (zstd and br
+need the zstandard and brotli packages), read the body as it came over the
+wire and decode it here. Bytes on the wire and decompression time are
+therefore measured the same way whichever backend is used. Errors are
+raised as requests exceptions by both, so retry classification and the
+circuit breakers only know one set of exception types.
+"""
+import gzip
+import logging
+import os
+import threading
+import time
+import zlib
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+import httpx
+import requests
+import urllib3
+from django.conf import settings
+from .constants import CONTENT_CODINGS, USER_AGENT
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def decode_deflate(data):
+    try:
+        return zlib.decompress(data)
+    except zlib.error:
+        # Some servers send a raw deflate stream without the zlib header
+        return zlib.decompress(data, -zlib.MAX_WBITS)
+
+
+DECODERS = {'gzip': gzip.decompress, 'x-gzip': gzip.decompress, 'deflate': decode_deflate}
+DECODE_ERRORS = (zlib.error, OSError, EOFError)
+if brotli is not None:
+    DECODERS['br'] = brotli.decompress
+    DECODE_ERRORS += (brotli.error,)
+if zstandard is not None:
+    # A decompression object, unlike zstandard.decompress, also takes
+    # frames that do not record their decompressed size
+    DECODERS['zstd'] = lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    DECODE_ERRORS += (zstandard.ZstdError,)
+
+ACCEPT_ENCODING = ', '.join(coding for coding in CONTENT_CODINGS if coding in DECODERS)
+
+
+def decode_content(data, content_encoding):
+    """Undo the content codings listed in a Content-Encoding header"""
+    codings = [coding.strip().lower() for coding in (content_encoding or '').split(',')]
+    for coding in reversed([coding for coding in codings if coding and coding != 'identity']):
+        if coding not in DECODERS:
+            raise requests.exceptions.ContentDecodingError(
+                f'Unsupported content encoding: {coding}')
+        try:
+            data = DECODERS[coding](data)
+        except DECODE_ERRORS as e:
+            raise requests.exceptions.ContentDecodingError(
+                f'Failed to decode {coding} response: {str(e)}') from e
+    return data
+
+
+class FetchResult:
+    """A fetched page: its status, decoded content and transfer stats"""
+
+    def __init__(self, backend, url, status_code, reason, headers, body, elapsed,
+                 http_version):
+        self.backend = backend
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.elapsed = elapsed
+        self.http_version = http_version
+        self.content_encoding = headers.get('Content-Encoding', '')
+        self.wire_bytes = len(body)
+
+        # Error pages are not decoded, only their status is used
+        start = time.perf_counter()
+        self.content = decode_content(body, self.content_encoding) if self.ok else b''
+        self.decode_seconds = time.perf_counter() - start
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        """Raise requests.HTTPError for 4xx and 5xx responses, as requests does"""
+        if self.ok:
+            return
+        kind = 'Client' if self.status_code < 500 else 'Server'
+        raise requests.HTTPError(
+            f'{self.status_code} {kind} Error: {self.reason} for url: {self.url}',
+            response=self)
+
+    def stats(self):
+        """Transfer stats stored with the page"""
+        return {
+            'backend': self.backend,
+            'http_version': self.http_version,
+            'content_encoding': self.content_encoding,
+            'wire_bytes': self.wire_bytes,
+            'content_bytes': len(self.content),
+            'elapsed_ms': round(self.elapsed * 1000, 1),
+            'decode_ms': round(self.decode_seconds * 1000, 3),
+        }
+
+
+class RequestsFetcher:
+    name = 'requests'
+
+    def __init__(self, session):
+        self.session = session
+
+    def fetch(self, url, timeouts):
+        start = time.perf_counter()
+        response = self.session.get(url, timeout=timeouts, stream=True,
+                                    headers={'Accept-Encoding': ACCEPT_ENCODING})
+        elapsed = time.perf_counter() - start
+        with response:
+            try:
+                body = response.raw.read(decode_content=False)
+            except urllib3.exceptions.ReadTimeoutError as e:
+                raise requests.exceptions.ReadTimeout(e) from e
+            except urllib3.exceptions.HTTPError as e:
+                raise requests.exceptions.ChunkedEncodingError(e) from e
+        version = {10: 'HTTP/1.0', 11: 'HTTP/1.1'}.get(response.raw.version, 'HTTP/1.1')
+        return FetchResult(self.name, response.url, response.status_code, response.reason,
+                           response.headers, body, elapsed, version)
+
+
+# httpx errors as the requests exceptions the rest of the scraper handles,
+# most specific first
+HTTPX_ERRORS = (
+    (httpx.ConnectTimeout, requests.exceptions.ConnectTimeout),
+    (httpx.TimeoutException, requests.exceptions.ReadTimeout),
+    (httpx.UnsupportedProtocol, requests.exceptions.InvalidSchema),
+    (httpx.TooManyRedirects, requests.exceptions.TooManyRedirects),
+    (httpx.RemoteProtocolError, requests.exceptions.ChunkedEncodingError),
+    (httpx.TransportError, requests.exceptions.ConnectionError),
+    (httpx.InvalidURL, requests.exceptions.InvalidURL),
+)
+
+
+class HttpxFetcher:
+    name = 'httpx'
+
+    def __init__(self, client):
+        self.client = client
+
+    def fetch(self, url, timeouts):
+        start = time.perf_counter()
+        try:
+            with self.client.stream(
+                    'GET', url, headers={'Accept-Encoding': ACCEPT_ENCODING},
+                    timeout=httpx.Timeout(timeouts.read, connect=timeouts.connect)) as response:
+                elapsed = time.perf_counter() - start
+                body = b''.join(response.iter_raw())
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            for httpx_error, requests_error in HTTPX_ERRORS:
+                if isinstance(e, httpx_error):
+                    raise requests_error(str(e)) from e
+            raise requests.exceptions.RequestException(str(e)) from e
+        return FetchResult(self.name, str(response.url), response.status_code,
+                           response.reason_phrase, response.headers, body, elapsed,
+                           response.http_version)
+
+
+def new_httpx_client(**kwargs):
+    """An httpx client set up like the shared requests session, on HTTP/2 if h2 is installed"""
+    options = dict(
+        follow_redirects=True,
+        headers={'User-Agent': USER_AGENT},
+        cookies=httpx.Cookies(CookieJar(DefaultCookiePolicy(allowed_domains=[]))),
+        limits=httpx.Limits(max_connections=settings.SCRAPER_HTTP_POOL_SIZE),
+    )
+    options.update(kwargs)
+    try:
+        return httpx.Client(http2=True, **options)
+    except ImportError:
+        logger.warning("h2 is not installed, the httpx fetch backend falls back to HTTP/1.1")
+        return httpx.Client(**options)
+
+
+_client_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+
+def httpx_client():
+    """
+    The httpx client shared by every scrape in this process. Like the
+    requests session, a pool child gets its own instead of inheriting the
+    parent's connections.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client, _client_pid = new_httpx_client(), os.getpid()
+        return _client
@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
 from .models import ScrapedPage
+from .constants import Extractor
 
 
 class EmailAuthenticationForm(AuthenticationForm):
@@ -62,9 +63,16 @@ class CustomUserCreationForm(UserCreationForm):
 
 
 class AddUrlForm(forms.ModelForm):
+    extractors = forms.MultipleChoiceField(
+        choices=[(name, name.capitalize()) for name in Extractor.CHOICES],
+        initial=Extractor.DEFAULT,
+        required=False,
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'}),
+    )
+
     class Meta:
         model = ScrapedPage
-        fields = ['url']
+        fields = ['url', 'extractors']
         widgets = {
             'url': forms.URLInput(attrs={
                 'class': 'form-control',
@@ -79,3 +87,23 @@ class AddUrlForm(forms.ModelForm):
             raise forms.ValidationError(
                 'URL must start with http:// or https://')
         return url
+
+    def clean_extractors(self):
+        return self.cleaned_data['extractors'] or list(Extractor.DEFAULT)
+
+
+class SitemapImportForm(forms.Form):
+    url = forms.URLField(
+        max_length=2000,
+        widget=forms.URLInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Sitemap or sitemap index (e.g., https://example.com/sitemap.xml)',
+        })
+    )
+
+    def clean_url(self):
+        url = self.cleaned_data['url']
+        if not url.startswith(('http://', 'https://')):
+            raise forms.ValidationError(
+                'URL must start with http:// or https://')
+        return url
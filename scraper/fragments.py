@@ -0,0 +1,38 @@
+"""
+Versioned caching of rendered page fragments.
+
+Keys contain the page id and the page's ``scrape_version``, which the
+scraping pipeline bumps every time it stores a new link set. A re-scraped
+page is looked up under a new key, so stale fragments are never served and
+never need to be deleted; they simply expire. The creation time is part of
+the key too, so a reused primary key cannot pick up another page's entries.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from .constants import ScrapingStatus
+
+FRAGMENT_CACHE = 'fragments'
+
+
+def page_fragment_key(page, name, *vary_on):
+    """Cache key of a fragment, compatible with the {% cache %} template tag"""
+    return make_template_fragment_key(
+        name, [page.pk, page.created_at, page.scrape_version, *vary_on])
+
+
+def cached_page_fragment(page, name, vary_on, render):
+    """
+    Return render() for a page, from the cache when the page is completed.
+    Pages still being scraped change under our feet and are always rendered.
+    """
+    if page.status != ScrapingStatus.COMPLETED:
+        return render()
+
+    cache = caches[FRAGMENT_CACHE]
+    key = page_fragment_key(page, name, *vary_on)
+    fragment = cache.get(key)
+    if fragment is None:
+        fragment = render()
+        cache.set(key, fragment, settings.FRAGMENT_CACHE_TIMEOUT)
+    return fragment
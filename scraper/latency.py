@@ -0,0 +1,154 @@
+"""
+Per-host latency sketches and the fetch deadlines derived from them.
+
+Every fetch reports how long the host took to answer (time to response
+headers). Each host keeps an exponentially weighted mean and variance of
+the log latency in a Redis hash, a constant-size sketch that follows the
+host as it gets faster or slower. Latencies are roughly log-normal, so
+p50 and p99 are read off as exp(mean) and exp(mean + 2.33 sd).
+
+Deadlines follow the sketch: the connect timeout from p50 and the read
+timeout from p99, each scaled by ``LATENCY_TIMEOUT_FACTOR`` and kept
+within the configured bounds. Hosts with too few samples get
+``SCRAPING_TIMEOUT``. A fetch that times out is recorded as taking its
+deadline, so a slow but healthy host pushes its own deadline up instead
+of being cut off at the same point again.
+
+Each update also scores the host by its p99 in a sorted set, so the
+slowest hosts are read from its top without scanning every sketch. Hosts
+whose sketch expired are dropped from it when a read comes across them.
+
+Concurrent updates of one host may drop a sample, which a statistical
+sketch tolerates; if Redis is unreachable the default timeout is used.
+"""
+import logging
+import math
+from collections import namedtuple
+import redis
+from django.conf import settings
+from .connections import redis_client
+from .constants import (
+    LATENCY_KEY_PREFIX, LATENCY_RANKING_KEY, LATENCY_ALPHA, LATENCY_MIN_SAMPLES, LATENCY_TTL,
+    LATENCY_TIMEOUT_FACTOR,
+)
+
+logger = logging.getLogger(__name__)
+
+# Standard normal quantile of the 99th percentile
+Z_P99 = 2.326
+MIN_LATENCY = 0.001
+
+Timeouts = namedtuple('Timeouts', ['connect', 'read'])
+HostLatency = namedtuple('HostLatency', ['host', 'samples', 'p50', 'p99'])
+
+
+def update_sketch(sketch, seconds):
+    """Return (samples, mean, variance) after adding one latency in seconds"""
+    samples, mean, variance = sketch
+    x = math.log(max(seconds, MIN_LATENCY))
+    if samples == 0:
+        return 1, x, 0.0
+    # Plain running moments while warming up, then a fixed weight
+    alpha = max(LATENCY_ALPHA, 1 / (samples + 1))
+    diff = x - mean
+    increment = alpha * diff
+    return samples + 1, mean + increment, (1 - alpha) * (variance + diff * increment)
+
+
+def read_sketch(data):
+    return (int(data.get(b'samples', 0)), float(data.get(b'mean', 0.0)),
+            float(data.get(b'variance', 0.0)))
+
+
+def sketch_p99(mean, variance):
+    return math.exp(mean + Z_P99 * math.sqrt(max(variance, 0.0)))
+
+
+def record_latency(host, seconds, client=None):
+    """Add a fetch latency for a host to its sketch and its p99 to the ranking"""
+    key = f'{LATENCY_KEY_PREFIX}{host}'
+    try:
+        client = client or redis_client()
+        samples, mean, variance = update_sketch(read_sketch(client.hgetall(key)), seconds)
+        pipe = client.pipeline()
+        pipe.hset(key, mapping={'samples': samples, 'mean': mean, 'variance': variance})
+        pipe.expire(key, LATENCY_TTL)
+        pipe.zadd(LATENCY_RANKING_KEY, {host: sketch_p99(mean, variance)})
+        pipe.expire(LATENCY_RANKING_KEY, LATENCY_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug(f"Could not record latency for {host}: {str(e)}")
+
+
+def host_latency(host, data):
+    samples, mean, variance = read_sketch(data)
+    return HostLatency(host, samples, math.exp(mean), sketch_p99(mean, variance))
+
+
+def get_host_latency(host, client=None):
+    """HostLatency for a host, or None if it has not been fetched recently"""
+    try:
+        client = client or redis_client()
+        data = client.hgetall(f'{LATENCY_KEY_PREFIX}{host}')
+    except redis.RedisError as e:
+        logger.debug(f"Could not read latency for {host}: {str(e)}")
+        return None
+    return host_latency(host, data) if data else None
+
+
+def clamp(value, low, high):
+    return min(max(value, low), high)
+
+
+def fetch_timeouts(host, client=None):
+    """Connect and read deadlines for the next fetch from a host"""
+    return latency_timeouts(get_host_latency(host, client))
+
+
+def latency_timeouts(latency):
+    """Connect and read deadlines for a HostLatency, or the defaults for None"""
+    if latency is None or latency.samples < LATENCY_MIN_SAMPLES:
+        return Timeouts(min(settings.SCRAPING_TIMEOUT, settings.SCRAPING_CONNECT_TIMEOUT_MAX),
+                        settings.SCRAPING_TIMEOUT)
+    return Timeouts(
+        clamp(latency.p50 * LATENCY_TIMEOUT_FACTOR,
+              settings.SCRAPING_TIMEOUT_MIN, settings.SCRAPING_CONNECT_TIMEOUT_MAX),
+        clamp(latency.p99 * LATENCY_TIMEOUT_FACTOR,
+              settings.SCRAPING_TIMEOUT_MIN, settings.SCRAPING_TIMEOUT_MAX),
+    )
+
+
+def get_tail_latencies(limit=20, client=None):
+    """Hosts with the slowest p99, as rows with their current deadlines"""
+    latencies = []
+    try:
+        client = client or redis_client()
+        start = 0
+        while len(latencies) < limit:
+            hosts = [host.decode() for host in client.zrevrange(
+                LATENCY_RANKING_KEY, start, start + limit - len(latencies) - 1)]
+            if not hosts:
+                break
+            pipe = client.pipeline()
+            for host in hosts:
+                pipe.hgetall(f'{LATENCY_KEY_PREFIX}{host}')
+            sketches = pipe.execute()
+            expired = [host for host, data in zip(hosts, sketches) if not data]
+            if expired:
+                client.zrem(LATENCY_RANKING_KEY, *expired)
+            latencies.extend(host_latency(host, data)
+                             for host, data in zip(hosts, sketches) if data)
+            start += len(hosts) - len(expired)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read host latencies: {str(e)}")
+        return []
+
+    rows = []
+    for latency in latencies:
+        timeouts = latency_timeouts(latency)
+        rows.append({
+            **latency._asdict(),
+            'connect_timeout': timeouts.connect,
+            'read_timeout': timeouts.read,
+        })
+    return rows
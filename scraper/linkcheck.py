@@ -0,0 +1,210 @@
+"""
+Link health checks.
+
+Every distinct link target (``Url``) is checked at most once per
+``LINK_CHECK_TTL``, however many pages and users link to it: a batch of
+targets is first claimed in ``LinkCheck`` and only the claimed ones are
+fetched. A claim is a lease of ``LINK_CHECK_LEASE`` seconds and
+``checked_at`` is only set with a result, so URLs whose checker died are
+claimed again once the lease runs out. Fetching runs on an asyncio event
+loop with httpx, sending a HEAD request and falling back to a streamed GET
+for servers that reject HEAD, with a global concurrency limit and a
+per-host limit so no single site is flooded. httpx is only imported
+once something is checked, so web processes listing broken links do not
+load it.
+"""
+import asyncio
+import time
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from itertools import islice
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Url, LinkCheck, hash_url
+from .linkstore import CompactLinkList, is_compact, get_page_links
+from .constants import (
+    LINK_BATCH_SIZE, LINK_CHECK_BATCH_SIZE, LINK_CHECK_LEASE, HEAD_FALLBACK_STATUSES, USER_AGENT,
+)
+
+CheckResult = namedtuple('CheckResult', ['status_code', 'final_url', 'latency_ms', 'error'])
+BrokenLink = namedtuple(
+    'BrokenLink', ['url', 'name', 'status_code', 'final_url', 'latency_ms', 'check_error'])
+
+
+async def fetch_status(client, url):
+    """Check one URL and return a CheckResult"""
+    import httpx
+
+    start = time.perf_counter()
+    try:
+        response = await client.head(url)
+        if response.status_code in HEAD_FALLBACK_STATUSES:
+            # Only the status line and headers are read, not the body
+            async with client.stream('GET', url) as response:
+                pass
+        error = ''
+        status_code, final_url = response.status_code, str(response.url)
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        error = f'{type(e).__name__}: {str(e)}'[:500]
+        status_code, final_url = None, ''
+    latency_ms = int((time.perf_counter() - start) * 1000)
+    return CheckResult(status_code, final_url, latency_ms, error)
+
+
+async def check_urls(urls, transport=None):
+    """Check URLs concurrently, within the global and per-host limits"""
+    import httpx
+
+    per_host = defaultdict(lambda: asyncio.Semaphore(settings.LINK_CHECK_PER_HOST))
+    in_flight = asyncio.Semaphore(settings.LINK_CHECK_CONCURRENCY)
+
+    async with httpx.AsyncClient(
+        transport=transport,
+        follow_redirects=True,
+        timeout=settings.LINK_CHECK_TIMEOUT,
+        headers={'User-Agent': USER_AGENT},
+        limits=httpx.Limits(max_connections=settings.LINK_CHECK_CONCURRENCY),
+    ) as client:
+        async def check(url):
+            # Wait for the host before taking a global slot, so a busy host
+            # does not hold slots other hosts could use
+            async with per_host[urlsplit(url).hostname], in_flight:
+                return url, await fetch_status(client, url)
+
+        return dict(await asyncio.gather(*(check(url) for url in urls)))
+
+
+def claim_due_urls(url_ids):
+    """
+    Claim the URLs among url_ids that were never checked or whose check is
+    older than the TTL, and return their ids. Concurrent claims skip each
+    other's rows and claimed rows stay leased until the check is stored, so
+    every URL is fetched by one checker only.
+    """
+    now = timezone.now()
+    LinkCheck.objects.bulk_create(
+        (LinkCheck(url_id=url_id) for url_id in url_ids),
+        batch_size=LINK_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    with transaction.atomic():
+        due = list(
+            LinkCheck.objects.select_for_update(skip_locked=True).filter(
+                Q(checked_at__isnull=True) |
+                Q(checked_at__lt=now - timedelta(seconds=settings.LINK_CHECK_TTL)),
+                Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+                url_id__in=url_ids,
+            ).values_list('url_id', flat=True)
+        )
+        LinkCheck.objects.filter(url_id__in=due).update(
+            claimed_until=now + timedelta(seconds=LINK_CHECK_LEASE))
+    return due
+
+
+def check_link_targets(targets, transport=None):
+    """
+    Check (url_id, url) pairs in batches and store the results. Returns the
+    number of URLs that were due and fetched.
+    """
+    checked = 0
+    batch = {}
+
+    def flush():
+        due = claim_due_urls(list(batch))
+        if not due:
+            return 0
+        try:
+            results = asyncio.run(check_urls([batch[url_id] for url_id in due], transport))
+        except BaseException:
+            # Hand the URLs back rather than keep them leased
+            LinkCheck.objects.filter(url_id__in=due).update(claimed_until=None)
+            raise
+        checked_at = timezone.now()
+        LinkCheck.objects.bulk_update(
+            [
+                LinkCheck(
+                    url_id=url_id,
+                    status_code=result.status_code,
+                    final_url=result.final_url[:2000],
+                    latency_ms=result.latency_ms,
+                    error=result.error,
+                    is_broken=bool(result.error) or result.status_code >= 400,
+                    checked_at=checked_at,
+                    claimed_until=None,
+                )
+                for url_id, result in ((url_id, results[batch[url_id]]) for url_id in due)
+            ],
+            ['status_code', 'final_url', 'latency_ms', 'error', 'is_broken', 'checked_at',
+             'claimed_until'],
+            batch_size=LINK_BATCH_SIZE,
+        )
+        return len(due)
+
+    for url_id, url in targets:
+        batch[url_id] = url
+        if len(batch) >= LINK_CHECK_BATCH_SIZE:
+            checked += flush()
+            batch.clear()
+    if batch:
+        checked += flush()
+    return checked
+
+
+def page_link_targets(page):
+    """Yield (url_id, url) for every link of a page"""
+    if is_compact(page):
+        links = iter(CompactLinkList(page))
+        while True:
+            urls = [link.url for link in islice(links, LINK_BATCH_SIZE)]
+            if not urls:
+                return
+            for url, url_id in Url.objects.intern_many(urls).items():
+                yield url_id, url
+
+    yield from Url.objects.filter(page_links__page=page).values_list(
+        'id', 'url').iterator(chunk_size=LINK_BATCH_SIZE)
+
+
+def check_page_links(page, transport=None):
+    return check_link_targets(page_link_targets(page), transport)
+
+
+def check_user_links(user, transport=None):
+    """Check the links of all of a user's pages, each distinct URL once"""
+    def targets():
+        for page in user.scraped_pages.order_by('pk'):
+            yield from page_link_targets(page)
+    return check_link_targets(targets(), transport)
+
+
+def get_broken_links(page, search_query=''):
+    """
+    Return the links of a page whose last check failed, with the check
+    results as status_code, final_url, latency_ms and check_error
+    """
+    if not is_compact(page):
+        return get_page_links(page, search_query).filter(
+            target__link_check__is_broken=True,
+        ).annotate(
+            status_code=F('target__link_check__status_code'),
+            final_url=F('target__link_check__final_url'),
+            latency_ms=F('target__link_check__latency_ms'),
+            check_error=F('target__link_check__error'),
+        )
+
+    broken = []
+    links = iter(CompactLinkList(page, search_query))
+    while True:
+        batch = list(islice(links, LINK_BATCH_SIZE))
+        if not batch:
+            return broken
+        checks = {
+            row[0]: row[1:] for row in LinkCheck.objects.filter(
+                url__url_hash__in=[hash_url(link.url) for link in batch], is_broken=True,
+            ).values_list('url__url', 'status_code', 'final_url', 'latency_ms', 'error')
+        }
+        broken.extend(BrokenLink(link.url, link.name, *checks[link.url])
+                      for link in batch if link.url in checks)
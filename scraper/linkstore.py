@@ -0,0 +1,170 @@
+"""
+Link storage for scraped pages.
+
+Pages with fewer links than ``settings.COMPACT_LINK_THRESHOLD`` keep one
+PageLink row per link. Larger pages sort their link set by name and store
+it in CompactLinkChunk rows of ``COMPACT_CHUNK_SIZE`` links, each a zlib
+compressed columnar blob (a url array and a name array), under a
+CompactLinkSet holding the total. Chunks are only decoded when a view or
+export reads them, one at a time, and a page of links only decodes the
+chunks it overlaps.
+"""
+import json
+import zlib
+from collections import namedtuple
+from itertools import islice
+from django.conf import settings
+from django.db.models import F, Q
+from .models import PageLink, PageResource, Url, CompactLinkSet, CompactLinkChunk
+from .constants import LinkStorage, LINK_BATCH_SIZE, COMPACT_CHUNK_SIZE
+
+CompactLink = namedtuple('CompactLink', ['url', 'name'])
+
+
+def encode_links(links):
+    """Encode a {url: name} mapping as a compressed, name-sorted blob"""
+    ordered = sorted(links.items(), key=lambda item: (item[1], item[0]))
+    urls = [url for url, name in ordered]
+    names = [name for url, name in ordered]
+    payload = json.dumps([urls, names], ensure_ascii=False, separators=(',', ':'))
+    return zlib.compress(payload.encode('utf-8'))
+
+
+def decode_links(data):
+    """Decode a blob produced by encode_links into a list of CompactLink"""
+    urls, names = json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+    return [CompactLink(url, name) for url, name in zip(urls, names)]
+
+
+def iter_compact_links(page, start=0, stop=None):
+    """
+    Yield (position, CompactLink) for the chunks of a page's compact link
+    set that overlap positions start to stop, decoding one chunk at a time
+    """
+    chunks = CompactLinkChunk.objects.filter(page=page, start__gt=start - F('link_count'))
+    if stop is not None:
+        chunks = chunks.filter(start__lt=stop)
+    for first, data in chunks.order_by('start').values_list('start', 'data').iterator(
+            chunk_size=1):
+        yield from enumerate(decode_links(data), start=first)
+
+
+class CompactLinkList:
+    """
+    Sequence over a page's compact link set. Slices only decode the chunks
+    they overlap; searches and iteration stream through the chunks.
+    """
+
+    def __init__(self, page, search_query=''):
+        self.page = page
+        self.search_query = search_query
+        self._count = None
+
+    def _matches(self):
+        query = self.search_query.lower()
+        return (link for _, link in iter_compact_links(self.page)
+                if query in link.name.lower() or query in link.url.lower())
+
+    def count(self):
+        if self._count is None:
+            if self.search_query:
+                self._count = sum(1 for _ in self._matches())
+            else:
+                self._count = CompactLinkSet.objects.filter(
+                    page=self.page).values_list('link_count', flat=True).first() or 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            position = index + self.count() if index < 0 else index
+            window = self[position:position + 1] if position >= 0 else []
+            if not window:
+                raise IndexError('link index out of range')
+            return window[0]
+
+        start, stop, step = index.indices(self.count())
+        if start >= stop:
+            return []
+        if self.search_query:
+            links = islice(self._matches(), start, stop)
+        else:
+            links = (link for position, link in iter_compact_links(self.page, start, stop)
+                     if start <= position < stop)
+        return list(links)[::step]
+
+    def __iter__(self):
+        if self.search_query:
+            return self._matches()
+        return (link for _, link in iter_compact_links(self.page))
+
+
+def is_compact(page):
+    return page.link_storage == LinkStorage.COMPACT
+
+
+def get_page_links(page, search_query=''):
+    """
+    Return the links of a page, filtered by an optional search query, as
+    something that can be counted, sliced and paginated
+    """
+    if is_compact(page):
+        return CompactLinkList(page, search_query)
+
+    links = page.links.all()
+    if search_query:
+        links = links.filter(
+            Q(name__icontains=search_query) |
+            Q(url__icontains=search_query)
+        )
+    return links
+
+
+def store_page_links(page, links):
+    """
+    Replace the stored links of a page with a {url: name} mapping, picking
+    compact or row storage based on the configured threshold
+    """
+    page.links.all().delete()
+    CompactLinkSet.objects.filter(page=page).delete()
+    CompactLinkChunk.objects.filter(page=page).delete()
+
+    if len(links) >= settings.COMPACT_LINK_THRESHOLD:
+        ordered = sorted(links.items(), key=lambda item: (item[1], item[0]))
+        CompactLinkSet.objects.create(page=page, link_count=len(links))
+        for start in range(0, len(ordered), COMPACT_CHUNK_SIZE):
+            chunk = dict(ordered[start:start + COMPACT_CHUNK_SIZE])
+            CompactLinkChunk.objects.create(
+                page=page, start=start, link_count=len(chunk), data=encode_links(chunk))
+        page.link_storage = LinkStorage.COMPACT
+        return len(links)
+
+    url_ids = Url.objects.intern_many(links)
+    PageLink.objects.bulk_create(
+        (PageLink(page=page, target_id=url_ids[url], name=name)
+         for url, name in links.items()),
+        batch_size=LINK_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    page.link_storage = LinkStorage.ROWS
+    return len(links)
+
+
+def store_page_resources(page, resources):
+    """
+    Replace the resources of a page with a {kind: {url: text}} mapping
+    """
+    PageResource.objects.filter(page=page).delete()
+
+    url_ids = Url.objects.intern_many(
+        {url for found in resources.values() for url in found})
+    PageResource.objects.bulk_create(
+        (PageResource(page=page, kind=kind, target_id=url_ids[url], text=text)
+         for kind, found in resources.items()
+         for url, text in found.items()),
+        batch_size=LINK_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return sum(len(found) for found in resources.values())
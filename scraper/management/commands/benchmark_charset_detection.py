@@ -0,0 +1,62 @@
+import time
+from bs4 import BeautifulSoup, UnicodeDammit
+from django.core.management.base import BaseCommand
+from scraper.charsets import decode_html
+
+
+def synthetic_page(kib, encoding, meta):
+    """A page of about kib KiB with accented text, declaring its encoding in <meta> or not"""
+    head = f'<meta charset="{encoding}">' if meta else ''
+    item = ('<div class="item"><p>Déjà vu au café, crème brûlée à volonté</p>'
+            '<a href="/articles/{i}">Article {i}</a></div>')
+    body = []
+    size = 0
+    while size < kib * 1024:
+        body.append(item.format(i=len(body)))
+        size += len(body[-1])
+    html = f'<html><head>{head}<title>Benchmark</title></head><body>{"".join(body)}</body></html>'
+    return html.encode(encoding)
+
+
+class Command(BaseCommand):
+    help = ('Compare decoding large pages before parsing with handing BeautifulSoup '
+            'the raw bytes, in CPU seconds per page; saved is the decoding CPU '
+            'saved as a share of parsing the bytes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kib', type=int, default=1024,
+                            help='Size of each synthetic page in KiB')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per variant, the best one is reported')
+
+    def handle(self, *args, **options):
+        cases = [
+            ('charset in Content-Type', 'utf-8', False, 'text/html; charset=utf-8'),
+            ('<meta charset>', 'utf-8', True, 'text/html'),
+            ('windows-1252 in header', 'cp1252', False, 'text/html; charset=windows-1252'),
+            ('windows-1252, undeclared', 'cp1252', False, 'text/html'),
+        ]
+
+        def best_of(run):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.process_time()
+                run()
+                timings.append(time.process_time() - start)
+            return min(timings)
+
+        self.stdout.write(f"{options['kib']} KiB pages, best of {options['repeat']}, CPU seconds")
+        self.stdout.write(f'{"page":26} {"path":9} {"dammit":>8} {"fast path":>10} '
+                          f'{"parse bytes":>12} {"parse text":>11} {"saved":>8}')
+        for label, encoding, meta, content_type in cases:
+            data = synthetic_page(options['kib'], encoding, meta)
+            source = decode_html(data, content_type).source
+
+            dammit = best_of(lambda: UnicodeDammit(data, is_html=True))
+            fast = best_of(lambda: decode_html(data, content_type))
+            parse_bytes = best_of(lambda: BeautifulSoup(data, 'html.parser'))
+            parse_text = best_of(lambda: BeautifulSoup(
+                decode_html(data, content_type).text, 'html.parser'))
+            self.stdout.write(
+                f'{label:26} {source:9} {dammit:>8.3f} {fast:>10.3f} {parse_bytes:>12.3f} '
+                f'{parse_text:>11.3f} {(dammit - fast) / parse_bytes:>8.1%}')
@@ -0,0 +1,74 @@
+import time
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand
+from scraper.constants import Extractor
+from scraper.extractors import run_extractors
+from scraper.urlnorm import LinkNormalizer
+
+BASE_URL = 'https://example.com/blog/post'
+
+
+def synthetic_page(links):
+    """A page with the given number of anchors and proportional resources"""
+    head = [
+        '<meta name="description" content="A synthetic page">',
+        '<meta name="robots" content="index, follow">',
+        f'<link rel="canonical" href="{BASE_URL}">',
+        '<link rel="alternate" hreflang="es" href="/es/blog/post">',
+    ]
+    head += [f'<link rel="stylesheet" href="/css/{i}.css">' for i in range(links // 50)]
+    head += [f'<script src="/js/{i}.js"></script>' for i in range(links // 50)]
+
+    body = []
+    for i in range(links):
+        body.append(f'<div class="item"><p>Item {i} <span>text</span></p>'
+                    f'<a href="/articles/{i}">Article {i}</a></div>')
+        if i % 5 == 0:
+            body.append(f'<img src="/img/{i}.png" alt="Image {i}">')
+    return (f'<html><head><title>Benchmark</title>{"".join(head)}</head>'
+            f'<body>{"".join(body)}</body></html>')
+
+
+class Command(BaseCommand):
+    help = ('Compare running every extractor in one traversal with the links '
+            'extractor alone and with one traversal per extractor')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--links', type=int, default=5000,
+                            help='Number of anchors on the synthetic page')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Runs per variant, the best one is reported')
+
+    def handle(self, *args, **options):
+        html = synthetic_page(options['links'])
+
+        start = time.perf_counter()
+        soup = BeautifulSoup(html, 'html.parser')
+        parse_time = time.perf_counter() - start
+
+        def best_of(run):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        variants = [
+            ('links only, one pass', lambda: run_extractors(
+                soup, [Extractor.LINKS], LinkNormalizer(BASE_URL))),
+            ('all extractors, one pass', lambda: run_extractors(
+                soup, Extractor.CHOICES, LinkNormalizer(BASE_URL))),
+            ('all extractors, one pass each', lambda: [
+                run_extractors(soup, [name], LinkNormalizer(BASE_URL))
+                for name in Extractor.CHOICES]),
+        ]
+
+        self.stdout.write(f'{len(html) / 1024:.0f} KiB page, parse {parse_time:.3f}s')
+        baseline = None
+        for label, run in variants:
+            elapsed = best_of(run)
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f'{label:30} {elapsed:.3f}s  {elapsed / baseline:.2f}x  '
+                f'(with parse {(parse_time + elapsed) / (parse_time + baseline):.2f}x)')
@@ -0,0 +1,287 @@
+import asyncio
+import gzip
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from scraper.constants import ScrapingStatus
+from scraper.fetchers import RequestsFetcher, HttpxFetcher, brotli, zstandard, new_httpx_client
+from scraper.latency import Timeouts
+from scraper.models import ScrapedPage
+from scraper.utils import http_session
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h11
+except ImportError:
+    h2 = None
+
+# Codings the stand-in server answers with, most preferred first
+SERVER_CODINGS = ('zstd', 'br', 'gzip')
+TIMEOUTS = Timeouts(10, 30)
+
+
+def synthetic_pages(count=50):
+    """Pages of varying size for when there are no real pages to replay"""
+    return [('<html><head><title>Page</title></head><body>' + ''.join(
+        f'<p><a href="/section/{i}/item/{j}">Item {j} of section {i}</a> with some text</p>'
+        for j in range(20 + i * 20)) + '</body></html>').encode() for i in range(count)]
+
+
+def compressed_variants(body):
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=6)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=5)
+    if zstandard is not None:
+        variants['zstd'] = zstandard.ZstdCompressor(level=3).compress(body)
+    return variants
+
+
+def self_signed_certificate(directory):
+    certfile, keyfile = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    try:
+        subprocess.run(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+             '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost,IP:127.0.0.1',
+             '-keyout', keyfile, '-out', certfile],
+            check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise CommandError(f'Could not create a certificate with openssl: {str(e)}')
+    return certfile, keyfile
+
+
+class StandInServer:
+    """
+    A local TLS server replaying the corpus over HTTP/2 or HTTP/1.1, as
+    negotiated by ALPN, compressed with the client's preferred coding and
+    answering each request after delay seconds. Counts TLS connections.
+    """
+
+    def __init__(self, pages, delay, certfile, keyfile):
+        self.variants = [compressed_variants(body) for body in pages]
+        self.delay = delay
+        self.connections = 0
+        self.ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.ssl_context.load_cert_chain(certfile, keyfile)
+        self.ssl_context.set_alpn_protocols(['h2', 'http/1.1'])
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        threading.Thread(target=self.run, args=(ready,), daemon=True).start()
+        ready.wait()
+
+    def run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(self.loop.create_server(
+            lambda: StandInProtocol(self), '127.0.0.1', 0, ssl=self.ssl_context, backlog=1024))
+        self.port = server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_forever()
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def respond(self, path, accept_encoding):
+        """Status, headers and body for a request"""
+        try:
+            variants = self.variants[int(path.rsplit('/', 1)[-1]) % len(self.variants)]
+        except ValueError:
+            return 404, [('content-length', '0')], b''
+        accepted = {coding.split(';')[0].strip().lower() for coding in accept_encoding.split(',')}
+        coding = next((coding for coding in SERVER_CODINGS
+                       if coding in accepted and coding in variants), 'identity')
+        body = variants[coding]
+        headers = [('content-type', 'text/html; charset=utf-8'),
+                   ('content-length', str(len(body)))]
+        if coding != 'identity':
+            headers.append(('content-encoding', coding))
+        return 200, headers, body
+
+
+class StandInProtocol(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.h2 = None
+        self.h11 = None
+        self.closed = False
+        self.pending = {}  # HTTP/2 stream id -> body bytes waiting for flow control
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+        if transport.get_extra_info('ssl_object').selected_alpn_protocol() == 'h2':
+            self.h2 = h2.connection.H2Connection(
+                h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+            self.h2.initiate_connection()
+            self.transport.write(self.h2.data_to_send())
+        else:
+            self.h11 = h11.Connection(h11.SERVER)
+
+    def connection_lost(self, exc):
+        self.closed = True
+
+    def data_received(self, data):
+        if self.h2 is not None:
+            self.h2_received(data)
+        else:
+            self.h11.receive_data(data)
+            self.h11_process()
+
+    def h2_received(self, data):
+        for event in self.h2.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                headers = dict(event.headers)
+                self.server.loop.call_later(
+                    self.server.delay, self.h2_respond, event.stream_id,
+                    headers[':path'], headers.get('accept-encoding', ''))
+            elif isinstance(event, h2.events.WindowUpdated):
+                for stream_id in list(self.pending):
+                    self.h2_send(stream_id)
+            elif isinstance(event, h2.events.StreamReset):
+                self.pending.pop(event.stream_id, None)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.h2.data_to_send())
+
+    def h2_respond(self, stream_id, path, accept_encoding):
+        if self.closed:
+            return
+        status, headers, body = self.server.respond(path, accept_encoding)
+        self.h2.send_headers(stream_id, [(':status', str(status))] + headers)
+        self.pending[stream_id] = body
+        self.h2_send(stream_id)
+
+    def h2_send(self, stream_id):
+        body = self.pending[stream_id]
+        while body:
+            size = min(len(body), self.h2.local_flow_control_window(stream_id),
+                       self.h2.max_outbound_frame_size)
+            if size <= 0:
+                break
+            self.h2.send_data(stream_id, body[:size])
+            body = body[size:]
+        if body:
+            self.pending[stream_id] = body
+        else:
+            del self.pending[stream_id]
+            self.h2.end_stream(stream_id)
+        self.transport.write(self.h2.data_to_send())
+
+    def h11_process(self):
+        while True:
+            event = self.h11.next_event()
+            if event in (h11.NEED_DATA, h11.PAUSED):
+                return
+            if isinstance(event, h11.Request):
+                headers = {name.decode(): value.decode() for name, value in event.headers}
+                self.request = (event.target.decode(), headers.get('accept-encoding', ''))
+            elif isinstance(event, h11.EndOfMessage):
+                self.server.loop.call_later(self.server.delay, self.h11_respond, *self.request)
+            elif isinstance(event, h11.ConnectionClosed):
+                self.transport.close()
+                return
+
+    def h11_respond(self, path, accept_encoding):
+        if self.closed:
+            return
+        status, headers, body = self.server.respond(path, accept_encoding)
+        self.transport.write(self.h11.send(h11.Response(status_code=status, headers=headers)))
+        self.transport.write(self.h11.send(h11.Data(data=body)))
+        self.transport.write(self.h11.send(h11.EndOfMessage()))
+        if self.h11.our_state is h11.MUST_CLOSE:
+            self.transport.close()
+            return
+        self.h11.start_next_cycle()
+        self.h11_process()
+
+
+class Command(BaseCommand):
+    help = ('Compare page fetch backends in bytes on the wire, decode time and '
+            'pages/sec, replaying real pages from a local TLS server')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*', help='Pages to replay')
+        parser.add_argument('--sample', type=int, default=0,
+                            help='Also replay this many completed scraped pages')
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Fetches per backend')
+        parser.add_argument('--concurrency', type=int, default=50,
+                            help='Concurrent fetches, as in a threads or gevent worker')
+        parser.add_argument('--delay', type=float, default=0.05,
+                            help='Seconds the server waits before answering')
+
+    def handle(self, *args, **options):
+        if h2 is None:
+            raise CommandError('The stand-in server needs h2: pip install "httpx[http2]"')
+
+        pages = self.download(options['urls'] + list(
+            ScrapedPage.objects.filter(status=ScrapingStatus.COMPLETED)
+            .order_by('?').values_list('url', flat=True)[:options['sample']]))
+        if not pages:
+            self.stdout.write('No pages to replay, using synthetic pages')
+            pages = synthetic_pages()
+
+        with tempfile.TemporaryDirectory() as directory:
+            certfile, keyfile = self_signed_certificate(directory)
+            server = StandInServer(pages, options['delay'], certfile, keyfile)
+            try:
+                self.compare(server, certfile, options)
+            finally:
+                server.shutdown()
+
+    def download(self, urls):
+        """The real pages to replay, fetched once, uncompressed"""
+        pages = []
+        for url in urls:
+            try:
+                response = http_session().get(
+                    url, timeout=settings.SCRAPING_TIMEOUT, headers={'Accept-Encoding': 'identity'})
+                response.raise_for_status()
+                pages.append(response.content)
+            except requests.RequestException as e:
+                self.stderr.write(f'Skipping {url}: {str(e)}')
+        return pages
+
+    def compare(self, server, certfile, options):
+        concurrency = options['concurrency']
+        session = requests.Session()
+        session.verify = certfile
+        session.trust_env = False  # a CA bundle from the environment would win over verify
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        session.mount('https://', adapter)
+        client = new_httpx_client(verify=ssl.create_default_context(cafile=certfile),
+                                  limits=httpx.Limits(max_connections=concurrency))
+        fetchers = [RequestsFetcher(session), HttpxFetcher(client)]
+
+        self.stdout.write(
+            f"{len(server.variants)} pages, {options['requests']} fetches per backend, "
+            f"{concurrency} concurrent, {options['delay']}s server delay")
+        self.stdout.write(
+            f'{"backend":10} {"protocol":9} {"pages/sec":>10} {"wire KiB":>9} '
+            f'{"page KiB":>9} {"decode ms":>10} {"connections":>12}')
+        for fetcher in fetchers:
+            connections = server.connections
+            urls = [f'https://localhost:{server.port}/page/{i}' for i in range(options['requests'])]
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                results = list(executor.map(lambda url: fetcher.fetch(url, TIMEOUTS), urls))
+            elapsed = time.perf_counter() - start
+
+            count = len(results)
+            self.stdout.write(
+                f'{fetcher.name:10} {results[0].http_version:9} {count / elapsed:>10.1f} '
+                f'{sum(r.wire_bytes for r in results) / count / 1024:>9.1f} '
+                f'{sum(len(r.content) for r in results) / count / 1024:>9.1f} '
+                f'{sum(r.decode_seconds for r in results) / count * 1000:>10.3f} '
+                f'{server.connections - connections:>12}')
+        session.close()
+        client.close()
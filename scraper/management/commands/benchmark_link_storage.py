@@ -0,0 +1,58 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from scraper.linkstore import store_page_links
+from scraper.models import ScrapedPage
+
+
+def database_size():
+    """Return the on-disk size of the current database in bytes"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_database_size(current_database())')
+            return cursor.fetchone()[0]
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA page_count')
+            page_count = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_size')
+            return page_count * cursor.fetchone()[0]
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Compare disk size and write time of row vs compact link storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--links', type=int, default=100000,
+                            help='Number of links on the synthetic page')
+
+    def handle(self, *args, **options):
+        links = {
+            f'https://www.example.com/section/{i % 50}/article-{i}': f'Article {i}'
+            for i in range(options['links'])
+        }
+        user, _ = User.objects.get_or_create(username='benchmark-link-storage')
+
+        for mode, threshold in (('rows', len(links) + 1), ('compact', 1)):
+            page, _ = ScrapedPage.objects.get_or_create(
+                user=user, url=f'https://benchmark.example.com/{mode}')
+            size_before = database_size()
+
+            start = time.perf_counter()
+            with override_settings(COMPACT_LINK_THRESHOLD=threshold), \
+                    transaction.atomic():
+                store_page_links(page, links)
+                page.save()
+            elapsed = time.perf_counter() - start
+
+            size_after = database_size()
+            if size_before is None:
+                size = 'n/a'
+            else:
+                size = f'{(size_after - size_before) / 1024 / 1024:.1f} MiB'
+            self.stdout.write(
+                f'{mode:8} {len(links)} links: write {elapsed:.2f}s, disk +{size}')
+
+        user.delete()
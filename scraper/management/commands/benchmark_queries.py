@@ -0,0 +1,196 @@
+import hashlib
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from scraper.constants import PAGES_PER_PAGE, LINKS_PER_PAGE
+from scraper.models import ScrapedPage, PageLink
+
+BENCH_USER_PREFIX = 'bench-user-'
+BENCH_URL_PREFIX = 'https://bench.example.com/page/'
+BENCH_TARGET_PREFIX = 'https://target.example.com/link/'
+
+# Vendor specific pieces of the set-based seeding SQL. {n} is the row count.
+SERIES = {
+    'postgresql': 'FROM generate_series(0, {n} - 1) AS g(x)',
+    'sqlite': 'FROM (WITH RECURSIVE s(x) AS (SELECT 0 UNION ALL '
+              'SELECT x + 1 FROM s WHERE x + 1 < {n}) SELECT x FROM s) AS g',
+}
+URL_HASH = {
+    'postgresql': "left(encode(sha256(convert_to({expr}, 'UTF8')), 'hex'), 32)",
+    'sqlite': 'bench_url_hash({expr})',
+}
+CREATED_AT = {
+    'postgresql': "now() - g.x * interval '1 second'",
+    'sqlite': "datetime('now', '-' || g.x || ' seconds')",
+}
+NOW = {
+    'postgresql': 'now()',
+    'sqlite': "datetime('now')",
+}
+
+
+def sqlite_url_hash(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def column_defaults(model, provided):
+    """
+    The NOT NULL columns of a model missing from provided, with their
+    defaults as query parameters, so raw inserts keep up with new fields
+    """
+    fields = [field for field in model._meta.concrete_fields
+              if not field.primary_key and not field.null and field.column not in provided]
+    return ([field.column for field in fields],
+            [field.get_db_prep_save(field.get_default(), connection) for field in fields])
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic corpus and report EXPLAIN plans and latencies '
+            'for the queries behind each view')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1000000)
+        parser.add_argument('--links', type=int, default=100000000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--distinct-urls', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Executions per query for latency stats')
+        parser.add_argument('--skip-seed', action='store_true',
+                            help='Reuse a corpus seeded by a previous run')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in SERIES:
+            raise CommandError(f'Unsupported database vendor: {vendor}')
+        if vendor == 'sqlite':
+            connection.ensure_connection()
+            connection.connection.create_function(
+                'bench_url_hash', 1, sqlite_url_hash, deterministic=True)
+
+        if not options['skip_seed']:
+            self.seed(vendor, options)
+
+        user = User.objects.filter(
+            username__startswith=BENCH_USER_PREFIX).order_by('pk').first()
+        if user is None:
+            raise CommandError('No benchmark corpus found, run without --skip-seed')
+        page = ScrapedPage.objects.filter(user=user).order_by('pk').first()
+
+        self.stdout.write(f'database: {vendor}')
+        self.stdout.write(
+            f'pages: {ScrapedPage.objects.count()}, links: {PageLink.objects.count()}')
+
+        queries = [
+            ('page_list_view: page',
+             ScrapedPage.objects.filter(user=user).order_by('-created_at')[:PAGES_PER_PAGE]),
+            ('page_list_view: count',
+             ScrapedPage.objects.filter(user=user)),
+            ('page_list_view: duplicate check',
+             ScrapedPage.objects.for_url(user, page.url)),
+            ('page_detail_view: links',
+             page.links.all()[:LINKS_PER_PAGE]),
+            ('page_detail_view / page_status_api: count',
+             page.links.all()),
+            ('EmailBackend.authenticate',
+             User.objects.filter(email=user.email)),
+        ]
+
+        for label, queryset in queries:
+            self.report(label, queryset, count=label.endswith('count'),
+                        repeat=options['repeat'])
+
+    def report(self, label, queryset, count, repeat):
+        run = queryset.count if count else (lambda: list(queryset.all()))
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+
+        self.stdout.write(f'\n== {label}')
+        if not count:
+            self.stdout.write(queryset.explain())
+        self.stdout.write(
+            f'p50 {statistics.median(timings):.2f}ms  '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f}ms  '
+            f'max {timings[-1]:.2f}ms')
+
+    def clear(self):
+        """Remove a previous corpus with set-based deletes"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM scraper_pagelink WHERE page_id IN '
+                '(SELECT id FROM scraper_scrapedpage WHERE url LIKE %s)',
+                [f'{BENCH_URL_PREFIX}%'])
+            cursor.execute('DELETE FROM scraper_scrapedpage WHERE url LIKE %s',
+                           [f'{BENCH_URL_PREFIX}%'])
+            cursor.execute('DELETE FROM scraper_url WHERE url LIKE %s',
+                           [f'{BENCH_TARGET_PREFIX}%'])
+        User.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+
+    @transaction.atomic
+    def seed(self, vendor, options):
+        pages, links = options['pages'], options['links']
+        users, distinct = options['users'], options['distinct_urls']
+        links_per_page = max(links // pages, 1)
+        if links_per_page > distinct:
+            raise CommandError('--distinct-urls must be at least links per page')
+
+        self.stdout.write(
+            f'seeding {users} users, {pages} pages, {links} links, '
+            f'{distinct} distinct urls')
+
+        self.clear()
+        User.objects.bulk_create(
+            User(username=f'{BENCH_USER_PREFIX}{i}',
+                 email=f'{BENCH_USER_PREFIX}{i}@example.com')
+            for i in range(users)
+        )
+        first_user = User.objects.filter(
+            username__startswith=BENCH_USER_PREFIX).order_by('pk').first().pk
+
+        page_url = f"'{BENCH_URL_PREFIX}' || g.x"
+        target_url = f"'{BENCH_TARGET_PREFIX}' || g.x"
+
+        page_columns = ['user_id', 'url', 'url_hash', 'title', 'status', 'link_storage',
+                        'created_at', 'updated_at']
+        default_columns, defaults = column_defaults(ScrapedPage, page_columns)
+
+        with connection.cursor() as cursor:
+            start = time.perf_counter()
+            cursor.execute(
+                f'INSERT INTO scraper_scrapedpage ({", ".join(page_columns + default_columns)}) '
+                f'SELECT {first_user} + g.x % {users}, {page_url}, '
+                f'{URL_HASH[vendor].format(expr=page_url)}, '
+                f"'', 'completed', 'rows', {CREATED_AT[vendor]}, {NOW[vendor]}"
+                + ''.join(', %s' for _ in defaults) + ' '
+                + SERIES[vendor].format(n=pages),
+                defaults,
+            )
+            cursor.execute(
+                'SELECT min(id) FROM scraper_scrapedpage WHERE url = %s',
+                [f'{BENCH_URL_PREFIX}0'])
+            first_page = cursor.fetchone()[0]
+
+            cursor.execute(
+                'INSERT INTO scraper_url (url_hash, url) '
+                f'SELECT {URL_HASH[vendor].format(expr=target_url)}, {target_url} '
+                + SERIES[vendor].format(n=distinct)
+            )
+            cursor.execute(
+                'SELECT min(id) FROM scraper_url WHERE url = %s',
+                [f'{BENCH_TARGET_PREFIX}0'])
+            first_url = cursor.fetchone()[0]
+
+            cursor.execute(
+                'INSERT INTO scraper_pagelink (page_id, target_id, name, created_at) '
+                f'SELECT {first_page} + g.x / {links_per_page}, '
+                f'{first_url} + g.x % {distinct}, '
+                f"'Link ' || g.x, {NOW[vendor]} "
+                + SERIES[vendor].format(n=links_per_page * pages)
+            )
+            cursor.execute('ANALYZE')
+            self.stdout.write(f'seeded in {time.perf_counter() - start:.1f}s')
@@ -0,0 +1,132 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from scraper.constants import (
+    WEB_IMPORT_BUDGET_SECONDS, WEB_RSS_BUDGET_MB, WEB_FORBIDDEN_MODULES, WORKER_PRELOAD_MODULES
+)
+from .loadtest_views import free_port
+
+# What a fresh interpreter imports to become a web process or a worker
+PROCESSES = (
+    ('web', ('web_scraping_app.urls',)),
+    ('worker', ('web_scraping_app.urls', *WORKER_PRELOAD_MODULES)),
+)
+
+# Run in a fresh interpreter, printing what importing the modules cost as JSON
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+for module in {modules!r}:
+    __import__(module)
+seconds = time.perf_counter() - start
+# ru_maxrss outlives exec, so it can be the peak of whatever started this
+# interpreter; Linux reports the peak of this one as VmHWM
+try:
+    with open('/proc/self/status') as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+except OSError:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    'seconds': seconds,
+    'rss_mb': rss_kb / 1024,
+    'modules': sorted(sys.modules),
+}}))
+'''
+
+
+def measure_startup(modules, importtime=False):
+    """
+    Set up Django and import modules in a fresh interpreter, returning its
+    report and, with importtime, Python's -X importtime log
+    """
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []),
+               '-c', PROBE.format(modules=tuple(modules))]
+    result = subprocess.run(command, capture_output=True, text=True, env=dict(os.environ))
+    if result.returncode:
+        raise CommandError(f'Importing {", ".join(modules)} failed:\n{result.stderr}')
+    return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+
+def top_level_imports(log, count):
+    """The count slowest packages imported directly, as (cumulative seconds, name)"""
+    imports = []
+    for line in log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented under the one that triggered them
+        if not name[1:].startswith(' '):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+class Command(BaseCommand):
+    help = ('Measure how long web processes and workers take to start: imports '
+            'with -X importtime, peak RSS, and the time gunicorn takes to serve '
+            'its first request')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15,
+                            help='Slowest top-level imports listed per process')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Runs per measurement, the best one is reported')
+        parser.add_argument('--skip-server', action='store_true',
+                            help='Do not start gunicorn to time the first request')
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+        self.stdout.write(f'Best of {repeat}, budget of a web process: '
+                          f'{WEB_IMPORT_BUDGET_SECONDS:.1f}s, {WEB_RSS_BUDGET_MB} MB')
+        self.stdout.write(f'{"process":8} {"import s":>9} {"rss MB":>7} {"modules":>8}  scraping stack')
+        for name, modules in PROCESSES:
+            runs = [measure_startup(modules)[0] for _ in range(repeat)]
+            report = min(runs, key=lambda run: run['seconds'])
+            loaded = [module for module in WEB_FORBIDDEN_MODULES if module in report['modules']]
+            self.stdout.write(f'{name:8} {report["seconds"]:>9.3f} {report["rss_mb"]:>7.1f} '
+                              f'{len(report["modules"]):>8}  {", ".join(loaded) or "-"}')
+
+        for name, modules in PROCESSES:
+            _, log = measure_startup(modules, importtime=True)
+            self.stdout.write(f'\nSlowest imports of a {name} process (cumulative seconds)')
+            for seconds, module in top_level_imports(log, options['top']):
+                self.stdout.write(f'  {seconds:>7.3f}  {module}')
+
+        if not options['skip_server']:
+            ready, first = min(self.first_request() for _ in range(repeat))
+            self.stdout.write(f'\ngunicorn served its first request {ready:.2f}s after starting, '
+                              f'which took {first * 1000:.0f} ms')
+
+    def first_request(self):
+        """Seconds from starting gunicorn until it answers, and how long that answer took"""
+        port = free_port()
+        url = f'http://127.0.0.1:{port}/login/'
+        env = dict(os.environ, DEBUG='False',
+                   ALLOWED_HOSTS=','.join(settings.ALLOWED_HOSTS + ['127.0.0.1']))
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+             '--workers', '1', '--log-level', 'warning', 'web_scraping_app.wsgi:application'],
+            env=env)
+        try:
+            while time.perf_counter() - start < 30:
+                if server.poll() is not None:
+                    raise CommandError('gunicorn exited, is it installed?')
+                sent = time.perf_counter()
+                try:
+                    requests.get(url, timeout=5)
+                except requests.ConnectionError:
+                    time.sleep(0.01)
+                    continue
+                answered = time.perf_counter()
+                return answered - start, answered - sent
+            raise CommandError('gunicorn did not start within 30 seconds')
+        finally:
+            server.terminate()
+            server.wait()
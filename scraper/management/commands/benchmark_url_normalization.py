@@ -0,0 +1,64 @@
+import random
+import time
+from urllib.parse import urljoin
+from django.core.management.base import BaseCommand
+from scraper.urlnorm import LinkNormalizer, is_valid_url
+
+
+BASE_URL = 'https://Example.com:443/blog/post'
+
+HREF_TEMPLATES = (
+    '/articles/{n}',
+    '/articles/{n}#comments',
+    'https://example.com/articles/{n}',
+    'HTTPS://EXAMPLE.COM:443/articles/{n}?',
+    'related/{n}',
+    '//cdn.example.com/img/{n}.png',
+    'mailto:user{n}@example.com',
+    'javascript:void({n})',
+    '#section-{n}',
+)
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark href resolution: urljoin + is_valid_url vs LinkNormalizer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hrefs', type=int, default=100000,
+                            help='Number of hrefs on the synthetic page')
+        parser.add_argument('--distinct', type=int, default=5000,
+                            help='Number of distinct link targets')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        hrefs = [
+            rng.choice(HREF_TEMPLATES).format(n=rng.randrange(options['distinct']))
+            for _ in range(options['hrefs'])
+        ]
+
+        start = time.perf_counter()
+        legacy_urls = set()
+        for href in hrefs:
+            absolute_url = urljoin(BASE_URL, href)
+            if is_valid_url(absolute_url):
+                legacy_urls.add(absolute_url)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        normalizer = LinkNormalizer(BASE_URL)
+        normalized_urls = set()
+        for href in hrefs:
+            url = normalizer.normalize(href)
+            if url:
+                normalized_urls.add(url)
+        normalized_time = time.perf_counter() - start
+
+        self.stdout.write(f'hrefs: {len(hrefs)}')
+        self.stdout.write(
+            f'urljoin + is_valid_url: {legacy_time:.3f}s '
+            f'({len(hrefs) / legacy_time:,.0f} hrefs/s), {len(legacy_urls)} unique links')
+        self.stdout.write(
+            f'LinkNormalizer:         {normalized_time:.3f}s '
+            f'({len(hrefs) / normalized_time:,.0f} hrefs/s), {len(normalized_urls)} unique links')
+        self.stdout.write(f'speedup: {legacy_time / normalized_time:.1f}x')
@@ -0,0 +1,156 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from scraper.constants import Extractor
+from scraper.extractors import run_extractors
+from scraper.urlnorm import LinkNormalizer
+from scraper.utils import http_session
+
+DEFAULT_POOLS = ['prefork:4', 'threads:100', 'gevent:100']
+
+
+def fetch_and_extract(url):
+    """The network-bound part of a scrape: fetch, parse and extract links"""
+    response = http_session().get(url, timeout=30)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.content, 'html.parser')
+    return len(run_extractors(soup, [Extractor.LINKS], LinkNormalizer(url))[Extractor.LINKS])
+
+
+def slow_server(delay, links):
+    """A local HTTP server answering every request with a page after delay seconds"""
+    body = ('<html><head><title>Slow page</title></head><body>' + ''.join(
+        f'<a href="/page/{i}">Page {i}</a>' for i in range(links)) + '</body></html>').encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def tree_rss_kib(pid):
+    """Resident memory of a process and all of its descendants, from /proc"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as stat:
+                    parents[int(entry)] = int(stat.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                continue
+
+    tree, total = [pid], 0
+    while tree:
+        current = tree.pop()
+        tree += [child for child, parent in parents.items() if parent == current]
+        try:
+            with open(f'/proc/{current}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+class Command(BaseCommand):
+    help = ('Compare Celery worker pools scraping pages from a local slow HTTP '
+            'server, in pages/sec and resident memory')
+
+    def add_arguments(self, parser):
+        parser.add_argument('pools', nargs='*', default=DEFAULT_POOLS,
+                            help='Pools to compare as name:concurrency '
+                                 f'(default: {" ".join(DEFAULT_POOLS)})')
+        parser.add_argument('--pages', type=int, default=500,
+                            help='Pages scraped per pool')
+        parser.add_argument('--delay', type=float, default=0.5,
+                            help='Seconds the server waits before answering')
+        parser.add_argument('--links', type=int, default=200,
+                            help='Links on every served page')
+        parser.add_argument('--url', help='Run one pool against this URL (internal)')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            return self.run_pool(options['pools'][0], options['url'], options['pages'])
+
+        server = slow_server(options['delay'], options['links'])
+        url = f'http://127.0.0.1:{server.server_port}/'
+        self.stdout.write(
+            f"{options['pages']} pages, {options['delay']}s server delay, "
+            f"{options['links']} links per page")
+        self.stdout.write(f'{"pool":16} {"pages/sec":>10} {"RSS MiB":>9}')
+        try:
+            for pool in options['pools']:
+                result = self.run_child(pool, url, options['pages'])
+                self.stdout.write(
+                    f'{pool:16} {result["pages_per_sec"]:>10.1f} '
+                    f'{result["rss_kib"] / 1024:>9.0f}')
+        finally:
+            server.shutdown()
+
+    def run_child(self, pool, url, pages):
+        """Run one pool in a fresh process, patched the way `celery worker -P` does"""
+        name = pool.split(':')[0]
+        manage = str(settings.BASE_DIR / 'manage.py')
+        argv = [manage, 'benchmark_worker_pools', pool, '--url', url, '--pages', str(pages)]
+        code = (
+            'import runpy, sys, celery; '
+            f'celery.maybe_patch_concurrency(["-P", {name!r}]); '
+            f'sys.argv = {argv!r}; '
+            'runpy.run_path(sys.argv[0], run_name="__main__")'
+        )
+        env = dict(os.environ, SCRAPER_HTTP_POOL_SIZE=pool.split(':')[1])
+        completed = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                                   text=True, env=env)
+        if completed.returncode:
+            raise CommandError(f'{pool} failed:\n{completed.stderr}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def run_pool(self, pool, url, pages):
+        from celery import current_app
+        from celery.concurrency import get_implementation
+
+        name, concurrency = pool.split(':')
+        task_pool = get_implementation(name)(
+            int(concurrency), app=current_app, initargs=(current_app, 'benchmark'))
+        task_pool.start()
+
+        finished = threading.Event()
+        done = []
+
+        def on_done(result):
+            done.append(result)
+            if len(done) == pages:
+                finished.set()
+
+        start = time.perf_counter()
+        for _ in range(pages):
+            task_pool.apply_async(fetch_and_extract, args=(url,), callback=on_done)
+        finished.wait()
+        elapsed = time.perf_counter() - start
+
+        rss_kib = tree_rss_kib(os.getpid())
+        task_pool.stop()
+        self.stdout.write(json.dumps({'pages_per_sec': pages / elapsed, 'rss_kib': rss_kib}))
@@ -0,0 +1,298 @@
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.utils import timezone
+from scraper.aggregates import rebuild_user_stats
+from scraper.constants import ScrapingStatus, LinkStorage, PAGES_PER_PAGE, LINKS_PER_PAGE
+from scraper.middleware import QUERY_COUNT_HEADER
+from scraper.models import ScrapedPage, Url
+
+LOADTEST_USER_PREFIX = 'loadtest-'
+LOADTEST_URL_PREFIX = 'https://loadtest.example.com/page/'
+LOADTEST_TARGET_PREFIX = 'https://loadtest.example.com/link/'
+SEED_BATCH_SIZE = 1000
+VIEWS = ('page_list_view', 'page_detail_view', 'page_status_api')
+# Metrics compared with a baseline, and whether a higher value is better
+BASELINE_METRICS = (('rps', True), ('p95_ms', False))
+
+
+def parse_scale(value):
+    """A data scale written PAGESxLINKS: pages of one user, links per page"""
+    try:
+        pages, links = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise CommandError(f'Scales are written PAGESxLINKS, not {value!r}')
+    if pages < 1 or links < 0:
+        raise CommandError(f'A scale needs at least one page: {value!r}')
+    return pages, links
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ('Load test page_list_view, page_detail_view and page_status_api '
+            'under gunicorn at several data scales, reporting p50/p95/p99 '
+            'latency, requests/sec and queries per request, optionally '
+            'against a saved baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='append', dest='scales',
+                            help='PAGESxLINKS for one user, repeatable '
+                                 '(default: 100x100, 1000x1000, 10000x200)')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Measured requests per view and scale')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Concurrent clients')
+        parser.add_argument('--workers', type=int, default=2,
+                            help='gunicorn worker processes')
+        parser.add_argument('--threads', type=int, default=2,
+                            help='gunicorn threads per worker')
+        parser.add_argument('--server',
+                            help='Load test this running server (WSGI or ASGI) instead of '
+                                 'starting gunicorn; set REPORT_QUERY_COUNT on it')
+        parser.add_argument('--skip-seed', action='store_true',
+                            help='Reuse load test users seeded by a previous run')
+        parser.add_argument('--save-baseline', metavar='PATH',
+                            help='Write the results to a JSON baseline')
+        parser.add_argument('--baseline', metavar='PATH',
+                            help='Compare with a JSON baseline and fail on regressions')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative drop in requests/sec or rise in '
+                                 'p95 latency before a view counts as regressed')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random pages and pagination requested')
+
+    def handle(self, *args, **options):
+        scales = [parse_scale(scale) for scale in options['scales']
+                  or ('100x100', '1000x1000', '10000x200')]
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        users = [(pages, links, self.seed_user(pages, links, options['skip_seed']))
+                 for pages, links in scales]
+
+        server = None
+        if options['server']:
+            base_url = options['server'].rstrip('/')
+        else:
+            server, base_url = self.start_gunicorn(options)
+        try:
+            results = {}
+            for pages, links, user in users:
+                results[f'{pages}x{links}'] = self.load_test(base_url, user, links, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        report = {
+            'database': connection.vendor,
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'scales': results,
+        }
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+        if baseline is not None:
+            self.compare(report, baseline, options['tolerance'])
+
+    def seed_user(self, pages, links, skip_seed):
+        """The load test user of a scale, with its pages and links seeded"""
+        email = f'{LOADTEST_USER_PREFIX}{pages}x{links}@example.com'
+        user = User.objects.filter(username=email).first()
+        if user is not None and (
+                skip_seed or ScrapedPage.objects.filter(user=user).count() == pages):
+            return user
+        if skip_seed:
+            raise CommandError(f'No load test data for {pages}x{links}, run without --skip-seed')
+
+        self.stdout.write(f'Seeding {pages} pages with {links} links each for {email}')
+        start = time.perf_counter()
+        with transaction.atomic():
+            User.objects.filter(username=email).delete()
+            user = User.objects.create_user(username=email, email=email)
+
+            # Link targets are shared by every page, as popular ones are
+            url_ids = Url.objects.intern_many(
+                [f'{LOADTEST_TARGET_PREFIX}{i}' for i in range(links)])
+            for offset in range(0, pages, SEED_BATCH_SIZE):
+                ScrapedPage.objects.bulk_create(
+                    ScrapedPage(user=user, url=f'{LOADTEST_URL_PREFIX}{i}',
+                                title=f'Load test page {i}', status=ScrapingStatus.COMPLETED,
+                                link_storage=LinkStorage.ROWS)
+                    for i in range(offset, min(offset + SEED_BATCH_SIZE, pages)))
+
+            # Set-based, so millions of links seed in seconds
+            target_ids = list(url_ids.values())
+            with connection.cursor() as cursor:
+                for offset in range(0, len(target_ids), SEED_BATCH_SIZE):
+                    batch = target_ids[offset:offset + SEED_BATCH_SIZE]
+                    cursor.execute(
+                        'INSERT INTO scraper_pagelink (page_id, target_id, name, created_at) '
+                        "SELECT p.id, u.id, 'Link ' || u.id, %s "
+                        'FROM scraper_scrapedpage p CROSS JOIN scraper_url u '
+                        f'WHERE p.user_id = %s AND u.id IN ({", ".join(["%s"] * len(batch))})',
+                        [timezone.now(), user.pk, *batch])
+
+            # Links inserted in SQL bypass the scrape that would count them
+            rebuild_user_stats(user)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(f'Seeded in {time.perf_counter() - start:.1f}s')
+        return user
+
+    def start_gunicorn(self, options):
+        """Serve the project with gunicorn, as the Docker image does, reporting query counts"""
+        port = free_port()
+        env = dict(os.environ, DEBUG='False', REPORT_QUERY_COUNT='True',
+                   ALLOWED_HOSTS=','.join(settings.ALLOWED_HOSTS + ['127.0.0.1']))
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+             '--workers', str(options['workers']), '--threads', str(options['threads']),
+             '--worker-class', 'gthread', '--log-level', 'warning',
+             'web_scraping_app.wsgi:application'],
+            env=env)
+        base_url = f'http://127.0.0.1:{port}'
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('gunicorn exited, is it installed?')
+            try:
+                requests.get(f'{base_url}/login/', timeout=5)
+                return server, base_url
+            except requests.RequestException:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError('gunicorn did not start within 30 seconds')
+
+    def load_test(self, base_url, user, links, options):
+        """Results per view for a load test user whose pages have links links each"""
+        client = Client()
+        client.force_login(user)
+        session_cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+        page_ids = list(ScrapedPage.objects.filter(user=user).order_by('pk')
+                        .values_list('pk', flat=True))
+        rng = random.Random(options['seed'])
+        paths = {
+            'page_list_view': lambda: (
+                f'/pages/?page={rng.randint(1, -(-len(page_ids) // PAGES_PER_PAGE))}'),
+            'page_detail_view': lambda: (
+                f'/pages/{rng.choice(page_ids)}/'
+                f'?page={rng.randint(1, max(1, -(-links // LINKS_PER_PAGE)))}'),
+            'page_status_api': lambda: f'/api/pages/{rng.choice(page_ids)}/status/',
+        }
+
+        self.stdout.write(f'\n== {len(page_ids)} pages, {len(page_ids) * links} links')
+        self.stdout.write(f'{"view":18} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} '
+                          f'{"p99 ms":>8} {"queries":>8} {"errors":>7}')
+        results = {}
+        for view in VIEWS:
+            # Warm up connections and caches with a request per client first
+            urls = [base_url + paths[view]() for _ in range(
+                options['concurrency'] + options['requests'])]
+            self.run(urls[:options['concurrency']], session_cookie, options['concurrency'])
+            results[view] = self.run(
+                urls[options['concurrency']:], session_cookie, options['concurrency'])
+            row = results[view]
+            self.stdout.write(
+                f"{view:18} {row['rps']:>8.1f} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                f"{row['p99_ms']:>8.1f} {self.format_queries(row['queries']):>8} "
+                f"{row['errors']:>7}")
+        return results
+
+    def run(self, urls, session_cookie, concurrency):
+        """Fetch urls with concurrent clients, each reusing its connection"""
+        local = threading.local()
+
+        def fetch(url):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+                local.session.cookies.set(settings.SESSION_COOKIE_NAME, session_cookie)
+            start = time.perf_counter()
+            try:
+                response = local.session.get(url, allow_redirects=False, timeout=60)
+            except requests.RequestException:
+                return time.perf_counter() - start, None, None
+            return (time.perf_counter() - start, response.status_code,
+                    response.headers.get(QUERY_COUNT_HEADER))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            samples = list(executor.map(fetch, urls))
+        elapsed = time.perf_counter() - start
+
+        timings = [seconds * 1000 for seconds, _, _ in samples]
+        quantiles = statistics.quantiles(timings, n=100, method='inclusive')
+        queries = [int(count) for _, _, count in samples if count is not None]
+        return {
+            'rps': len(samples) / elapsed,
+            'p50_ms': quantiles[49],
+            'p95_ms': quantiles[94],
+            'p99_ms': quantiles[98],
+            'queries': statistics.mean(queries) if queries else None,
+            'errors': sum(status != 200 for _, status, _ in samples),
+        }
+
+    def format_queries(self, queries):
+        return '-' if queries is None else f'{queries:.1f}'
+
+    def compare(self, report, baseline, tolerance):
+        """Print the change against a baseline and fail if any view regressed"""
+        self.stdout.write(f'\n== Against the baseline (tolerance {tolerance:.0%})')
+        regressions = []
+        for scale, views in report['scales'].items():
+            for view, row in views.items():
+                base = baseline.get('scales', {}).get(scale, {}).get(view)
+                if base is None:
+                    self.stdout.write(f'{scale:12} {view:18} not in the baseline')
+                    continue
+                changes = []
+                for metric, higher_is_better in BASELINE_METRICS:
+                    change = row[metric] / base[metric] - 1 if base[metric] else 0
+                    changes.append(f'{metric} {change:+.0%}')
+                    if (-change if higher_is_better else change) > tolerance:
+                        regressions.append(f'{scale} {view}: {metric} {change:+.0%}')
+                # Fragment cache hits vary the mean a little; a new query or
+                # an N+1 adds at least one per request
+                if (row['queries'] is not None and base['queries'] is not None
+                        and row['queries'] >= base['queries'] + 1):
+                    regressions.append(f"{scale} {view}: queries "
+                                       f"{base['queries']:.1f} -> {row['queries']:.1f}")
+                changes.append(f"queries {self.format_queries(base['queries'])} -> "
+                               f"{self.format_queries(row['queries'])}")
+                if row['errors'] > base['errors']:
+                    regressions.append(f"{scale} {view}: {row['errors']} errors")
+                self.stdout.write(f'{scale:12} {view:18} {", ".join(changes)}')
+
+        if baseline.get('database') != report['database']:
+            self.stdout.write(self.style.WARNING(
+                f"The baseline was taken on {baseline.get('database')}, "
+                f"this run on {report['database']}"))
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(f'{len(regressions)} regressions against the baseline')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from scraper.aggregates import rebuild_user_stats
+from scraper.models import UserPageStats
+
+
+class Command(BaseCommand):
+    help = ('Recompute the per-user page totals and domain counts from the stored '
+            'pages and links, repairing any drift in the incrementally kept stats')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the stats of the user with this email')
+        parser.add_argument('--totals-only', action='store_true',
+                            help='Keep the per-page domain histograms instead of recounting '
+                                 'every stored link, and only re-add them up')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(email=options['user'])
+
+        repaired = 0
+        for user in users.iterator():
+            before = UserPageStats.objects.filter(user=user).first()
+            rebuild_user_stats(user, histograms=not options['totals_only'])
+            after = UserPageStats.objects.get(user=user)
+            if before is None or (before.by_status, before.links) != (after.by_status, after.links):
+                repaired += 1
+                self.stdout.write(
+                    f'{user.email}: {before.pages if before else 0} pages, '
+                    f'{before.links if before else 0} links -> '
+                    f'{after.pages} pages, {after.links} links')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats of {users.count()} users, {repaired} repaired'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from scraper.models import DeadLetter
+from scraper.retries import replay_dead_letters
+from scraper.tasks import queue_bulk_scrape, dispatch_bulk_scrapes_task
+from scraper.constants import FailureClass
+
+
+class Command(BaseCommand):
+    help = 'Queue the pages of dead-lettered scrapes for scraping again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failure-class', choices=FailureClass.CHOICES,
+                            help='Only replay failures of this class')
+        parser.add_argument('--user', help='Only replay pages of this user (email)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the pages that would be queued')
+
+    def handle(self, *args, **options):
+        dead_letters = DeadLetter.objects.filter(replayed_at__isnull=True)
+        if options['failure_class']:
+            dead_letters = dead_letters.filter(failure_class=options['failure_class'])
+        if options['user']:
+            dead_letters = dead_letters.filter(page__user__email=options['user'])
+
+        if options['dry_run']:
+            pages = dead_letters.values('page_id').distinct().count()
+            self.stdout.write(f'{pages} pages would be queued')
+            return
+
+        queued = replay_dead_letters(dead_letters, queue_bulk_scrape)
+        dispatch_bulk_scrapes_task()
+        self.stdout.write(f'{queued} pages queued')
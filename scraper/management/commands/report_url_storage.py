@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+from scraper.models import PageLink, Url
+
+# Size of the bigint foreign key each PageLink row stores instead of the URL
+URL_ID_BYTES = 8
+
+
+class Command(BaseCommand):
+    help = 'Report URL storage saved by interning link targets in the Url table'
+
+    def handle(self, *args, **options):
+        link_count = PageLink.objects.count()
+        url_count = Url.objects.count()
+
+        inline_bytes = PageLink.objects.aggregate(
+            total=Sum(Length('target__url')))['total'] or 0
+        url_table = Url.objects.aggregate(
+            urls=Sum(Length('url')), hashes=Sum(Length('url_hash')))
+        interned_bytes = (
+            (url_table['urls'] or 0)
+            + (url_table['hashes'] or 0)
+            + link_count * URL_ID_BYTES
+        )
+
+        self.stdout.write(f'links: {link_count}')
+        self.stdout.write(f'distinct urls: {url_count}')
+        if url_count:
+            self.stdout.write(f'links per url: {link_count / url_count:.1f}')
+        self.stdout.write(f'inline url bytes: {inline_bytes:,}')
+        self.stdout.write(f'interned url bytes: {interned_bytes:,}')
+        if inline_bytes:
+            saved = 1 - interned_bytes / inline_bytes
+            self.stdout.write(f'reduction: {saved:.1%}')
@@ -0,0 +1,64 @@
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from .routers import pinned_to_primary, wrote_to_primary
+
+PIN_COOKIE = 'db_primary_pin'
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keep a client on the primary database for a short while after it wrote
+    something, so it reads its own writes despite replication lag
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned_token = pinned_to_primary.set(PIN_COOKIE in request.COOKIES)
+        wrote_token = wrote_to_primary.set(False)
+        try:
+            response = self.get_response(request)
+            if wrote_to_primary.get():
+                response.set_cookie(
+                    PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_SECONDS,
+                    httponly=True,
+                    samesite='Lax',
+                )
+            return response
+        finally:
+            wrote_to_primary.reset(wrote_token)
+            pinned_to_primary.reset(pinned_token)
+
+
+class QueryCountMiddleware:
+    """
+    Report how many database queries a request ran, on every connection,
+    in an X-Query-Count response header; queries made while a streaming
+    body is sent are not counted. Only installed when REPORT_QUERY_COUNT
+    is set, for load tests.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REPORT_QUERY_COUNT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        response[QUERY_COUNT_HEADER] = str(count)
+        return response
@@ -0,0 +1,34 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='pagelink',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='pagelink',
+            name='url',
+            field=models.URLField(max_length=2000, null=True),
+        ),
+        migrations.CreateModel(
+            name='Url',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(max_length=32, unique=True)),
+                ('url', models.URLField(max_length=2000)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pagelink',
+            name='target',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='page_links', to='scraper.url'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+import hashlib
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def hash_url(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def populate_targets(apps, schema_editor):
+    """Intern every PageLink.url into the Url table and point links at it"""
+    Url = apps.get_model('scraper', 'Url')
+    PageLink = apps.get_model('scraper', 'PageLink')
+    db_alias = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        links = list(
+            PageLink.objects.using(db_alias).filter(pk__gt=last_id, target__isnull=True)
+            .order_by('pk').only('pk', 'url')[:BATCH_SIZE]
+        )
+        if not links:
+            break
+        last_id = links[-1].pk
+
+        hashes = {link.url: hash_url(link.url) for link in links}
+        Url.objects.using(db_alias).bulk_create(
+            [Url(url=url, url_hash=url_hash) for url, url_hash in hashes.items()],
+            ignore_conflicts=True,
+        )
+        ids = dict(Url.objects.using(db_alias).filter(
+            url_hash__in=list(hashes.values())).values_list('url_hash', 'id'))
+
+        for link in links:
+            link.target_id = ids[hashes[link.url]]
+        PageLink.objects.using(db_alias).bulk_update(links, ['target'])
+
+
+def populate_urls(apps, schema_editor):
+    """Copy the interned URL back onto PageLink.url"""
+    PageLink = apps.get_model('scraper', 'PageLink')
+    db_alias = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        links = list(
+            PageLink.objects.using(db_alias).filter(pk__gt=last_id)
+            .order_by('pk').select_related('target')[:BATCH_SIZE]
+        )
+        if not links:
+            break
+        last_id = links[-1].pk
+
+        for link in links:
+            link.url = link.target.url
+        PageLink.objects.using(db_alias).bulk_update(links, ['url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0002_url'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_targets, populate_urls),
+    ]
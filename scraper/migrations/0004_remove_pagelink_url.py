@@ -0,0 +1,25 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0003_populate_pagelink_target'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='pagelink',
+            unique_together={('page', 'target')},
+        ),
+        migrations.AlterField(
+            model_name='pagelink',
+            name='target',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='page_links', to='scraper.url'),
+        ),
+        migrations.RemoveField(
+            model_name='pagelink',
+            name='url',
+        ),
+    ]
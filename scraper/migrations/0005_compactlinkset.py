@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0004_remove_pagelink_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactLinkSet',
+            fields=[
+                ('page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='compact_links', serialize=False, to='scraper.scrapedpage')),
+                ('data', models.BinaryField()),
+                ('link_count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='link_storage',
+            field=models.CharField(choices=[('rows', 'Rows'), ('compact', 'Compact')], default='rows', max_length=10),
+        ),
+    ]
@@ -0,0 +1,43 @@
+import hashlib
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def hash_url(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def populate_url_hashes(apps, schema_editor):
+    ScrapedPage = apps.get_model('scraper', 'ScrapedPage')
+    db_alias = schema_editor.connection.alias
+
+    last_id = 0
+    while True:
+        pages = list(
+            ScrapedPage.objects.using(db_alias).filter(pk__gt=last_id)
+            .order_by('pk').only('pk', 'url')[:BATCH_SIZE]
+        )
+        if not pages:
+            break
+        last_id = pages[-1].pk
+
+        for page in pages:
+            page.url_hash = hash_url(page.url)
+        ScrapedPage.objects.using(db_alias).bulk_update(pages, ['url_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0005_compactlinkset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='url_hash',
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(populate_url_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations, models
+
+EMAIL_INDEX = 'scraper_auth_user_email'
+
+
+def create_email_index(apps, schema_editor):
+    """
+    EmailBackend looks users up by exact email. auth_user belongs to
+    django.contrib.auth, so the index is created here with plain SQL:
+    a hash index on PostgreSQL, a regular index elsewhere.
+    """
+    table = schema_editor.quote_name('auth_user')
+    name = schema_editor.quote_name(EMAIL_INDEX)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING hash (email)')
+    else:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} (email)')
+
+
+def drop_email_index(apps, schema_editor):
+    schema_editor.execute(
+        f'DROP INDEX IF EXISTS {schema_editor.quote_name(EMAIL_INDEX)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('scraper', '0006_scrapedpage_url_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scrapedpage',
+            name='url_hash',
+            field=models.CharField(editable=False, max_length=32),
+        ),
+        migrations.AlterUniqueTogether(
+            name='scrapedpage',
+            unique_together={('user', 'url_hash')},
+        ),
+        migrations.AddIndex(
+            model_name='scrapedpage',
+            index=models.Index(fields=['user', '-created_at'], name='scraper_page_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='pagelink',
+            index=models.Index(fields=['page', 'name'], include=('target',), name='scraper_link_page_name'),
+        ),
+        migrations.RunPython(create_email_index, drop_email_index),
+    ]
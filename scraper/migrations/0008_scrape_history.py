@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import F
+
+# Existing pages get their first scheduled check an hour after their last
+# scrape; pages that are already overdue are picked up by batched sweeps.
+FIRST_CHECK_DELAY = timedelta(hours=1)
+
+
+def schedule_existing_pages(apps, schema_editor):
+    ScrapedPage = apps.get_model('scraper', 'ScrapedPage')
+    db_alias = schema_editor.connection.alias
+    ScrapedPage.objects.using(db_alias).filter(
+        status__in=['completed', 'failed'],
+    ).update(next_check_at=F('updated_at') + FIRST_CHECK_DELAY)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0007_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('links_hash', models.CharField(max_length=32)),
+                ('link_count', models.PositiveIntegerField(default=0)),
+                ('changed', models.BooleanField(default=True)),
+                ('scraped_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-scraped_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='refresh_interval',
+            field=models.PositiveIntegerField(blank=True, help_text='Seconds between scheduled re-scrapes', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scrapedpage',
+            index=models.Index(fields=['next_check_at'], name='scraper_page_next_check'),
+        ),
+        migrations.AddField(
+            model_name='scrapehistory',
+            name='page',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='scraper.scrapedpage'),
+        ),
+        migrations.AddIndex(
+            model_name='scrapehistory',
+            index=models.Index(fields=['page', '-scraped_at'], name='scraper_history_page_scraped'),
+        ),
+        migrations.RunPython(schedule_existing_pages, migrations.RunPython.noop),
+    ]
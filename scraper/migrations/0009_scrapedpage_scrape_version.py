@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0008_scrape_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='scrape_version',
+            field=models.PositiveIntegerField(default=0, help_text='Bumped whenever a scrape stores a new link set'),
+        ),
+    ]
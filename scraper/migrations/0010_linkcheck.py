@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0009_scrapedpage_scrape_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkCheck',
+            fields=[
+                ('url', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='link_check', serialize=False, to='scraper.url')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('final_url', models.URLField(blank=True, max_length=2000)),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('is_broken', models.BooleanField(default=False)),
+                ('checked_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
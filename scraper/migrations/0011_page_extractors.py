@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:05
+
+import django.db.models.deletion
+import scraper.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0010_linkcheck'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='canonical_url',
+            field=models.URLField(blank=True, max_length=2000),
+        ),
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='extractors',
+            field=models.JSONField(default=scraper.models.default_extractors, help_text='Extractors run on each scrape'),
+        ),
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='meta_description',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='meta_robots',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.CreateModel(
+            name='PageResource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('images', 'Image'), ('scripts', 'Script'), ('stylesheets', 'Stylesheet'), ('alternates', 'Alternate')], max_length=20)),
+                ('text', models.CharField(blank=True, help_text='Alt text, script type, media or hreflang', max_length=500)),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resources', to='scraper.scrapedpage')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='page_resources', to='scraper.url')),
+            ],
+            options={
+                'ordering': ['kind', 'pk'],
+                'unique_together': {('page', 'kind', 'target')},
+            },
+        ),
+    ]
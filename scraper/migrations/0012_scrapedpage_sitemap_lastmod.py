@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0011_page_extractors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='sitemap_lastmod',
+            field=models.DateTimeField(blank=True, help_text='lastmod of the page in its sitemap', null=True),
+        ),
+    ]
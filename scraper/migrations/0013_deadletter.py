@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0012_scrapedpage_sitemap_lastmod'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadLetter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('failure_class', models.CharField(choices=[('transient', 'Transient'), ('permanent', 'Permanent'), ('bug', 'Bug')], max_length=20)),
+                ('error', models.TextField()),
+                ('attempts', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('replayed_at', models.DateTimeField(blank=True, null=True)),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dead_letters', to='scraper.scrapedpage')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['failure_class', 'replayed_at'], name='scraper_deadletter_pending')],
+            },
+        ),
+    ]
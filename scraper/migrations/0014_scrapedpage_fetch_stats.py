@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0013_deadletter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='fetch_stats',
+            field=models.JSONField(blank=True, default=dict, help_text='Backend, protocol, bytes on the wire and decode time of the last fetch'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0014_scrapedpage_fetch_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='needs_enqueue_at',
+            field=models.DateTimeField(blank=True, help_text='Set while a scrape that could not be queued is still owed', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scrapedpage',
+            index=models.Index(fields=['needs_enqueue_at'], name='scraper_page_needs_enqueue'),
+        ),
+    ]
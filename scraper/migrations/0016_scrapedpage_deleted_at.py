@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0015_scrapedpage_needs_enqueue_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='scrapedpage',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='scrapedpage',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='Set when the page is deleted, until its links are purged', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scrapedpage',
+            index=models.Index(fields=['deleted_at'], name='scraper_page_deleted'),
+        ),
+        migrations.AddConstraint(
+            model_name='scrapedpage',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('user', 'url_hash'), name='scraper_page_user_url_live'),
+        ),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:42
+
+import json
+import zlib
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+STATUSES = ('pending', 'processing', 'completed', 'failed')
+
+
+def link_domain(url):
+    try:
+        return (urlsplit(url).hostname or '')[:255]
+    except ValueError:
+        return ''
+
+
+def page_histograms(apps, db_alias):
+    """Yield (page_id, Counter of links per domain) for each live page with links"""
+    PageLink = apps.get_model('scraper', 'PageLink')
+    CompactLinkSet = apps.get_model('scraper', 'CompactLinkSet')
+
+    current, histogram = None, Counter()
+    for page_id, url in (
+            PageLink.objects.using(db_alias).filter(page__deleted_at__isnull=True)
+            .order_by('page_id').values_list('page_id', 'target__url')
+            .iterator(chunk_size=BATCH_SIZE)):
+        if page_id != current:
+            if histogram:
+                yield current, histogram
+            current, histogram = page_id, Counter()
+        histogram[link_domain(url)] += 1
+    if histogram:
+        yield current, histogram
+
+    for page_id, data in (
+            CompactLinkSet.objects.using(db_alias).filter(page__deleted_at__isnull=True)
+            .order_by('page_id').values_list('page_id', 'data').iterator(chunk_size=100)):
+        urls, names = json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+        yield page_id, Counter(link_domain(url) for url in urls)
+
+
+def backfill_page_stats(apps, schema_editor):
+    """Count the existing pages and links into the new aggregates"""
+    ScrapedPage = apps.get_model('scraper', 'ScrapedPage')
+    PageDomainCount = apps.get_model('scraper', 'PageDomainCount')
+    UserDomainCount = apps.get_model('scraper', 'UserDomainCount')
+    UserPageStats = apps.get_model('scraper', 'UserPageStats')
+    db_alias = schema_editor.connection.alias
+    pages = ScrapedPage.objects.using(db_alias).filter(deleted_at__isnull=True)
+
+    statuses = defaultdict(Counter)
+    owners = {}
+    for pk, user_id, status in pages.values_list('pk', 'user_id', 'status').iterator(
+            chunk_size=BATCH_SIZE):
+        statuses[user_id][status] += 1
+        owners[pk] = user_id
+
+    domains = defaultdict(Counter)
+    batch = []
+    for page_id, histogram in page_histograms(apps, db_alias):
+        domains[owners[page_id]].update(histogram)
+        batch.extend(PageDomainCount(page_id=page_id, domain=domain, link_count=count)
+                     for domain, count in histogram.items())
+        if len(batch) >= BATCH_SIZE:
+            PageDomainCount.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    PageDomainCount.objects.using(db_alias).bulk_create(batch)
+
+    UserPageStats.objects.using(db_alias).bulk_create(
+        (UserPageStats(user_id=user_id, links=sum(domains[user_id].values()),
+                       **{status: counts[status] for status in STATUSES})
+         for user_id, counts in statuses.items()),
+        batch_size=BATCH_SIZE,
+    )
+    UserDomainCount.objects.using(db_alias).bulk_create(
+        (UserDomainCount(user_id=user_id, domain=domain, link_count=count)
+         for user_id, counts in domains.items() for domain, count in counts.items()),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('scraper', '0016_scrapedpage_deleted_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserPageStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='page_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pending', models.IntegerField(default=0)),
+                ('processing', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('links', models.BigIntegerField(default=0, help_text="Links stored for the user's pages")),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PageDomainCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(help_text='Host of the links, blank if they have none', max_length=255)),
+                ('link_count', models.PositiveIntegerField()),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='domain_counts', to='scraper.scrapedpage')),
+            ],
+            options={
+                'unique_together': {('page', 'domain')},
+            },
+        ),
+        migrations.CreateModel(
+            name='UserDomainCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255)),
+                ('link_count', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='domain_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-link_count'], name='scraper_userdomain_top')],
+                'unique_together': {('user', 'domain')},
+            },
+        ),
+        migrations.RunPython(backfill_page_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0017_page_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkcheck',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, help_text='Set while a checker is fetching the URL', null=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:11
+
+import json
+import zlib
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 5000
+
+
+def split_link_sets(apps, schema_editor):
+    """Split each single blob link set into chunks of CHUNK_SIZE links"""
+    CompactLinkSet = apps.get_model('scraper', 'CompactLinkSet')
+    CompactLinkChunk = apps.get_model('scraper', 'CompactLinkChunk')
+    db_alias = schema_editor.connection.alias
+
+    for page_id, data in (
+            CompactLinkSet.objects.using(db_alias).order_by('page_id')
+            .values_list('page_id', 'data').iterator(chunk_size=1)):
+        # The blobs are already sorted by name, so each slice keeps its order
+        urls, names = json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+        CompactLinkChunk.objects.using(db_alias).bulk_create(
+            CompactLinkChunk(
+                page_id=page_id,
+                start=start,
+                link_count=len(urls[start:start + CHUNK_SIZE]),
+                data=zlib.compress(json.dumps(
+                    [urls[start:start + CHUNK_SIZE], names[start:start + CHUNK_SIZE]],
+                    ensure_ascii=False, separators=(',', ':')).encode('utf-8')),
+            )
+            for start in range(0, len(urls), CHUNK_SIZE)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0018_linkcheck_claimed_until'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactLinkChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.PositiveIntegerField()),
+                ('link_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compact_link_chunks', to='scraper.scrapedpage')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('page', 'start'), name='scraper_compact_chunk')],
+            },
+        ),
+        migrations.RunPython(split_link_sets, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='compactlinkset',
+            name='data',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0019_compactlinkchunk'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pagelink',
+            index=models.Index(fields=['page', 'name', 'target'], name='scraper_link_page_name_target'),
+        ),
+        migrations.RemoveIndex(
+            model_name='pagelink',
+            name='scraper_link_page_name',
+        ),
+    ]
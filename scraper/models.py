@@ -1,7 +1,68 @@
-from django.db import models
+import hashlib
+from collections import Counter, defaultdict
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.urls import reverse
-from .constants import ScrapingStatus
+from django.utils import timezone
+from .constants import (
+    ScrapingStatus, LinkStorage, Extractor, FailureClass, LINK_BATCH_SIZE,
+)
+
+
+def hash_url(url):
+    """128-bit hex digest used for indexed equality lookups on long URLs"""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def default_extractors():
+    return list(Extractor.DEFAULT)
+
+
+class ScrapedPageManager(models.Manager):
+    def get_queryset(self):
+        # Deleted pages are hidden at once and purged in the background;
+        # only the purge reads them, through ScrapedPage.all_objects
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Fill in url_hash and count the pages in their users' totals, which
+        save() normally takes care of. With ignore_conflicts the caller
+        counts the pages that were actually created.
+        """
+        objs = list(objs)
+        for obj in objs:
+            obj.url_hash = hash_url(obj.url)
+        created = super().bulk_create(objs, *args, **kwargs)
+        if not kwargs.get('ignore_conflicts'):
+            added = defaultdict(Counter)
+            for obj in objs:
+                added[obj.user_id][obj.status] += 1
+            for user_id, statuses in added.items():
+                UserPageStats.objects.adjust(user_id, statuses)
+        return created
+
+    def update_status(self, pks, status, **fields):
+        """
+        Set the status, and any other fields, of the pages with the given
+        ids, moving them between their users' status totals
+        """
+        with transaction.atomic():
+            moved = Counter(self.select_for_update().filter(pk__in=pks).exclude(
+                status=status).values_list('user_id', 'status'))
+            updated = self.filter(pk__in=pks).update(status=status, **fields)
+            changes = defaultdict(Counter)
+            for (user_id, previous), count in moved.items():
+                changes[user_id][previous] -= count
+                changes[user_id][status] += count
+            for user_id, statuses in changes.items():
+                UserPageStats.objects.adjust(user_id, statuses)
+        return updated
+
+    def for_url(self, user, url):
+        """Look up a user's page by URL through the url_hash index"""
+        return self.filter(user=user, url_hash=hash_url(url))
 
 
 class ScrapedPage(models.Model):
@@ -11,44 +72,432 @@ class ScrapedPage(models.Model):
         (ScrapingStatus.COMPLETED, 'Completed'),
         (ScrapingStatus.FAILED, 'Failed'),
     ]
+    LINK_STORAGE_CHOICES = [
+        (LinkStorage.ROWS, 'Rows'),
+        (LinkStorage.COMPACT, 'Compact'),
+    ]
 
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='scraped_pages')
     url = models.URLField(max_length=2000)
+    url_hash = models.CharField(max_length=32, editable=False)
     title = models.CharField(max_length=500, blank=True)
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default=ScrapingStatus.PENDING)
     job_id = models.CharField(max_length=100, blank=True,
                               null=True, help_text="Background job ID for tracking")
     error_message = models.TextField(blank=True, null=True)
+    link_storage = models.CharField(
+        max_length=10, choices=LINK_STORAGE_CHOICES, default=LinkStorage.ROWS)
+    refresh_interval = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Seconds between scheduled re-scrapes")
+    next_check_at = models.DateTimeField(blank=True, null=True)
+    scrape_version = models.PositiveIntegerField(
+        default=0, help_text="Bumped whenever a scrape stores a new link set")
+    extractors = models.JSONField(
+        default=default_extractors, help_text="Extractors run on each scrape")
+    canonical_url = models.URLField(max_length=2000, blank=True)
+    meta_description = models.TextField(blank=True)
+    meta_robots = models.CharField(max_length=200, blank=True)
+    sitemap_lastmod = models.DateTimeField(
+        blank=True, null=True, help_text="lastmod of the page in its sitemap")
+    fetch_stats = models.JSONField(
+        default=dict, blank=True,
+        help_text="Backend, protocol, bytes on the wire and decode time of the last fetch")
+    needs_enqueue_at = models.DateTimeField(
+        blank=True, null=True,
+        help_text="Set while a scrape that could not be queued is still owed")
+    deleted_at = models.DateTimeField(
+        blank=True, null=True,
+        help_text="Set when the page is deleted, until its links are purged")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ScrapedPageManager()
+    all_objects = models.Manager()
+
     class Meta:
         ordering = ['-created_at']
-        unique_together = ['user', 'url']
+        constraints = [
+            # A deleted page still being purged does not stop its user
+            # adding the URL again
+            models.UniqueConstraint(fields=['user', 'url_hash'],
+                                    condition=models.Q(deleted_at__isnull=True),
+                                    name='scraper_page_user_url_live'),
+        ]
+        indexes = [
+            # page_list_view: filter by user, newest first
+            models.Index(fields=['user', '-created_at'],
+                         name='scraper_page_user_created'),
+            # refresh_due_pages: pages whose next check is due
+            models.Index(fields=['next_check_at'],
+                         name='scraper_page_next_check'),
+            # reconcile_pending_enqueues: pages the web server could not queue
+            models.Index(fields=['needs_enqueue_at'],
+                         name='scraper_page_needs_enqueue'),
+            # purge_deleted_pages: deleted pages left to purge
+            models.Index(fields=['deleted_at'],
+                         name='scraper_page_deleted'),
+        ]
 
     def __str__(self):
         return f"{self.title or self.url} - {self.user.username}"
 
+    # Written only with update() by the code that owns them, never by a
+    # save() of a copy read earlier: only bump_scrape_version() changes
+    # scrape_version, and a page being scraped must not come back from a
+    # delete or lose a newer enqueue mark
+    SEPARATELY_UPDATED_FIELDS = ('scrape_version', 'needs_enqueue_at', 'deleted_at')
+
+    # Status as last read or written, to tell when a save changes it
+    _saved_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        page = super().from_db(db, field_names, values)
+        page._saved_status = page.__dict__.get('status')
+        return page
+
+    def save(self, *args, **kwargs):
+        self.url_hash = hash_url(self.url)
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            UserPageStats.objects.adjust(self.user_id, {self.status: 1})
+            self._saved_status = self.status
+            return
+
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.SEPARATELY_UPDATED_FIELDS
+            ]
+        if ('status' not in kwargs['update_fields'] or 'status' in self.get_deferred_fields()
+                or self.status == self._saved_status):
+            super().save(*args, **kwargs)
+            return
+
+        # Move the page between its user's totals from the status it has
+        # now, which another process may have changed since it was read;
+        # deleted pages no longer count
+        with transaction.atomic():
+            previous = ScrapedPage.all_objects.select_for_update().filter(
+                pk=self.pk).values_list('status', 'deleted_at').first()
+            super().save(*args, **kwargs)
+            if previous and previous[1] is None and previous[0] != self.status:
+                UserPageStats.objects.adjust(self.user_id, {previous[0]: -1, self.status: 1})
+        self._saved_status = self.status
+
+    def bump_scrape_version(self):
+        """Mark the stored link set as new, moving cached fragments to new keys"""
+        ScrapedPage.objects.filter(pk=self.pk).update(
+            scrape_version=F('scrape_version') + 1)
+        self.refresh_from_db(fields=['scrape_version'])
+
     def get_absolute_url(self):
         return reverse('scraper:page_detail', kwargs={'pk': self.pk})
 
     @property
     def link_count(self):
+        if self.link_storage == LinkStorage.COMPACT:
+            return CompactLinkSet.objects.filter(page=self).values_list(
+                'link_count', flat=True).first() or 0
         return self.links.count()
 
 
+class UrlManager(models.Manager):
+    def intern(self, url):
+        """Return the Url row for a canonical URL, creating it if needed"""
+        return self.get_or_create(
+            url_hash=hash_url(url), defaults={'url': url})[0]
+
+    def intern_many(self, urls):
+        """
+        Intern many canonical URLs at once and return a {url: id} mapping
+        """
+        hashes = {url: hash_url(url) for url in urls}
+        self.bulk_create(
+            (Url(url=url, url_hash=url_hash) for url, url_hash in hashes.items()),
+            batch_size=LINK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+        ids = {}
+        all_hashes = list(hashes.values())
+        for i in range(0, len(all_hashes), LINK_BATCH_SIZE):
+            ids.update(self.filter(
+                url_hash__in=all_hashes[i:i + LINK_BATCH_SIZE]
+            ).values_list('url_hash', 'id'))
+
+        return {url: ids[url_hash] for url, url_hash in hashes.items()}
+
+    def lookup(self, url):
+        """Return the Url row for a canonical URL, or None"""
+        return self.filter(url_hash=hash_url(url)).first()
+
+
+class Url(models.Model):
+    """A distinct link target, shared by every page that links to it"""
+    url_hash = models.CharField(max_length=32, unique=True)
+    url = models.URLField(max_length=2000)
+
+    objects = UrlManager()
+
+    def __str__(self):
+        return self.url
+
+
+class LinkCheck(models.Model):
+    """Latest health check of a link target, shared by every page linking to it"""
+    url = models.OneToOneField(
+        Url, on_delete=models.CASCADE, primary_key=True, related_name='link_check')
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    final_url = models.URLField(max_length=2000, blank=True)
+    latency_ms = models.PositiveIntegerField(blank=True, null=True)
+    error = models.CharField(max_length=500, blank=True)
+    is_broken = models.BooleanField(default=False)
+    checked_at = models.DateTimeField(blank=True, null=True)
+    claimed_until = models.DateTimeField(
+        blank=True, null=True, help_text='Set while a checker is fetching the URL')
+
+    def __str__(self):
+        return f"{self.status_code or self.error} - {self.url_id}"
+
+
+class PageLinkManager(models.Manager):
+    def get_queryset(self):
+        # Expose the interned target URL as ``url`` so reads, filters and
+        # values() keep working as if the column lived on PageLink.
+        return super().get_queryset().annotate(url=F('target__url'))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Intern the URLs of links created with ``url=`` before inserting"""
+        objs = list(objs)
+        pending = [obj for obj in objs
+                   if obj.target_id is None and obj._url is not None]
+        if pending:
+            url_ids = Url.objects.intern_many({obj._url for obj in pending})
+            for obj in pending:
+                obj.target_id = url_ids[obj._url]
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class PageLink(models.Model):
     page = models.ForeignKey(
         ScrapedPage, on_delete=models.CASCADE, related_name='links')
-    url = models.URLField(max_length=2000)
+    target = models.ForeignKey(
+        Url, on_delete=models.PROTECT, related_name='page_links')
     name = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = PageLinkManager()
+
+    # Target URL as read from the queryset annotation or set by the caller
+    _url = None
+
     class Meta:
         ordering = ['name']
-        unique_together = ['page', 'url']
+        unique_together = ['page', 'target']
+        indexes = [
+            # page_detail_view: links of a page ordered by name; the
+            # trailing target id covers the join on every backend, so it
+            # needs no heap lookup
+            models.Index(fields=['page', 'name', 'target'],
+                         name='scraper_link_page_name_target'),
+        ]
 
     def __str__(self):
         return f"{self.name[:50]}... - {self.url[:50]}..."
+
+    @property
+    def url(self):
+        if self._url is None and self.target_id is not None:
+            self._url = self.target.url
+        return self._url
+
+    @url.setter
+    def url(self, value):
+        self._url = value
+
+    def save(self, *args, **kwargs):
+        if self._url is not None and (
+                self.target_id is None or self.target.url != self._url):
+            self.target = Url.objects.intern(self._url)
+        super().save(*args, **kwargs)
+
+
+class PageResource(models.Model):
+    """An image, script, stylesheet or alternate version referenced by a page"""
+    KIND_CHOICES = [
+        (Extractor.IMAGES, 'Image'),
+        (Extractor.SCRIPTS, 'Script'),
+        (Extractor.STYLESHEETS, 'Stylesheet'),
+        (Extractor.ALTERNATES, 'Alternate'),
+    ]
+
+    page = models.ForeignKey(
+        ScrapedPage, on_delete=models.CASCADE, related_name='resources')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    target = models.ForeignKey(
+        Url, on_delete=models.PROTECT, related_name='page_resources')
+    text = models.CharField(max_length=500, blank=True,
+                            help_text="Alt text, script type, media or hreflang")
+
+    class Meta:
+        ordering = ['kind', 'pk']
+        unique_together = ['page', 'kind', 'target']
+
+    def __str__(self):
+        return f"{self.kind} - {self.target_id}"
+
+
+class CompactLinkSet(models.Model):
+    """The link set of a large page, stored as CompactLinkChunk blobs"""
+    page = models.OneToOneField(
+        ScrapedPage, on_delete=models.CASCADE, primary_key=True,
+        related_name='compact_links')
+    link_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.link_count} links - {self.page_id}"
+
+
+class CompactLinkChunk(models.Model):
+    """A compressed run of a compact link set, from position start on"""
+    page = models.ForeignKey(
+        ScrapedPage, on_delete=models.CASCADE, related_name='compact_link_chunks')
+    start = models.PositiveIntegerField()
+    link_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['page', 'start'], name='scraper_compact_chunk'),
+        ]
+
+    def __str__(self):
+        return f"{self.start}+{self.link_count} - {self.page_id}"
+
+
+class ScrapeHistory(models.Model):
+    """One completed scrape of a page and whether its link set changed"""
+    page = models.ForeignKey(
+        ScrapedPage, on_delete=models.CASCADE, related_name='history')
+    links_hash = models.CharField(max_length=32)
+    link_count = models.PositiveIntegerField(default=0)
+    changed = models.BooleanField(default=True)
+    scraped_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-scraped_at']
+        indexes = [
+            models.Index(fields=['page', '-scraped_at'],
+                         name='scraper_history_page_scraped'),
+        ]
+
+    def __str__(self):
+        state = 'changed' if self.changed else 'unchanged'
+        return f"{self.page.url} at {self.scraped_at:%Y-%m-%d %H:%M} ({state})"
+
+
+class DeadLetter(models.Model):
+    """
+    A scrape that failed for good: a permanent error, a bug, or a
+    transient error that outlasted its retries. Kept until replayed.
+    """
+    FAILURE_CLASS_CHOICES = [(name, name.capitalize()) for name in FailureClass.CHOICES]
+
+    page = models.ForeignKey(
+        ScrapedPage, on_delete=models.CASCADE, related_name='dead_letters')
+    failure_class = models.CharField(max_length=20, choices=FAILURE_CLASS_CHOICES)
+    error = models.TextField()
+    attempts = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    replayed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # replay_dead_letters: pending letters by class
+            models.Index(fields=['failure_class', 'replayed_at'],
+                         name='scraper_deadletter_pending'),
+        ]
+
+    def __str__(self):
+        return f"{self.failure_class} - {self.page_id}"
+
+
+class UserPageStatsManager(models.Manager):
+    def adjust(self, user_id, statuses=None, links=0):
+        """Add to a user's totals: changes per status, and a change in links"""
+        changes = {status: F(status) + change
+                   for status, change in (statuses or {}).items() if change}
+        if links:
+            changes['links'] = F('links') + links
+        if not changes:
+            return
+        if not self.filter(user_id=user_id).update(updated_at=timezone.now(), **changes):
+            self.get_or_create(user_id=user_id)
+            self.filter(user_id=user_id).update(updated_at=timezone.now(), **changes)
+
+
+class UserPageStats(models.Model):
+    """
+    Running totals of a user's pages, kept up to date as pages are added,
+    change status, are scraped and are deleted, so stats never scan the
+    pages or their links. rebuild_page_stats repairs any drift.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='page_stats')
+    pending = models.IntegerField(default=0)
+    processing = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    links = models.BigIntegerField(default=0, help_text="Links stored for the user's pages")
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = UserPageStatsManager()
+
+    def __str__(self):
+        return f"{self.pages} pages, {self.links} links - {self.user_id}"
+
+    @property
+    def pages(self):
+        return sum(getattr(self, status) for status in ScrapingStatus.CHOICES)
+
+    @property
+    def by_status(self):
+        return [(status, getattr(self, status)) for status in ScrapingStatus.CHOICES]
+
+
+class PageDomainCount(models.Model):
+    """How many of a page's stored links point to each domain"""
+    page = models.ForeignKey(
+        ScrapedPage, on_delete=models.CASCADE, related_name='domain_counts')
+    domain = models.CharField(max_length=255, help_text="Host of the links, blank if they have none")
+    link_count = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ['page', 'domain']
+
+    def __str__(self):
+        return f"{self.domain}: {self.link_count} - {self.page_id}"
+
+
+class UserDomainCount(models.Model):
+    """The sum of the domain counts of a user's pages"""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='domain_counts')
+    domain = models.CharField(max_length=255)
+    link_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'domain']
+        indexes = [
+            # Stats panel: a user's most linked domains
+            models.Index(fields=['user', '-link_count'],
+                         name='scraper_userdomain_top'),
+        ]
+
+    def __str__(self):
+        return f"{self.domain}: {self.link_count} - {self.user_id}"
@@ -0,0 +1,99 @@
+"""
+Adaptive scheduling of re-scrapes.
+
+Every completed scrape is recorded in ``ScrapeHistory`` with a hash of the
+page's link set, so each row says whether the page changed since the previous
+scrape. The change rate is estimated from the recent history and the next
+check is scheduled at the expected time to the next change, within
+``REFRESH_MIN_INTERVAL`` and ``REFRESH_MAX_INTERVAL``. Pages that did not
+change, or failed to scrape, back off instead.
+"""
+import hashlib
+import math
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .models import ScrapeHistory
+from .constants import (
+    REFRESH_HISTORY_WINDOW, REFRESH_HISTORY_KEEP, REFRESH_BACKOFF, REFRESH_JITTER,
+)
+
+
+def links_hash(links):
+    """Order independent digest of a {url: name} link set"""
+    digest = hashlib.sha256()
+    for url in sorted(links):
+        digest.update(f'{url}\t{links[url]}\n'.encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def estimate_change_rate(history):
+    """
+    Estimate changes per second from scrapes ordered newest first.
+
+    Uses the Cho & Garcia-Molina estimator, which unlike changes / time does
+    not underestimate pages that change more often than they are checked:
+    rate = -ln((n - X + 0.5) / (n + 0.5)) / I for X changes seen in n checks
+    taken I seconds apart on average.
+    """
+    if len(history) < 2:
+        return None
+    checks = len(history) - 1
+    changes = sum(1 for entry in history[:-1] if entry.changed)
+    span = (history[0].scraped_at - history[-1].scraped_at).total_seconds()
+    if span <= 0:
+        return None
+    return -math.log((checks - changes + 0.5) / (checks + 0.5)) / (span / checks)
+
+
+def clamp_interval(seconds):
+    """Keep an interval within the configured bounds, with some jitter"""
+    seconds *= 1 + random.uniform(-REFRESH_JITTER, REFRESH_JITTER)
+    return int(min(max(seconds, settings.REFRESH_MIN_INTERVAL),
+                   settings.REFRESH_MAX_INTERVAL))
+
+
+def next_refresh_interval(page, history):
+    """Seconds until the next check of a page, given its recent history"""
+    previous = page.refresh_interval or settings.REFRESH_MIN_INTERVAL
+    rate = estimate_change_rate(history)
+    if rate is None:
+        # Not enough history yet: check again soon to learn the rate
+        return clamp_interval(settings.REFRESH_MIN_INTERVAL)
+    if rate == 0:
+        return clamp_interval(previous * REFRESH_BACKOFF)
+    return clamp_interval(1 / rate)
+
+
+def schedule_next_check(page, interval):
+    page.refresh_interval = interval
+    page.next_check_at = timezone.now() + timedelta(seconds=interval)
+
+
+def record_scrape(page, links):
+    """
+    Record a completed scrape and schedule the next one. The caller saves
+    the page.
+    """
+    current_hash = links_hash(links)
+    previous = page.history.only('links_hash').first()
+    entry = ScrapeHistory.objects.create(
+        page=page,
+        links_hash=current_hash,
+        link_count=len(links),
+        changed=previous is None or previous.links_hash != current_hash,
+    )
+
+    history = list(page.history.only('changed', 'scraped_at')[:REFRESH_HISTORY_WINDOW + 1])
+    schedule_next_check(page, next_refresh_interval(page, history))
+
+    stale = page.history.values_list('pk', flat=True)[REFRESH_HISTORY_KEEP:]
+    ScrapeHistory.objects.filter(pk__in=list(stale)).delete()
+    return entry
+
+
+def record_failed_scrape(page):
+    """Back off the next check of a page that could not be scraped"""
+    previous = page.refresh_interval or settings.REFRESH_MIN_INTERVAL
+    schedule_next_check(page, clamp_interval(previous * REFRESH_BACKOFF))
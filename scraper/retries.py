@@ -0,0 +1,95 @@
+"""
+Retry policy for scrapes.
+
+A failed scrape is classified before anything is retried: transient
+failures (timeouts, dropped connections, 5xx, 429) are retried with
+exponential backoff and full jitter, honouring ``Retry-After``; permanent
+failures (other 4xx, invalid URLs) and bugs are not retried at all. Scrapes
+that fail for good are recorded as ``DeadLetter`` rows, which can be
+replayed in bulk once the site or the code is fixed.
+"""
+import random
+from collections import namedtuple
+from email.utils import parsedate_to_datetime
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+from .models import ScrapedPage, DeadLetter
+from .constants import ScrapingStatus, FailureClass, TRANSIENT_HTTP_STATUSES, LINK_BATCH_SIZE
+
+Failure = namedtuple('Failure', ['failure_class', 'retry_after'])
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, int((when - timezone.now()).total_seconds()))
+
+
+def classify_failure(exc):
+    """Return the Failure for an exception raised by a scrape"""
+    # Imported here: web processes use this module for replays and never
+    # classify a failure, so they do not need requests
+    import requests
+
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        if status in TRANSIENT_HTTP_STATUSES:
+            return Failure(FailureClass.TRANSIENT,
+                           parse_retry_after(exc.response.headers.get('Retry-After')))
+        return Failure(FailureClass.PERMANENT, None)
+    if isinstance(exc, (requests.Timeout, requests.ConnectionError,
+                        requests.exceptions.ChunkedEncodingError,
+                        requests.exceptions.ContentDecodingError, DatabaseError)):
+        return Failure(FailureClass.TRANSIENT, None)
+    if isinstance(exc, requests.RequestException):
+        # Invalid URLs, unsupported schemes, redirect loops
+        return Failure(FailureClass.PERMANENT, None)
+    return Failure(FailureClass.BUG, None)
+
+
+def backoff_delay(retries, retry_after=None):
+    """
+    Seconds before retry number retries + 1: a random delay up to an
+    exponentially growing cap, but never sooner than the server asked for
+    """
+    cap = min(settings.SCRAPE_RETRY_MAX_DELAY, settings.SCRAPE_RETRY_BASE_DELAY * 2 ** retries)
+    delay = random.uniform(0, cap)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, settings.SCRAPE_RETRY_MAX_DELAY))
+    return int(delay)
+
+
+def dead_letter(page, failure, exc, attempts):
+    return DeadLetter.objects.create(
+        page=page,
+        failure_class=failure.failure_class,
+        error=f'{type(exc).__name__}: {str(exc)}',
+        attempts=attempts,
+    )
+
+
+def replay_dead_letters(dead_letters, dispatch):
+    """
+    Queue the pages of pending dead letters for scraping again, once per
+    page, with dispatch(user_id, page_id), and mark the letters replayed.
+    Returns the number of pages queued.
+    """
+    pending = dead_letters.filter(replayed_at__isnull=True)
+    pages = list(pending.order_by().values_list('page_id', 'page__user_id').distinct())
+    for i in range(0, len(pages), LINK_BATCH_SIZE):
+        chunk = pages[i:i + LINK_BATCH_SIZE]
+        page_ids = [page_id for page_id, user_id in chunk]
+        ScrapedPage.objects.update_status(page_ids, ScrapingStatus.PENDING)
+        pending.filter(page_id__in=page_ids).update(replayed_at=timezone.now())
+        for page_id, user_id in chunk:
+            dispatch(user_id, page_id)
+    return len(pages)
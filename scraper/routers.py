@@ -0,0 +1,62 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary. Reads go to a replica only inside views
+wrapped with ``read_from_replica``, and only while the current request has
+not written anything and the client is not pinned to the primary after a
+recent write (see ``scraper.middleware.ReplicaPinningMiddleware``).
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+
+PRIMARY_DB = 'default'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+use_replica = ContextVar('use_replica', default=False)
+pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+wrote_to_primary = ContextVar('wrote_to_primary', default=False)
+
+
+def get_read_db():
+    """Return the alias reads would currently be routed to"""
+    replicas = settings.DATABASE_READ_REPLICAS
+    if (replicas and use_replica.get()
+            and not pinned_to_primary.get() and not wrote_to_primary.get()):
+        return random.choice(replicas)
+    return PRIMARY_DB
+
+
+def read_from_replica(view_func):
+    """Route the reads of a view to a replica for safe (read-only) requests"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return view_func(request, *args, **kwargs)
+
+        token = use_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            use_replica.reset(token)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary and opted-in reads to a replica"""
+
+    def db_for_read(self, model, **hints):
+        return get_read_db()
+
+    def db_for_write(self, model, **hints):
+        # Any write pins the rest of the request (and, through the
+        # middleware, the client) to the primary for read-your-writes.
+        wrote_to_primary.set(True)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
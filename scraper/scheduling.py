@@ -0,0 +1,208 @@
+"""
+Fair scheduling of scrapes between users, in two lanes.
+
+Interactive scrapes (pages a user adds or re-scrapes) are published
+straight to the ``interactive`` queue, which workers drain before the
+``scraping`` queue. Bulk scrapes (sitemap imports) are added to a backlog
+per user in Redis instead, and a dispatcher moves them to the ``scraping``
+queue taking one page from each user in turn. At most
+``SCRAPE_BULK_IN_FLIGHT`` bulk scrapes are queued or running at once, and
+at most ``SCRAPE_USER_IN_FLIGHT`` of any one user's. A user importing 100k
+URLs then takes turns with everyone else, and the bulk lane never fills
+the worker.
+
+The dispatcher runs after an import, when a bulk scrape ends and every
+``SCRAPE_DISPATCH_INTERVAL`` seconds from beat. Each bulk scrape holds a
+slot until it ends, and a scrape deferred because its host is down keeps
+it until the retry ends; slots of scrapes that died expire after
+``SCRAPE_SLOT_LEASE`` seconds.
+
+Redis keys, under ``SCHEDULER_KEY_PREFIX``:
+
+- ``users``: list of users with a backlog, rotated from the tail by the
+  dispatcher
+- ``user_set``: the same users as a set, so each is listed once
+- ``backlog:<user>``: ``<page id>:<requested at>`` entries in order
+- ``slots`` and ``slots:<user>``: page ids in flight, scored by lease expiry
+- ``waits:<lane>``: recent queue waits in seconds
+
+Every scrape records how long it waited from being requested to starting.
+"""
+import logging
+import time
+import uuid
+import redis
+from django.conf import settings
+from .connections import redis_client
+from .constants import Lane, SCHEDULER_KEY_PREFIX, SCHEDULER_WAIT_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+USERS_KEY = f'{SCHEDULER_KEY_PREFIX}users'
+USER_SET_KEY = f'{SCHEDULER_KEY_PREFIX}user_set'
+SLOTS_KEY = f'{SCHEDULER_KEY_PREFIX}slots'
+DISPATCH_LOCK_KEY = f'{SCHEDULER_KEY_PREFIX}dispatching'
+DISPATCH_LOCK_TIMEOUT = 60
+
+# Deletes a lock only while it still holds the caller's token, so a
+# dispatcher that outlived its lock does not release the next one's
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def backlog_key(user_id):
+    return f'{SCHEDULER_KEY_PREFIX}backlog:{user_id}'
+
+
+def user_slots_key(user_id):
+    return f'{SCHEDULER_KEY_PREFIX}slots:{user_id}'
+
+
+def add_bulk_scrape(user_id, page_id, client=None):
+    """Add a page to its user's bulk backlog"""
+    client = client or redis_client()
+    pipe = client.pipeline()
+    pipe.rpush(backlog_key(user_id), f'{page_id}:{time.time()}')
+    pipe.sadd(USER_SET_KEY, user_id)
+    if pipe.execute()[1]:
+        client.lpush(USERS_KEY, user_id)
+
+
+def dispatch_bulk_scrapes(publish, client=None):
+    """
+    Publish bulk scrapes round-robin between users while there are free
+    slots, calling publish(page_id, requested_at). Returns how many were
+    published; another dispatcher already running makes this a no-op.
+    """
+    client = client or redis_client()
+    token = uuid.uuid4().hex
+    if not client.set(DISPATCH_LOCK_KEY, token, nx=True, ex=DISPATCH_LOCK_TIMEOUT):
+        return 0
+
+    try:
+        now = time.time()
+        client.zremrangebyscore(SLOTS_KEY, '-inf', now)
+        budget = settings.SCRAPE_BULK_IN_FLIGHT - client.zcard(SLOTS_KEY)
+        published = 0
+        skipped = 0  # users passed over in a row because their slots are full
+        while budget > 0 and skipped < client.llen(USERS_KEY):
+            user_id = client.rpoplpush(USERS_KEY, USERS_KEY)
+            if user_id is None:
+                break
+            user_id = user_id.decode()
+
+            user_slots = user_slots_key(user_id)
+            client.zremrangebyscore(user_slots, '-inf', now)
+            if client.zcard(user_slots) >= settings.SCRAPE_USER_IN_FLIGHT:
+                skipped += 1
+                continue
+
+            entry = client.lpop(backlog_key(user_id))
+            if entry is None:
+                drop_user(client, user_id)
+                continue
+            page_id, requested_at = entry.decode().split(':')
+            try:
+                publish(int(page_id), float(requested_at))
+            except Exception as e:
+                client.lpush(backlog_key(user_id), entry)
+                logger.warning(f"Could not publish bulk scrapes: {str(e)}")
+                break
+
+            lease = now + settings.SCRAPE_SLOT_LEASE
+            pipe = client.pipeline()
+            pipe.zadd(SLOTS_KEY, {page_id: lease})
+            pipe.zadd(user_slots, {page_id: lease})
+            pipe.expire(user_slots, settings.SCRAPE_SLOT_LEASE)
+            pipe.execute()
+            budget -= 1
+            published += 1
+            skipped = 0
+        return published
+    finally:
+        client.eval(RELEASE_LOCK_SCRIPT, 1, DISPATCH_LOCK_KEY, token)
+
+
+def drop_user(client, user_id):
+    client.lrem(USERS_KEY, 0, user_id)
+    client.srem(USER_SET_KEY, user_id)
+    # A page added since the backlog was found empty puts the user back
+    if client.llen(backlog_key(user_id)) and client.sadd(USER_SET_KEY, user_id):
+        client.lpush(USERS_KEY, user_id)
+
+
+def release_bulk_slot(user_id, page_id, client=None):
+    """Free the slot of a bulk scrape that ended; user_id is None for deleted pages"""
+    try:
+        client = client or redis_client()
+        pipe = client.pipeline()
+        pipe.zrem(SLOTS_KEY, page_id)
+        if user_id is not None:
+            pipe.zrem(user_slots_key(user_id), page_id)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug(f"Could not release slot of page {page_id}: {str(e)}")
+
+
+def hold_bulk_slot(user_id, page_id, seconds, client=None):
+    """Extend the slot of a bulk scrape deferred by seconds, if it still holds one"""
+    try:
+        client = client or redis_client()
+        lease = time.time() + seconds + settings.SCRAPE_SLOT_LEASE
+        pipe = client.pipeline()
+        pipe.zadd(SLOTS_KEY, {page_id: lease}, xx=True)
+        pipe.zadd(user_slots_key(user_id), {page_id: lease}, xx=True)
+        pipe.expire(user_slots_key(user_id), int(seconds) + settings.SCRAPE_SLOT_LEASE)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug(f"Could not extend slot of page {page_id}: {str(e)}")
+
+
+def record_wait(lane, seconds, client=None):
+    """Record how long a scrape waited in a lane before it started"""
+    try:
+        client = client or redis_client()
+        key = f'{SCHEDULER_KEY_PREFIX}waits:{lane}'
+        pipe = client.pipeline()
+        pipe.lpush(key, round(seconds, 3))
+        pipe.ltrim(key, 0, SCHEDULER_WAIT_SAMPLES - 1)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug(f"Could not record queue wait: {str(e)}")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values"""
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def get_lane_stats(client=None):
+    """Recent queue waits, targets and bulk backlog per lane, as rows"""
+    try:
+        client = client or redis_client()
+        rows = []
+        for lane in Lane.CHOICES:
+            waits = sorted(float(wait) for wait in client.lrange(
+                f'{SCHEDULER_KEY_PREFIX}waits:{lane}', 0, -1))
+            rows.append({
+                'lane': lane,
+                'samples': len(waits),
+                'p50': percentile(waits, 0.5) if waits else None,
+                'p95': percentile(waits, 0.95) if waits else None,
+                'target': (settings.SCRAPE_INTERACTIVE_WAIT_TARGET
+                           if lane == Lane.INTERACTIVE else None),
+            })
+        users = [user_id.decode() for user_id in client.smembers(USER_SET_KEY)]
+        rows[Lane.CHOICES.index(Lane.BULK)].update(
+            users=len(users),
+            backlog=sum(client.llen(backlog_key(user_id)) for user_id in users),
+            in_flight=client.zcount(SLOTS_KEY, time.time(), '+inf'),
+        )
+        return rows
+    except redis.RedisError as e:
+        logger.warning(f"Could not read scheduler stats: {str(e)}")
+        return []
@@ -1,69 +1,165 @@
-from celery import shared_task, current_app
+import time
+from collections import defaultdict
+from celery import Task, shared_task, current_app
 from celery.result import AsyncResult
+from datetime import timedelta
+import redis
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 from .models import ScrapedPage
-from .utils import scrape_page_links
-from .constants import ScrapingStatus, Messages
+from .linkcheck import check_page_links, check_user_links
+from .retries import classify_failure, backoff_delay, dead_letter
+from .refresh import record_failed_scrape
+from .breakers import CircuitOpenError
+from .deletion import purge_page, deleted_pages_due
+from .scheduling import (
+    add_bulk_scrape, dispatch_bulk_scrapes, hold_bulk_slot, release_bulk_slot, record_wait)
+from .constants import (
+    ScrapingStatus, FailureClass, Messages, Lane, REFRESH_LEASE, RECONCILE_BATCH_SIZE,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_kwargs={'max_retries': 3, 'countdown': 60})
-def scrape_page_task(self, scraped_page_id):
+class ScrapePageTask(Task):
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        if kwargs.get('lane') != Lane.BULK:
+            return
+        if isinstance(retval, dict) and retval.get('deferred'):
+            # The deferred retry keeps the slot, or it would escape the cap
+            return
+        # Hand the slot to the next page in line, whatever the outcome
+        user_id = ScrapedPage.objects.filter(pk=args[0]).values_list(
+            'user_id', flat=True).first()
+        release_bulk_slot(user_id, args[0])
+        dispatch_bulk_scrapes_task()
+
+
+@shared_task(bind=True, base=ScrapePageTask)
+def scrape_page_task(self, scraped_page_id, lane=None, requested_at=None):
     """
-    Celery task to scrape a page asynchronously
+    Celery task to scrape a page asynchronously. Transient failures are
+    retried with backoff; other failures, and transient ones that run out
+    of retries, are dead-lettered.
     """
+    # The fetch and parse stack is imported by tasks that use it, not by
+    # web processes publishing them; workers preload it before forking
+    from .utils import scrape_page_links
+
+    if requested_at is not None and not self.request.retries and not self.request.eta:
+        record_wait(lane, time.time() - requested_at)
+
     try:
         scraped_page = ScrapedPage.objects.get(id=scraped_page_id)
-        logger.info(
-            f"Starting async scraping for page {scraped_page_id}: {scraped_page.url}")
+    except ScrapedPage.DoesNotExist:
+        logger.error(f"ScrapedPage with id {scraped_page_id} does not exist")
+        return {
+            'success': False,
+            'error': f'Page with id {scraped_page_id} not found',
+            'task_id': self.request.id
+        }
 
-        # Update task ID in the model
-        scraped_page.job_id = self.request.id
-        scraped_page.save()
+    logger.info(
+        f"Starting async scraping for page {scraped_page_id}: {scraped_page.url}")
 
-        # Call the scraping function
-        links_count = scrape_page_links(scraped_page)
+    # Update task ID in the model
+    scraped_page.job_id = self.request.id
+    scraped_page.save()
 
-        logger.info(
-            f"Completed async scraping for page {scraped_page_id}. Found {links_count} links.")
+    try:
+        links_count = scrape_page_links(scraped_page, raise_errors=True)
+    except CircuitOpenError as e:
+        # The host is down: try again once its circuit may let a request
+        # through, without spending one of the page's retries
+        logger.info(f"Deferring page {scraped_page_id} by {e.retry_in}s: {str(e)}")
+        try:
+            publish_scrape(scraped_page_id, lane, requested_at, countdown=e.retry_in)
+        except Exception as publish_error:
+            # Leave the page to the reconciler rather than pending forever
+            ScrapedPage.objects.filter(pk=scraped_page_id).update(needs_enqueue_at=timezone.now())
+            logger.error(f"Could not defer page {scraped_page_id}, marked it for "
+                         f"publishing later: {str(publish_error)}")
+            return {
+                'success': False,
+                'error': str(publish_error),
+                'page_id': scraped_page_id,
+                'task_id': self.request.id
+            }
+        if lane == Lane.BULK:
+            hold_bulk_slot(scraped_page.user_id, scraped_page_id, e.retry_in)
         return {
-            'success': True,
-            'links_count': links_count,
+            'success': False,
+            'deferred': e.retry_in,
             'page_id': scraped_page_id,
-            'status': scraped_page.status,
             'task_id': self.request.id
         }
+    except Exception as e:
+        failure = classify_failure(e)
+        retries = self.request.retries
+        if (failure.failure_class == FailureClass.TRANSIENT
+                and retries < settings.SCRAPING_MAX_RETRIES):
+            countdown = backoff_delay(retries, failure.retry_after)
+            logger.warning(
+                f"Transient failure scraping page {scraped_page_id}, retry "
+                f"{retries + 1} in {countdown}s: {str(e)}")
+            # Keep scheduled sweeps away from a page that is already due a retry
+            ScrapedPage.objects.update_status(
+                [scraped_page_id], ScrapingStatus.PENDING, updated_at=timezone.now())
+            raise self.retry(exc=e, countdown=countdown,
+                             max_retries=settings.SCRAPING_MAX_RETRIES)
 
-    except ScrapedPage.DoesNotExist:
-        logger.error(f"ScrapedPage with id {scraped_page_id} does not exist")
+        logger.error(
+            f"Giving up on page {scraped_page_id} after {retries + 1} attempts "
+            f"({failure.failure_class}): {str(e)}")
+        dead_letter(scraped_page, failure, e, retries + 1)
+        record_failed_scrape(scraped_page)
+        scraped_page.save(update_fields=['refresh_interval', 'next_check_at'])
         return {
             'success': False,
-            'error': f'Page with id {scraped_page_id} not found',
+            'error': str(e),
+            'failure_class': failure.failure_class,
+            'page_id': scraped_page_id,
             'task_id': self.request.id
         }
-    except Exception as e:
-        logger.error(
-            f"Error in async scraping for page {scraped_page_id}: {str(e)}")
-        # Update the page status to failed
-        try:
-            scraped_page = ScrapedPage.objects.get(id=scraped_page_id)
-            scraped_page.status = ScrapingStatus.FAILED
-            scraped_page.error_message = str(e)
-            scraped_page.save()
-        except ScrapedPage.DoesNotExist:
-            pass
 
-        # Re-raise for Celery retry mechanism
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+    logger.info(
+        f"Completed async scraping for page {scraped_page_id}. Found {links_count} links.")
+    return {
+        'success': True,
+        'links_count': links_count,
+        'page_id': scraped_page_id,
+        'status': scraped_page.status,
+        'task_id': self.request.id
+    }
+
+
+def publish_scrape(scraped_page_id, lane, requested_at=None, countdown=None, **options):
+    """
+    Publish a scrape to the Celery queue of its lane, or the task's default
+    queue for scrapes published without one. Other options, such as retry,
+    are passed on to apply_async.
+    """
+    return scrape_page_task.apply_async(
+        args=[scraped_page_id],
+        kwargs={'lane': lane, 'requested_at': requested_at or time.time()},
+        queue=Lane.QUEUES.get(lane),
+        countdown=countdown,
+        **options,
+    )
 
 
 def queue_scraping_task(scraped_page_id):
     """
-    Queue a scraping task for background processing using Celery
+    Queue a scraping task for background processing using Celery, in the
+    interactive lane. A broker that is down fails at once instead of being
+    retried, so the caller can fall back while the user waits.
     """
     try:
-        task = scrape_page_task.delay(scraped_page_id)
+        task = publish_scrape(scraped_page_id, Lane.INTERACTIVE, retry=False)
         logger.info(
             f"Queued scraping task for page {scraped_page_id} with task id {task.id}")
         return task
@@ -74,6 +170,179 @@ def queue_scraping_task(scraped_page_id):
         raise
 
 
+@shared_task(ignore_result=True)
+def refresh_due_pages():
+    """
+    Celery beat task: enqueue a batch of pages whose next check is due,
+    spreading them over the time until the next sweep
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Skip rows another sweep is claiming; the lease below keeps them
+        # out of later sweeps until the scrape schedules the real next check.
+        # A lease that runs out, because the scrape was lost or never
+        # published, makes the page due again. Pages being scraped or waiting
+        # for a scrape or retry are left alone unless they have not been
+        # touched for as long as a lease, so the scrape was lost too.
+        due = list(
+            ScrapedPage.objects.select_for_update(skip_locked=True).filter(
+                ~Q(status__in=[ScrapingStatus.PENDING, ScrapingStatus.PROCESSING])
+                | Q(updated_at__lt=now - timedelta(seconds=REFRESH_LEASE)),
+                next_check_at__lte=now,
+            ).order_by('next_check_at').values_list(
+                'pk', 'status')[:settings.REFRESH_SWEEP_BATCH_SIZE]
+        )
+        due_ids = [page_id for page_id, status in due]
+        ScrapedPage.objects.update_status(
+            due_ids, ScrapingStatus.PENDING,
+            next_check_at=now + timedelta(seconds=REFRESH_LEASE),
+        )
+    if not due_ids:
+        return 0
+
+    spacing = settings.REFRESH_SWEEP_INTERVAL / len(due_ids)
+    for index, page_id in enumerate(due_ids):
+        # Background work, so the bulk lane; its wait counts from when it is due
+        countdown = int(index * spacing)
+        try:
+            publish_scrape(page_id, Lane.BULK, time.time() + countdown, countdown=countdown)
+        except Exception as e:
+            # Put the pages not published back as they were, due at the next
+            # sweep instead of when their lease runs out
+            unpublished = defaultdict(list)
+            for page_id, status in due[index:]:
+                unpublished[status].append(page_id)
+            for status, page_ids in unpublished.items():
+                ScrapedPage.objects.update_status(page_ids, status, next_check_at=now)
+            logger.error(f"Queued {index} of {len(due_ids)} due pages, "
+                         f"the rest wait for the next sweep: {str(e)}")
+            return index
+
+    logger.info(f"Queued scheduled re-scraping of {len(due_ids)} pages")
+    return len(due_ids)
+
+
+@shared_task(ignore_result=True)
+def reconcile_pending_enqueues():
+    """
+    Celery beat task: publish the pages marked while the broker was down
+    that the web server did not scrape itself within the grace period
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.SCRAPE_FALLBACK_GRACE)
+    marked = list(
+        ScrapedPage.objects.filter(needs_enqueue_at__lte=cutoff).order_by(
+            'needs_enqueue_at').values_list('pk', 'needs_enqueue_at')[:RECONCILE_BATCH_SIZE]
+    )
+    published = 0
+    for page_id, marked_at in marked:
+        # Take the mark first, so a fallback scrape that starts now skips the
+        # page; one that started or was marked again since moved the mark
+        if not ScrapedPage.objects.filter(pk=page_id, needs_enqueue_at=marked_at).update(
+                needs_enqueue_at=None):
+            continue
+        try:
+            queue_scraping_task(page_id)
+        except Exception:
+            # Still unreachable; the next run picks up where this one stopped
+            ScrapedPage.objects.filter(pk=page_id, needs_enqueue_at__isnull=True).update(
+                needs_enqueue_at=marked_at)
+            break
+        published += 1
+
+    if published:
+        logger.info(f"Published {published} pages that could not be queued earlier")
+    return published
+
+
+@shared_task(ignore_result=True)
+def delete_pages_task(page_ids):
+    """
+    Celery task to purge pages a user deleted, removing their links in
+    bounded batches
+    """
+    removed = sum(purge_page(page_id) for page_id in page_ids)
+    logger.info(f"Purged {len(page_ids)} deleted pages and {removed} of their links and resources")
+    return removed
+
+
+@shared_task(ignore_result=True)
+def purge_deleted_pages():
+    """
+    Celery beat task: purge pages deleted a sweep interval ago or more
+    whose deletion task was never queued or did not finish
+    """
+    page_ids = deleted_pages_due(settings.PAGE_PURGE_INTERVAL)
+    for page_id in page_ids:
+        purge_page(page_id)
+    if page_ids:
+        logger.info(f"Purged {len(page_ids)} deleted pages left behind")
+    return len(page_ids)
+
+
+@shared_task(ignore_result=True)
+def check_links_task(page_id=None, user_id=None):
+    """
+    Celery task to check the health of the links of one page, or of all of
+    a user's pages
+    """
+    if page_id is not None:
+        page = ScrapedPage.objects.filter(pk=page_id).first()
+        checked = check_page_links(page) if page else 0
+    else:
+        user = User.objects.filter(pk=user_id).first()
+        checked = check_user_links(user) if user else 0
+    logger.info(f"Checked {checked} links (page {page_id}, user {user_id})")
+    return checked
+
+
+@shared_task(ignore_result=True)
+def import_sitemap_task(user_id, url):
+    """
+    Celery task to stream a sitemap into a user's pages and queue the new
+    and changed ones for scraping
+    """
+    from .sitemaps import import_sitemap
+
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return None
+    stats = import_sitemap(user, url, lambda page_id: queue_bulk_scrape(user_id, page_id))
+    dispatch_bulk_scrapes_task()
+    logger.info(
+        f"Imported sitemap {url} for user {user_id}: {stats['found']} URLs, "
+        f"{stats['created']} new, {stats['changed']} changed, {stats['skipped']} skipped")
+    return stats
+
+
+def queue_bulk_scrape(user_id, scraped_page_id):
+    """
+    Add a page to its user's bulk backlog, or publish it right away if
+    the backlog cannot be reached
+    """
+    try:
+        add_bulk_scrape(user_id, scraped_page_id)
+    except redis.RedisError as e:
+        logger.warning(f"Publishing page {scraped_page_id} unscheduled: {str(e)}")
+        publish_scrape(scraped_page_id, Lane.BULK)
+
+
+@shared_task(ignore_result=True)
+def dispatch_bulk_scrapes_task():
+    """
+    Celery task, also run by beat: publish bulk scrapes round-robin
+    between users while there are free slots
+    """
+    try:
+        published = dispatch_bulk_scrapes(
+            lambda page_id, requested_at: publish_scrape(page_id, Lane.BULK, requested_at))
+    except redis.RedisError as e:
+        logger.warning(f"Could not dispatch bulk scrapes: {str(e)}")
+        return 0
+    if published:
+        logger.info(f"Dispatched {published} bulk scrapes")
+    return published
+
+
 def get_task_status(task_id):
     """
     Get the status of a Celery task
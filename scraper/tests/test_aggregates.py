@@ -0,0 +1,162 @@
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.urls import reverse
+import responses
+from ..models import ScrapedPage, PageDomainCount, UserDomainCount, UserPageStats
+from ..aggregates import get_page_stats
+from ..deletion import soft_delete_pages
+from ..utils import scrape_page_links
+from ..constants import ScrapingStatus
+
+
+def totals(user):
+    stats = UserPageStats.objects.get(user=user)
+    return dict(stats.by_status, links=stats.links)
+
+
+class PageAggregatesTest(TestCase):
+    """Test per-user and per-domain totals are kept up to date incrementally"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.page = ScrapedPage.objects.create(user=self.user, url='https://example.com/')
+
+    def scrape(self, page, *hrefs):
+        html = ''.join(f'<a href="{href}">{href}</a>' for href in hrefs)
+        with responses.RequestsMock() as mock:
+            mock.add(responses.GET, page.url, body=html, content_type='text/html')
+            scrape_page_links(page)
+
+    def test_status_totals(self):
+        """Test pages move between status totals however their status changes"""
+        other = ScrapedPage.objects.create(user=self.user, url='https://example.org/')
+        self.assertEqual(totals(self.user)[ScrapingStatus.PENDING], 2)
+
+        self.page.status = ScrapingStatus.FAILED
+        self.page.save()
+        # Saves that leave the status alone do not count it again
+        self.page.title = 'Example'
+        self.page.save()
+        ScrapedPage.objects.update_status([self.page.pk, other.pk], ScrapingStatus.COMPLETED)
+        ScrapedPage.objects.bulk_create([ScrapedPage(user=self.user, url='https://example.net/')])
+        self.assertEqual(totals(self.user), {
+            ScrapingStatus.PENDING: 1, ScrapingStatus.PROCESSING: 0,
+            ScrapingStatus.COMPLETED: 2, ScrapingStatus.FAILED: 0, 'links': 0})
+
+    def test_stale_status_is_not_counted_twice(self):
+        """Test a save moves the page from the status stored, not the one read"""
+        stale = ScrapedPage.objects.get(pk=self.page.pk)
+        ScrapedPage.objects.update_status([self.page.pk], ScrapingStatus.PROCESSING)
+        stale.status = ScrapingStatus.COMPLETED
+        stale.save()
+        self.assertEqual(totals(self.user)[ScrapingStatus.PROCESSING], 0)
+        self.assertEqual(totals(self.user)[ScrapingStatus.COMPLETED], 1)
+        self.assertEqual(totals(self.user)[ScrapingStatus.PENDING], 0)
+
+    def test_scrape_records_domains(self):
+        """Test a scrape stores its domain histogram and re-scrapes apply the difference"""
+        self.scrape(self.page, '/a', '/b', 'https://other.example/x')
+        self.assertEqual(dict(self.page.domain_counts.values_list('domain', 'link_count')),
+                         {'example.com': 2, 'other.example': 1})
+        self.assertEqual(totals(self.user)['links'], 3)
+
+        self.scrape(self.page, '/a', 'https://third.example/')
+        stats, domains = get_page_stats(self.user)
+        self.assertEqual(stats.links, 2)
+        self.assertEqual(stats.completed, 1)
+        self.assertEqual(domains, [('example.com', 1), ('third.example', 1)])
+        self.assertFalse(UserDomainCount.objects.filter(domain='other.example').exists())
+
+    def test_delete_takes_pages_out(self):
+        """Test deleted pages leave their user's totals at once"""
+        self.scrape(self.page, '/a', '/b')
+        soft_delete_pages(self.user, [self.page.pk])
+        self.assertEqual(totals(self.user)[ScrapingStatus.COMPLETED], 0)
+        self.assertEqual(totals(self.user)['links'], 0)
+        self.assertFalse(UserDomainCount.objects.filter(user=self.user).exists())
+
+    def test_rebuild_repairs_drift(self):
+        """Test the rebuild command recomputes totals and histograms from the stored links"""
+        self.scrape(self.page, '/a', 'https://other.example/x')
+        UserPageStats.objects.filter(user=self.user).update(completed=5, links=40)
+        PageDomainCount.objects.all().delete()
+        UserDomainCount.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_page_stats', stdout=out)
+        self.assertIn('1 repaired', out.getvalue())
+        self.assertEqual(totals(self.user)[ScrapingStatus.COMPLETED], 1)
+        self.assertEqual(totals(self.user)['links'], 2)
+        self.assertEqual(get_page_stats(self.user)[1], [('example.com', 1), ('other.example', 1)])
+
+    @patch('scraper.views.queue_scraping_task')
+    def test_page_list_reads_aggregates(self, queue):
+        """Test the stats panel reads the aggregates and only the pages are counted"""
+        self.scrape(self.page, '/a', 'https://other.example/x')
+        client = Client()
+        client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('scraper:page_list'))
+        self.assertContains(response, 'other.example')
+        counts = [query['sql'] for query in queries.captured_queries if 'COUNT(' in query['sql']]
+        self.assertEqual(len(counts), 1)
+        self.assertNotIn('scraper_pagelink', counts[0])
+
+    def test_page_list_ignores_drift(self):
+        """Test drifted totals never hide pages from the list"""
+        UserPageStats.objects.filter(user=self.user).update(pending=0)
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('scraper:page_list'))
+        self.assertEqual(response.context['total_pages'], 1)
+        self.assertEqual(list(response.context['page_obj']), [self.page])
+
+
+class PageAggregatesMigrationTest(TransactionTestCase):
+    """Test the aggregates are backfilled from pages stored before they existed"""
+
+    migrate_from = [('scraper', '0016_scrapedpage_deleted_at')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.addCleanup(self.migrate)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_migration_backfill(self):
+        """Test the migration counts pages and links stored before the aggregates existed"""
+        OldUser = self.apps.get_model('auth', 'User')
+        OldPage = self.apps.get_model('scraper', 'ScrapedPage')
+        OldUrl = self.apps.get_model('scraper', 'Url')
+        OldLink = self.apps.get_model('scraper', 'PageLink')
+        user = OldUser.objects.create(username='test@example.com', email='test@example.com')
+        page = OldPage.objects.create(
+            user=user, url='https://example.com/', url_hash='a', status=ScrapingStatus.COMPLETED)
+        OldPage.objects.create(user=user, url='https://example.org/', url_hash='b')
+        for url in ('https://example.com/a', 'https://other.example/x'):
+            OldLink.objects.create(
+                page=page, target=OldUrl.objects.create(url=url, url_hash=url[-8:]), name=url)
+
+        self.migrate()
+        user = User.objects.get(pk=user.pk)
+        self.assertEqual(totals(user), {
+            ScrapingStatus.PENDING: 1, ScrapingStatus.PROCESSING: 0,
+            ScrapingStatus.COMPLETED: 1, ScrapingStatus.FAILED: 0, 'links': 2,
+        })
+        self.assertEqual(get_page_stats(user)[1], [('example.com', 1), ('other.example', 1)])
+        self.assertEqual(PageDomainCount.objects.filter(page_id=page.pk).count(), 2)
@@ -0,0 +1,211 @@
+import gzip
+import json
+from datetime import timedelta
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from ..models import ScrapedPage, PageLink
+from ..api import encode_cursor, decode_cursor, ApiError
+
+
+class ApiHelpersTest(TestCase):
+    """Test JSON API helpers"""
+
+    def test_cursor_round_trip(self):
+        """Test cursors decode back to the encoded id"""
+        self.assertEqual(decode_cursor(encode_cursor(42)), 42)
+
+    def test_invalid_cursor(self):
+        """Test garbage cursors are rejected"""
+        with self.assertRaises(ApiError):
+            decode_cursor('not-a-cursor')
+
+
+class PagesApiTest(TestCase):
+    """Test the pages and links JSON API"""
+
+    # Session lookup, user lookup and the data query itself
+    QUERY_BUDGET = 3
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.pages = [
+            ScrapedPage.objects.create(
+                user=self.user,
+                url=f'https://example.com/{i}',
+                title=f'Page {i}',
+                status='completed' if i % 2 else 'pending',
+            )
+            for i in range(5)
+        ]
+        PageLink.objects.bulk_create(
+            PageLink(page=self.pages[0], url=f'https://example.com/link/{i}',
+                     name=f'Link {i}')
+            for i in range(5)
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+
+    def get_json(self, url, params=None):
+        response = self.client.get(url, params or {})
+        return response, json.loads(response.content)
+
+    def test_pages_api_requires_login(self):
+        """Test the API requires authentication"""
+        self.client.logout()
+        response = self.client.get(reverse('scraper:pages_api'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_pages_api_cursor_pagination(self):
+        """Test walking every page through cursors"""
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            with self.assertNumQueries(self.QUERY_BUDGET):
+                response, data = self.get_json(reverse('scraper:pages_api'), params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(seen, [page.pk for page in reversed(self.pages)])
+
+    def test_pages_api_sparse_fields(self):
+        """Test ?fields= limits the returned keys"""
+        response, data = self.get_json(
+            reverse('scraper:pages_api'), {'fields': 'url'})
+        self.assertEqual(set(data['results'][0]), {'url'})
+
+    def test_pages_api_unknown_field(self):
+        """Test unknown fields are rejected"""
+        response, data = self.get_json(
+            reverse('scraper:pages_api'), {'fields': 'url,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_api_filters(self):
+        """Test status and updated_since filters"""
+        response, data = self.get_json(
+            reverse('scraper:pages_api'), {'status': 'completed'})
+        self.assertEqual(len(data['results']), 2)
+
+        since = (timezone.now() + timedelta(days=1)).isoformat()
+        response, data = self.get_json(
+            reverse('scraper:pages_api'), {'updated_since': since})
+        self.assertEqual(data['results'], [])
+
+        response, data = self.get_json(
+            reverse('scraper:pages_api'), {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_api_excludes_other_users(self):
+        """Test other users' pages are not listed"""
+        other_user = User.objects.create_user(
+            username='other@example.com',
+            email='other@example.com',
+            password='testpass123'
+        )
+        ScrapedPage.objects.create(user=other_user, url='https://other.com')
+
+        response, data = self.get_json(reverse('scraper:pages_api'))
+        self.assertEqual(len(data['results']), 5)
+
+    def test_pages_api_gzip(self):
+        """Test responses are gzipped when the client accepts it"""
+        response = self.client.get(
+            reverse('scraper:pages_api'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data['results']), 5)
+
+    def test_page_links_api(self):
+        """Test listing links of a page with a query budget"""
+        url = reverse('scraper:page_links_api', kwargs={'pk': self.pages[0].pk})
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response, data = self.get_json(url, {'limit': 3, 'fields': 'url'})
+
+        self.assertEqual(len(data['results']), 3)
+        self.assertEqual(data['results'][0], {'url': 'https://example.com/link/0'})
+
+        response, data = self.get_json(url, {'cursor': data['next_cursor']})
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_page_links_api_empty_page(self):
+        """Test an owned page without links returns an empty list"""
+        url = reverse('scraper:page_links_api', kwargs={'pk': self.pages[1].pk})
+        with self.assertNumQueries(self.QUERY_BUDGET + 1):
+            response, data = self.get_json(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['results'], [])
+
+    def test_page_links_api_other_user(self):
+        """Test links of another user's page are not accessible"""
+        other_user = User.objects.create_user(
+            username='other@example.com',
+            email='other@example.com',
+            password='testpass123'
+        )
+        other_page = ScrapedPage.objects.create(
+            user=other_user, url='https://other.com')
+        PageLink.objects.create(
+            page=other_page, url='https://other.com/x', name='Hidden')
+
+        response, data = self.get_json(
+            reverse('scraper:page_links_api', kwargs={'pk': other_page.pk}))
+        self.assertEqual(response.status_code, 404)
+
+
+class BacklinksApiTest(TestCase):
+    """Test the backlinks JSON API"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+
+    def test_backlinks_api(self):
+        """Test listing own pages that link to a URL"""
+        linking = ScrapedPage.objects.create(user=self.user, url='https://a.com')
+        ScrapedPage.objects.create(user=self.user, url='https://b.com')
+        other_user = User.objects.create_user(
+            username='other@example.com',
+            email='other@example.com',
+            password='testpass123'
+        )
+        other_page = ScrapedPage.objects.create(
+            user=other_user, url='https://c.com')
+        PageLink.objects.create(page=linking, url='https://target.com/', name='T')
+        PageLink.objects.create(page=other_page, url='https://target.com/', name='T')
+
+        response = self.client.get(
+            reverse('scraper:backlinks_api'),
+            {'url': 'HTTPS://Target.com#top', 'fields': 'id,url'}
+        )
+        data = json.loads(response.content)
+        self.assertEqual(data['url'], 'https://target.com/')
+        self.assertEqual(data['results'], [{'id': linking.pk, 'url': 'https://a.com'}])
+
+    def test_backlinks_api_unknown_url(self):
+        """Test a URL nobody links to returns no results"""
+        response = self.client.get(
+            reverse('scraper:backlinks_api'), {'url': 'https://nowhere.com'})
+        self.assertEqual(json.loads(response.content)['results'], [])
+
+    def test_backlinks_api_invalid_url(self):
+        """Test a missing or non-http url is rejected"""
+        response = self.client.get(
+            reverse('scraper:backlinks_api'), {'url': 'mailto:x@example.com'})
+        self.assertEqual(response.status_code, 400)
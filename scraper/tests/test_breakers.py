@@ -0,0 +1,152 @@
+from unittest.mock import ANY, patch
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+import redis
+import requests
+import responses
+from ..models import ScrapedPage
+from ..breakers import CircuitBreaker, CircuitOpenError, CircuitState, get_tripped_circuits
+from ..utils import scrape_page_links
+from ..tasks import scrape_page_task
+from ..constants import ScrapingStatus, Lane
+from .test_common import FakeRedis
+
+
+@override_settings(CIRCUIT_FAILURE_THRESHOLD=3, CIRCUIT_FAILURE_WINDOW=60,
+                   CIRCUIT_OPEN_SECONDS=120)
+class CircuitBreakerTest(TestCase):
+    """Test per-host circuit breakers and deferred scrapes"""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch('scraper.breakers.redis_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.page = ScrapedPage.objects.create(user=self.user, url='https://down.example.com/')
+        self.breaker = CircuitBreaker('down.example.com')
+
+    def trip(self):
+        for _ in range(3):
+            self.breaker.record(requests.ConnectionError())
+
+    def test_opens_after_threshold(self):
+        """Test transient failures open the circuit, other answers do not"""
+        self.breaker.record(requests.ConnectionError())
+        self.breaker.record(requests.Timeout())
+        self.assertEqual(self.breaker.state(), CircuitState.CLOSED)
+
+        response = requests.Response()
+        response.status_code = 404
+        self.breaker.record(requests.HTTPError(response=response))
+        self.breaker.record(requests.ConnectionError())
+        self.assertEqual(self.breaker.state(), CircuitState.CLOSED)
+
+        self.trip()
+        self.assertEqual(self.breaker.state(), CircuitState.OPEN)
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_request()
+        self.assertEqual(raised.exception.retry_in, 120)
+
+    def test_failures_outside_window_forgotten(self):
+        """Test only failures within the window count towards the threshold"""
+        self.breaker.record(requests.ConnectionError())
+        self.breaker.record(requests.ConnectionError())
+        self.redis.now += 61
+        self.breaker.record(requests.ConnectionError())
+        self.assertEqual(self.breaker.state(), CircuitState.CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        """Test a half-open circuit allows a single probe whose outcome decides"""
+        self.trip()
+        self.redis.now += 121
+        self.assertEqual(self.breaker.state(), CircuitState.HALF_OPEN)
+
+        self.breaker.before_request()
+        with self.assertRaises(CircuitOpenError):
+            CircuitBreaker('down.example.com').before_request()
+
+        self.breaker.record(requests.ConnectionError())
+        self.assertEqual(self.breaker.state(), CircuitState.OPEN)
+
+        self.redis.now += 121
+        self.breaker.before_request()
+        self.breaker.record()
+        self.assertEqual(self.breaker.state(), CircuitState.CLOSED)
+        CircuitBreaker('down.example.com').before_request()
+
+    def test_scrape_skips_open_host(self):
+        """Test no request is sent to a host whose circuit is open"""
+        self.trip()
+        with responses.RequestsMock() as mock:
+            self.assertEqual(scrape_page_links(self.page), 0)
+            self.assertEqual(len(mock.calls), 0)
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.status, ScrapingStatus.FAILED)
+        self.assertIn('Circuit open', self.page.error_message)
+
+    def test_scrape_failures_trip_circuit(self):
+        """Test fetch outcomes in scrape_page_links feed the breaker"""
+        with responses.RequestsMock() as mock:
+            mock.add(responses.GET, 'https://down.example.com/', status=503)
+            for _ in range(3):
+                scrape_page_links(self.page)
+        self.assertEqual(self.breaker.state(), CircuitState.OPEN)
+
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_task_deferred_while_open(self, mock_apply_async):
+        """Test a queued scrape of a tripped host is deferred, not retried or failed"""
+        self.trip()
+        result = scrape_page_task.apply(args=[self.page.pk]).get()
+        self.assertEqual(result['deferred'], 120)
+        mock_apply_async.assert_called_once_with(
+            args=[self.page.pk], kwargs={'lane': None, 'requested_at': ANY},
+            queue=None, countdown=120)
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.status, ScrapingStatus.PENDING)
+
+        mock_apply_async.reset_mock()
+        scrape_page_task.apply(args=[self.page.pk],
+                               kwargs={'lane': Lane.BULK, 'requested_at': 1000.0})
+        mock_apply_async.assert_called_once_with(
+            args=[self.page.pk], kwargs={'lane': Lane.BULK, 'requested_at': 1000.0},
+            queue=Lane.QUEUES[Lane.BULK], countdown=120)
+
+    @patch('scraper.tasks.scrape_page_task.apply_async', side_effect=Exception('no broker'))
+    def test_deferral_publish_failure(self, mock_apply_async):
+        """Test a scrape that cannot be deferred is left to the reconciler"""
+        self.trip()
+        result = scrape_page_task.apply(args=[self.page.pk]).get()
+        self.assertEqual(result['error'], 'no broker')
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.status, ScrapingStatus.PENDING)
+        self.assertIsNotNone(self.page.needs_enqueue_at)
+
+    def test_redis_down_fails_closed(self):
+        """Test scraping goes ahead when Redis is unreachable"""
+        broken = CircuitBreaker('down.example.com', client=redis.Redis(port=1))
+        broken.before_request()
+        broken.record(requests.ConnectionError())
+
+    def test_queue_status_shows_tripped_hosts(self):
+        """Test the queue status page lists open and half-open hosts"""
+        self.trip()
+        CircuitBreaker('slow.example.com').trip()
+        self.redis.now += 121
+        CircuitBreaker('slow.example.com').trip()
+        self.assertEqual(get_tripped_circuits(), [
+            {'host': 'down.example.com', 'state': CircuitState.HALF_OPEN, 'retry_in': 0},
+            {'host': 'slow.example.com', 'state': CircuitState.OPEN, 'retry_in': 120},
+        ])
+
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('scraper:queue_status'))
+        self.assertContains(response, 'down.example.com')
+        self.assertContains(response, 'Half-open')
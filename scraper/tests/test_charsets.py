@@ -0,0 +1,75 @@
+import codecs
+from django.test import TestCase
+from django.contrib.auth.models import User
+import responses
+from ..models import ScrapedPage
+from ..charsets import decode_html
+from ..utils import scrape_page_links
+from ..constants import CharsetSource
+
+TEXT = '<p>Déjà vu au café</p>'
+
+
+class DecodeHtmlTest(TestCase):
+    """Test choosing a page's encoding from the cheapest source"""
+
+    def test_header_charset(self):
+        """Test the Content-Type charset is used without looking at the document"""
+        page = decode_html(TEXT.encode('cp1252'), 'text/html; charset="Windows-1252"')
+        self.assertEqual((page.text, page.encoding, page.source),
+                         (TEXT, 'cp1252', CharsetSource.HEADER))
+
+    def test_bom_wins(self):
+        """Test a byte order mark is trusted over the header"""
+        page = decode_html(codecs.BOM_UTF8 + TEXT.encode(), 'text/html; charset=iso-8859-1')
+        self.assertEqual((page.text, page.source), (TEXT, CharsetSource.BOM))
+        page = decode_html(codecs.BOM_UTF16_LE + TEXT.encode('utf-16-le'))
+        self.assertEqual((page.text, page.source), (TEXT, CharsetSource.BOM))
+
+    def test_meta_charset(self):
+        """Test both forms of <meta> declaration near the top are sniffed"""
+        for meta in ('<meta charset="iso-8859-1">',
+                     '<meta http-equiv="Content-Type" content="text/html; charset=latin1">'):
+            page = decode_html((meta + TEXT).encode('cp1252'), 'text/html')
+            self.assertEqual(page.source, CharsetSource.META)
+            # Latin-1 labels are read as windows-1252, as browsers do
+            self.assertEqual(page.encoding, 'cp1252')
+            self.assertTrue(page.text.endswith(TEXT))
+
+    def test_late_meta_is_detected(self):
+        """Test a declaration past the first kilobyte falls back to detection"""
+        data = ('<!--' + 'x' * 2000 + '--><meta charset="utf-8">' + TEXT).encode()
+        page = decode_html(data)
+        self.assertEqual(page.source, CharsetSource.DETECTED)
+        self.assertTrue(page.text.endswith(TEXT))
+
+    def test_wrong_declaration_falls_through(self):
+        """Test a declared encoding the page does not decode with is skipped"""
+        data = ('<meta charset="utf-8">' + TEXT).encode('cp1252')
+        page = decode_html(data, 'text/html; charset=utf-8')
+        self.assertEqual(page.source, CharsetSource.DETECTED)
+        self.assertNotIn('�', page.text)
+
+    def test_unknown_label_ignored(self):
+        """Test an unknown charset label is treated as no declaration"""
+        page = decode_html(TEXT.encode(), 'text/html; charset=klingon')
+        self.assertEqual((page.text, page.source), (TEXT, CharsetSource.DETECTED))
+
+    @responses.activate
+    def test_scrape_reports_path(self):
+        """Test a scrape parses the decoded text and stores how it was decoded"""
+        user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        page = ScrapedPage.objects.create(user=user, url='https://example.com/')
+        responses.add(responses.GET, 'https://example.com/',
+                      body='<html><head><title>Café</title></head></html>'.encode('cp1252'),
+                      content_type='text/html; charset=windows-1252')
+
+        scrape_page_links(page)
+        page.refresh_from_db()
+        self.assertEqual(page.title, 'Café')
+        self.assertEqual(page.fetch_stats['charset'], 'cp1252')
+        self.assertEqual(page.fetch_stats['charset_source'], CharsetSource.HEADER)
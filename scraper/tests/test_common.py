@@ -5,6 +5,7 @@ This module contains shared test utilities and configurations
 that can be used across multiple test files.
 """
 
+import fnmatch
 from django.contrib.auth.models import User
 
 
@@ -61,3 +62,182 @@ TEST_URLS = {
     'with_path': 'https://example.com/page',
     'with_query': 'https://example.com/page?param=value'
 }
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands used by circuit breakers,
+    latency sketches and the scheduler, with a settable clock for expiry"""
+
+    def __init__(self):
+        self.now = 0
+        self.values = {}
+        self.expiry = {}
+
+    def _alive(self, key):
+        if key in self.expiry and self.expiry[key] <= self.now:
+            self.values.pop(key, None)
+            self.expiry.pop(key)
+        return key in self.values
+
+    def exists(self, key):
+        return int(self._alive(key))
+
+    def ttl(self, key):
+        if not self._alive(key):
+            return -2
+        return self.expiry[key] - self.now if key in self.expiry else -1
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and self._alive(key):
+            return None
+        self.values[key] = value
+        self.expiry.pop(key, None)
+        if ex:
+            self.expiry[key] = self.now + ex
+        return True
+
+    def incr(self, key):
+        self.values[key] = (self.values[key] if self._alive(key) else 0) + 1
+        return self.values[key]
+
+    def expire(self, key, seconds, nx=False):
+        if self._alive(key) and not (nx and key in self.expiry):
+            self.expiry[key] = self.now + seconds
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.expiry.pop(key, None)
+
+    def eval(self, script, numkeys, key, token):
+        # The only script used is the scheduler's compare-and-delete
+        if self._alive(key) and self.values[key] == token:
+            self.delete(key)
+            return 1
+        return 0
+
+    def hgetall(self, key):
+        if not self._alive(key):
+            return {}
+        return {field.encode(): self._encode(value) for field, value in self.values[key].items()}
+
+    def hset(self, key, mapping):
+        if not self._alive(key):
+            self.values[key] = {}
+        self.values[key].update(mapping)
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def _collection(self, key, factory):
+        if not self._alive(key):
+            self.values[key] = factory()
+        return self.values[key]
+
+    def rpush(self, key, *values):
+        items = self._collection(key, list)
+        items.extend(self._encode(value) for value in values)
+        return len(items)
+
+    def lpush(self, key, *values):
+        items = self._collection(key, list)
+        for value in values:
+            items.insert(0, self._encode(value))
+        return len(items)
+
+    def lpop(self, key):
+        items = self._collection(key, list)
+        return items.pop(0) if items else None
+
+    def rpoplpush(self, source, destination):
+        items = self._collection(source, list)
+        if not items:
+            return None
+        value = items.pop()
+        self._collection(destination, list).insert(0, value)
+        return value
+
+    def lrem(self, key, count, value):
+        items = self._collection(key, list)
+        kept = [item for item in items if item != self._encode(value)]
+        removed = len(items) - len(kept)
+        items[:] = kept
+        return removed
+
+    def llen(self, key):
+        return len(self.values[key]) if self._alive(key) else 0
+
+    def lrange(self, key, start, end):
+        items = self.values[key] if self._alive(key) else []
+        return items[start:None if end == -1 else end + 1]
+
+    def ltrim(self, key, start, end):
+        if self._alive(key):
+            self.values[key] = self.lrange(key, start, end)
+
+    def sadd(self, key, *members):
+        items = self._collection(key, set)
+        added = {self._encode(member) for member in members} - items
+        items.update(added)
+        return len(added)
+
+    def srem(self, key, *members):
+        items = self._collection(key, set)
+        removed = {self._encode(member) for member in members} & items
+        items.difference_update(removed)
+        return len(removed)
+
+    def smembers(self, key):
+        return set(self.values[key]) if self._alive(key) else set()
+
+    def zadd(self, key, mapping, xx=False):
+        items = self._collection(key, dict)
+        if xx:
+            mapping = {member: score for member, score in mapping.items()
+                       if self._encode(member) in items}
+        added = len({self._encode(member) for member in mapping} - set(items))
+        items.update({self._encode(member): score for member, score in mapping.items()})
+        return added
+
+    def zrem(self, key, *members):
+        items = self._collection(key, dict)
+        return sum(items.pop(self._encode(member), None) is not None for member in members)
+
+    def zcard(self, key):
+        return len(self.values[key]) if self._alive(key) else 0
+
+    def zrevrange(self, key, start, end):
+        items = self.values[key] if self._alive(key) else {}
+        ranked = sorted(items, key=items.get, reverse=True)
+        return ranked[start:None if end == -1 else end + 1]
+
+    def zcount(self, key, low, high):
+        return sum(float(low) <= score <= float(high)
+                   for score in (self.values[key].values() if self._alive(key) else []))
+
+    def zremrangebyscore(self, key, low, high):
+        items = self._collection(key, dict)
+        removed = [member for member, score in items.items() if float(low) <= score <= float(high)]
+        for member in removed:
+            del items[member]
+        return len(removed)
+
+    def scan_iter(self, match):
+        return [key.encode() for key in list(self.values)
+                if self._alive(key) and fnmatch.fnmatch(key, match)]
+
+    def pipeline(self):
+        fake = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+            def execute(self):
+                return [getattr(fake, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+        return Pipeline()
@@ -0,0 +1,148 @@
+import json
+from unittest.mock import patch, MagicMock
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.urls import reverse
+import redis
+from web_scraping_app import settings as project_settings
+from .. import connections
+
+
+class ConnectionLifecycleTest(TestCase):
+    """Test database connection settings, recycling and counters"""
+
+    def setUp(self):
+        connections.reset_connection_counters()
+        self.addCleanup(connections.reset_connection_counters)
+
+    def test_persistent_connections_configured(self):
+        """Test connections are kept open and health checked by default"""
+        for alias, config in settings.DATABASES.items():
+            if 'pool' in config.get('OPTIONS', {}):
+                self.assertEqual(config['CONN_MAX_AGE'], 0)
+            else:
+                self.assertEqual(config['CONN_MAX_AGE'], settings.DATABASE_CONN_MAX_AGE)
+            self.assertEqual(config['CONN_HEALTH_CHECKS'],
+                             settings.DATABASE_CONN_HEALTH_CHECKS)
+
+    def test_pool_needs_psycopg3(self):
+        """Test a pool without psycopg 3 installed is refused with a clear error"""
+        url = 'postgresql://user:password@db:5432/name'
+        with patch('web_scraping_app.settings.DATABASE_POOL_MAX_SIZE', 10):
+            with patch('web_scraping_app.settings.find_spec', return_value=None):
+                with self.assertRaisesMessage(ImproperlyConfigured, 'psycopg[pool]'):
+                    project_settings.database_config(url)
+            with patch('web_scraping_app.settings.find_spec', return_value=object()):
+                config = project_settings.database_config(url)
+        self.assertEqual(config['OPTIONS']['pool'], {
+            'min_size': project_settings.DATABASE_POOL_MIN_SIZE, 'max_size': 10})
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+    def test_opened_connections_counted(self):
+        """Test a new connection increments the opened counter"""
+        connection_created.send(sender=connection.__class__, connection=connection)
+        self.assertEqual(connections.connection_counters()['default']['opened'], 1)
+
+    def test_requests_reuse_open_connection(self):
+        """Test each request on an open connection counts as a reuse"""
+        user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        client = Client()
+        client.force_login(user)
+        connections.reset_connection_counters()
+
+        with patch.object(connections, 'publish_connection_stats'):
+            client.get(reverse('scraper:page_list'))
+            client.get(reverse('scraper:page_list'))
+
+        counters = connections.connection_counters()['default']
+        self.assertEqual(counters['reused'], 2)
+        self.assertEqual(counters['opened'], 0)
+
+    def test_tasks_only_close_unusable_connections(self):
+        """Test connections are recycled between tasks, not closed outright"""
+        conn = MagicMock(alias='default', connection=object())
+        task = MagicMock()
+        task.request.is_eager = False
+
+        with patch.object(connections.connections, 'all', return_value=[conn]), \
+                patch.object(connections, 'publish_connection_stats'):
+            connections.on_task_prerun(task=task)
+            connections.on_task_postrun(task=task)
+
+        self.assertEqual(conn.close_if_unusable_or_obsolete.call_count, 2)
+        conn.close.assert_not_called()
+        self.assertEqual(connections.connection_counters()['default']['reused'], 1)
+
+    def test_eager_tasks_leave_connections_alone(self):
+        """Test eager tasks do not touch the caller's connection"""
+        conn = MagicMock(alias='default', connection=object())
+        task = MagicMock()
+        task.request.is_eager = True
+
+        with patch.object(connections.connections, 'all', return_value=[conn]):
+            connections.on_task_prerun(task=task)
+            connections.on_task_postrun(task=task)
+
+        conn.close_if_unusable_or_obsolete.assert_not_called()
+
+    def test_publish_and_read_stats(self):
+        """Test published counters are read back as rows per process"""
+        client = MagicMock()
+        client.scan_iter.return_value = [b'db_connections:worker:host:42']
+        client.mget.return_value = [
+            json.dumps({'default': {'opened': 1, 'reused': 3}}).encode()]
+
+        with patch('scraper.connections.redis_client', return_value=client):
+            connections.publish_connection_stats()
+            rows = connections.get_connection_stats()
+
+        client.set.assert_called_once()
+        self.assertEqual(rows, [{
+            'process': 'worker:host:42',
+            'database': 'default',
+            'opened': 1,
+            'reused': 3,
+            'reuse_ratio': 0.75,
+        }])
+
+    def test_stats_unavailable_without_redis(self):
+        """Test an unreachable Redis yields no stats instead of an error"""
+        client = MagicMock()
+        client.set.side_effect = client.scan_iter.side_effect = redis.ConnectionError()
+        with patch('scraper.connections.redis_client', return_value=client):
+            connections.publish_connection_stats(force=True)
+            self.assertEqual(connections.get_connection_stats(), [])
+
+    def test_green_pool_detected(self):
+        """Test gevent and eventlet pools are recognized by name or class"""
+        self.assertEqual(connections.green_pool_name('gevent'), 'gevent')
+        self.assertEqual(connections.green_pool_name(
+            type('TaskPool', (), {'__module__': 'celery.concurrency.eventlet'})), 'eventlet')
+        self.assertIsNone(connections.green_pool_name('prefork'))
+        self.assertIsNone(connections.green_pool_name('threads'))
+
+    def test_green_pool_releases_connections(self):
+        """Test green-thread tasks close their connections for network waits and at the end"""
+        conn = MagicMock(alias='default', connection=object(), in_atomic_block=False)
+        task = MagicMock()
+        task.request.is_eager = False
+
+        with patch.object(connections.connections, 'all', return_value=[conn]), \
+                patch.object(connections, 'publish_connection_stats'):
+            connections.release_connections()
+            conn.close.assert_not_called()
+
+            with patch.object(connections, '_green_pool', 'gevent'):
+                connections.release_connections()
+                connections.on_task_postrun(task=task)
+
+        self.assertEqual(conn.close.call_count, 2)
+        conn.close_if_unusable_or_obsolete.assert_not_called()
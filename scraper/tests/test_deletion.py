@@ -0,0 +1,119 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from ..models import ScrapedPage, PageLink, PageResource, Url, UserPageStats
+from ..deletion import soft_delete_pages, purge_page
+from ..tasks import purge_deleted_pages
+from ..constants import Messages, Extractor, ScrapingStatus
+
+
+class PageDeletionTest(TestCase):
+    """Test pages are hidden at once and purged in bounded batches"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.page = ScrapedPage.objects.create(user=self.user, url='https://example.com/')
+        PageLink.objects.bulk_create(
+            PageLink(page=self.page, url=f'https://example.com/{i}', name=f'Link {i}')
+            for i in range(7))
+        PageResource.objects.create(
+            page=self.page, kind=Extractor.IMAGES,
+            target=Url.objects.intern('https://example.com/logo.png'))
+
+    @patch('scraper.views.delete_pages_task')
+    def test_delete_view_hides_page(self, task):
+        """Test deleting a page hides it and queues its purge without touching its links"""
+        response = self.client.post(reverse('scraper:delete_page', args=[self.page.pk]))
+
+        self.assertRedirects(response, reverse('scraper:page_list'))
+        self.assertFalse(ScrapedPage.objects.filter(pk=self.page.pk).exists())
+        self.assertEqual(self.client.get(reverse('scraper:page_detail', args=[self.page.pk])).status_code, 404)
+        self.assertEqual(PageLink.objects.filter(page_id=self.page.pk).count(), 7)
+        task.delay.assert_called_once_with([self.page.pk])
+
+    @patch('scraper.views.delete_pages_task')
+    def test_bulk_delete(self, task):
+        """Test only the user's own selected pages are deleted"""
+        other = User.objects.create_user(
+            username='other@example.com', email='other@example.com', password='testpass123')
+        other_page = ScrapedPage.objects.create(user=other, url='https://example.com/')
+        second = ScrapedPage.objects.create(user=self.user, url='https://example.org/')
+        kept = ScrapedPage.objects.create(user=self.user, url='https://example.net/')
+
+        response = self.client.post(reverse('scraper:delete_pages'), {
+            'page_ids': [self.page.pk, second.pk, other_page.pk, 'x']}, follow=True)
+
+        self.assertContains(response, Messages.PAGES_DELETED_SUCCESS.format(2))
+        self.assertEqual(set(ScrapedPage.objects.values_list('pk', flat=True)),
+                         {other_page.pk, kept.pk})
+        self.assertEqual(sorted(task.delay.call_args.args[0]), sorted([self.page.pk, second.pk]))
+
+        response = self.client.post(reverse('scraper:delete_pages'), follow=True)
+        self.assertContains(response, Messages.NO_PAGES_SELECTED)
+
+    @patch('scraper.views.delete_pages_task')
+    def test_queue_unavailable(self, task):
+        """Test a page is still hidden when its purge cannot be queued"""
+        task.delay.side_effect = ConnectionError('broker down')
+        self.client.post(reverse('scraper:delete_page', args=[self.page.pk]))
+        self.assertTrue(ScrapedPage.all_objects.filter(
+            pk=self.page.pk, deleted_at__isnull=False).exists())
+
+    def test_url_can_be_added_again(self):
+        """Test a deleted page awaiting its purge does not block the same URL"""
+        soft_delete_pages(self.user, [self.page.pk])
+        page = ScrapedPage.objects.create(user=self.user, url=self.page.url)
+        self.assertEqual(ScrapedPage.objects.for_url(self.user, self.page.url).get(), page)
+
+    def test_purge_in_batches(self):
+        """Test links are removed in batches without loading them, then the page"""
+        live = ScrapedPage.objects.create(user=self.user, url='https://example.org/')
+        self.assertEqual(purge_page(live.pk), 0)
+        self.assertTrue(ScrapedPage.objects.filter(pk=live.pk).exists())
+
+        soft_delete_pages(self.user, [self.page.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(purge_page(self.page.pk, batch_size=3), 8)
+        link_deletes = [query for query in queries.captured_queries
+                        if query['sql'].startswith('DELETE FROM "scraper_pagelink"')
+                        and '"id" IN' in query['sql']]
+        self.assertEqual(len(link_deletes), 3)
+
+        self.assertFalse(ScrapedPage.all_objects.filter(pk=self.page.pk).exists())
+        self.assertFalse(PageLink.objects.filter(page_id=self.page.pk).exists())
+        self.assertFalse(PageResource.objects.filter(page_id=self.page.pk).exists())
+        self.assertTrue(Url.objects.filter(url='https://example.com/0').exists())
+
+    def test_purge_sweep(self):
+        """Test the sweep purges pages deleted long enough ago and leaves recent ones to their task"""
+        recent = ScrapedPage.objects.create(user=self.user, url='https://example.org/')
+        soft_delete_pages(self.user, [self.page.pk, recent.pk])
+        ScrapedPage.all_objects.filter(pk=self.page.pk).update(
+            deleted_at=timezone.now() - timedelta(days=1))
+
+        self.assertEqual(purge_deleted_pages(), 1)
+        self.assertEqual(list(ScrapedPage.all_objects.values_list('pk', flat=True)), [recent.pk])
+
+    def test_delete_during_scrape(self):
+        """Test a scrape saving a copy read before the delete does not bring the page back"""
+        in_flight = ScrapedPage.objects.get(pk=self.page.pk)
+        soft_delete_pages(self.user, [self.page.pk])
+
+        in_flight.status = ScrapingStatus.COMPLETED
+        in_flight.title = 'Scraped'
+        in_flight.save()
+
+        self.assertFalse(ScrapedPage.objects.filter(pk=self.page.pk).exists())
+        stats = UserPageStats.objects.get(user=self.user)
+        self.assertEqual((stats.pending, stats.completed), (0, 0))
@@ -0,0 +1,143 @@
+import gzip
+import json
+import tracemalloc
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.urls import reverse
+from ..models import ScrapedPage, PageLink
+from ..exports import stream_rows, page_link_rows
+
+
+class ExportViewsTest(TestCase):
+    """Test streaming link export views"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.page = ScrapedPage.objects.create(
+            user=self.user,
+            url='https://example.com',
+            title='Test Page'
+        )
+        PageLink.objects.create(
+            page=self.page, url='https://example.com/a', name='Link A')
+        PageLink.objects.create(
+            page=self.page, url='https://example.com/b', name='Link, "B"')
+        self.client.login(username='test@example.com', password='testpass123')
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_export_page_links_csv(self):
+        """Test CSV export of a single page"""
+        response = self.client.get(
+            reverse('scraper:export_page_links', kwargs={'pk': self.page.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('page-%d-links.csv' % self.page.pk,
+                      response['Content-Disposition'])
+
+        lines = self.read(response).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'url,name')
+        self.assertEqual(lines[1], 'https://example.com/a,Link A')
+        self.assertEqual(lines[2], 'https://example.com/b,"Link, ""B"""')
+
+    def test_export_page_links_jsonl(self):
+        """Test JSON Lines export of a single page"""
+        response = self.client.get(
+            reverse('scraper:export_page_links', kwargs={'pk': self.page.pk}),
+            {'format': 'jsonl'}
+        )
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        rows = [json.loads(line)
+                for line in self.read(response).decode('utf-8').splitlines()]
+        self.assertEqual(rows[0], {'url': 'https://example.com/a', 'name': 'Link A'})
+        self.assertEqual(len(rows), 2)
+
+    def test_export_page_links_gzip(self):
+        """Test gzip compressed export"""
+        response = self.client.get(
+            reverse('scraper:export_page_links', kwargs={'pk': self.page.pk}),
+            {'gzip': '1'}
+        )
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+
+        content = gzip.decompress(self.read(response)).decode('utf-8')
+        self.assertTrue(content.startswith('url,name'))
+
+    def test_export_user_links(self):
+        """Test export across all pages of the current user"""
+        other_user = User.objects.create_user(
+            username='other@example.com',
+            email='other@example.com',
+            password='testpass123'
+        )
+        other_page = ScrapedPage.objects.create(
+            user=other_user, url='https://other.com')
+        PageLink.objects.create(
+            page=other_page, url='https://other.com/x', name='Hidden')
+
+        response = self.client.get(reverse('scraper:export_user_links'))
+        content = self.read(response).decode('utf-8')
+        self.assertTrue(content.startswith('page_url,url,name'))
+        self.assertIn('https://example.com,https://example.com/a,Link A', content)
+        self.assertNotIn('Hidden', content)
+
+    def test_export_other_user_page(self):
+        """Test user cannot export another user's page"""
+        other_user = User.objects.create_user(
+            username='other@example.com',
+            email='other@example.com',
+            password='testpass123'
+        )
+        other_page = ScrapedPage.objects.create(
+            user=other_user, url='https://other.com')
+
+        response = self.client.get(
+            reverse('scraper:export_page_links', kwargs={'pk': other_page.pk}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportMemoryTest(TestCase):
+    """Test that exports stream instead of loading every link"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def create_page(self, url, link_count):
+        page = ScrapedPage.objects.create(user=self.user, url=url)
+        PageLink.objects.bulk_create(
+            PageLink(page=page, url=f'{url}/link/{i}', name=f'Link {i}')
+            for i in range(link_count)
+        )
+        return page
+
+    def peak_memory(self, page):
+        rows = page_link_rows(page, chunk_size=200)
+        tracemalloc.start()
+        try:
+            for _ in stream_rows(rows, ('url', 'name'), 'csv', compress=True):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_memory_stays_flat_for_large_export(self):
+        """Test peak memory does not grow with the number of links"""
+        small_page = self.create_page('https://small.example.com', 2000)
+        large_page = self.create_page('https://large.example.com', 20000)
+
+        small_peak = self.peak_memory(small_page)
+        large_peak = self.peak_memory(large_page)
+
+        self.assertLess(large_peak, small_peak * 2)
@@ -0,0 +1,133 @@
+from unittest.mock import patch
+from bs4 import BeautifulSoup, Tag
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.urls import reverse
+import responses
+from ..models import ScrapedPage, PageResource
+from ..extractors import run_extractors
+from ..forms import AddUrlForm
+from ..utils import scrape_page_links
+from ..urlnorm import LinkNormalizer
+from ..constants import Extractor
+
+HTML = '''
+<html><head>
+<title>Post</title>
+<meta name="description" content="  A   short post ">
+<meta name="robots" content="noindex, follow">
+<link rel="canonical" href="/post">
+<link rel="stylesheet" href="/site.css" media="screen">
+<link rel="alternate" hreflang="es" href="/es/post">
+<link rel="icon" href="/favicon.ico">
+<script src="/app.js" type="module"></script>
+<script>var inline = true;</script>
+</head><body>
+<a href="/about">About</a>
+<img src="/logo.png" alt="Logo">
+<img alt="No source">
+</body></html>
+'''
+
+
+class ExtractorTest(TestCase):
+    """Test single-pass extraction of links, resources and metadata"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+
+    def extract(self, names):
+        soup = BeautifulSoup(HTML, 'html.parser')
+        return run_extractors(soup, names, LinkNormalizer('https://example.com/blog/'))
+
+    def scrape(self, extractors):
+        page = ScrapedPage.objects.create(
+            user=self.user, url='https://example.com/blog/', extractors=extractors)
+        with responses.RequestsMock() as mock:
+            mock.add(responses.GET, 'https://example.com/blog/', body=HTML,
+                     content_type='text/html')
+            scrape_page_links(page)
+        page.refresh_from_db()
+        return page
+
+    def test_each_extractor_result(self):
+        """Test every extractor collects its own targets"""
+        results = self.extract(Extractor.CHOICES)
+        self.assertEqual(results[Extractor.LINKS], {'https://example.com/about': 'About'})
+        self.assertEqual(results[Extractor.IMAGES], {'https://example.com/logo.png': 'Logo'})
+        self.assertEqual(results[Extractor.SCRIPTS], {'https://example.com/app.js': 'module'})
+        self.assertEqual(results[Extractor.STYLESHEETS],
+                         {'https://example.com/site.css': 'screen'})
+        self.assertEqual(results[Extractor.ALTERNATES], {'https://example.com/es/post': 'es'})
+        self.assertEqual(results[Extractor.CANONICAL], 'https://example.com/post')
+        self.assertEqual(results[Extractor.META],
+                         {'description': 'A short post', 'robots': 'noindex, follow'})
+
+    def test_single_traversal(self):
+        """Test all extractors share one find_all over the document"""
+        with patch.object(Tag, 'find_all', autospec=True,
+                          side_effect=Tag.find_all) as find_all:
+            self.extract(Extractor.CHOICES)
+        self.assertEqual(find_all.call_count, 1)
+
+    def test_only_requested_extractors_run(self):
+        """Test unrequested extractors produce no results"""
+        self.assertEqual(list(self.extract([Extractor.LINKS])), [Extractor.LINKS])
+
+    def test_scrape_stores_resources_and_metadata(self):
+        """Test enabled extractors are stored with the page"""
+        page = self.scrape(Extractor.CHOICES)
+        self.assertEqual(page.link_count, 1)
+        self.assertEqual(page.canonical_url, 'https://example.com/post')
+        self.assertEqual(page.meta_description, 'A short post')
+        self.assertEqual(page.meta_robots, 'noindex, follow')
+        self.assertEqual(
+            sorted(page.resources.values_list('kind', 'target__url')),
+            [
+                (Extractor.ALTERNATES, 'https://example.com/es/post'),
+                (Extractor.IMAGES, 'https://example.com/logo.png'),
+                (Extractor.SCRIPTS, 'https://example.com/app.js'),
+                (Extractor.STYLESHEETS, 'https://example.com/site.css'),
+            ])
+
+    def test_default_scrape_stores_links_only(self):
+        """Test pages use the links extractor unless asked otherwise"""
+        page = self.scrape(Extractor.DEFAULT)
+        self.assertEqual(page.link_count, 1)
+        self.assertEqual(page.canonical_url, '')
+        self.assertFalse(PageResource.objects.exists())
+
+    def test_rescrape_replaces_resources(self):
+        """Test a re-scrape does not duplicate stored resources"""
+        page = self.scrape([Extractor.IMAGES])
+        with responses.RequestsMock() as mock:
+            mock.add(responses.GET, 'https://example.com/blog/', body=HTML,
+                     content_type='text/html')
+            scrape_page_links(page)
+        self.assertEqual(page.resources.count(), 1)
+
+    def test_form_defaults_to_links(self):
+        """Test the add URL form falls back to the links extractor"""
+        form = AddUrlForm(data={'url': 'https://example.com'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['extractors'], Extractor.DEFAULT)
+
+        form = AddUrlForm(data={'url': 'https://example.com',
+                                'extractors': [Extractor.IMAGES, Extractor.META]})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.save(commit=False).extractors,
+                         [Extractor.IMAGES, Extractor.META])
+
+    def test_detail_shows_resources(self):
+        """Test the page detail view lists resources and metadata"""
+        page = self.scrape(Extractor.CHOICES)
+        response = self.client.get(reverse('scraper:page_detail', kwargs={'pk': page.pk}))
+        self.assertContains(response, 'Resources (4)')
+        self.assertContains(response, 'https://example.com/site.css')
+        self.assertContains(response, 'noindex, follow')
@@ -0,0 +1,179 @@
+import threading
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+import responses
+from kombu.exceptions import OperationalError
+from ..models import ScrapedPage
+from ..fallback import FallbackExecutor, scrape_in_process
+from ..tasks import reconcile_pending_enqueues
+from ..constants import ScrapingStatus, Messages
+from .test_common import TEST_HTML_WITH_LINKS
+
+
+class InlineExecutor:
+    """Runs fallback work in the calling thread, inside the test transaction"""
+
+    def __init__(self, saturated=False):
+        self.saturated = saturated
+
+    def submit(self, fn, *args):
+        if self.saturated:
+            return False
+        fn(*args)
+        return True
+
+
+class FallbackExecutorTest(TestCase):
+    """Test the bounded fallback pool"""
+
+    def test_refuses_when_saturated(self):
+        """Test submissions beyond the workers and queue are refused without blocking"""
+        executor = FallbackExecutor(workers=1, queue_size=1)
+        started, release = threading.Event(), threading.Event()
+
+        def blocked():
+            started.set()
+            release.wait(5)
+
+        self.assertTrue(executor.submit(blocked))
+        started.wait(5)
+        self.assertTrue(executor.submit(blocked))
+        self.assertFalse(executor.submit(blocked))
+
+        release.set()
+        executor.executor.shutdown(wait=True)
+        self.assertTrue(executor.slots.acquire(blocking=False))
+
+
+@patch('scraper.views.queue_scraping_task', side_effect=Exception('no broker'))
+class BrokerOutageTest(TestCase):
+    """Test adding pages while the broker is down"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+
+    @responses.activate
+    def test_scraped_on_fallback_pool(self, mock_queue):
+        """Test the page is handed to the fallback pool and its marker cleared"""
+        responses.add(responses.GET, 'https://example.com/', body=TEST_HTML_WITH_LINKS)
+        with patch('scraper.fallback.get_fallback_executor', return_value=InlineExecutor()):
+            response = self.client.post(reverse('scraper:page_list'),
+                                        {'url': 'https://example.com/'}, follow=True)
+
+        page = ScrapedPage.objects.get(url='https://example.com/')
+        self.assertContains(response, Messages.QUEUE_UNAVAILABLE)
+        self.assertEqual(page.status, ScrapingStatus.COMPLETED)
+        self.assertIsNone(page.needs_enqueue_at)
+
+    def test_rejected_when_saturated(self, mock_queue):
+        """Test a full pool refuses the scrape and leaves the page marked for the queue"""
+        with patch('scraper.fallback.get_fallback_executor',
+                   return_value=InlineExecutor(saturated=True)):
+            response = self.client.post(reverse('scraper:page_list'),
+                                        {'url': 'https://example.com/'}, follow=True)
+
+        page = ScrapedPage.objects.get(url='https://example.com/')
+        self.assertContains(response, Messages.SCRAPER_BUSY)
+        self.assertEqual(page.status, ScrapingStatus.PENDING)
+        self.assertIsNotNone(page.needs_enqueue_at)
+
+
+class InteractivePublishTest(TestCase):
+    """Test publishing pages added by hand while the broker is down"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+
+    @responses.activate
+    @patch('scraper.tasks.scrape_page_task.apply_async',
+           side_effect=OperationalError('Error 111 connecting to localhost:6379'))
+    def test_falls_back_without_retrying(self, mock_apply_async):
+        """Test a failed publish is not retried before the page falls back"""
+        responses.add(responses.GET, 'https://example.com/', body=TEST_HTML_WITH_LINKS)
+        with patch('scraper.fallback.get_fallback_executor', return_value=InlineExecutor()):
+            response = self.client.post(reverse('scraper:page_list'),
+                                        {'url': 'https://example.com/'}, follow=True)
+
+        mock_apply_async.assert_called_once()
+        self.assertIs(mock_apply_async.call_args.kwargs['retry'], False)
+        self.assertContains(response, Messages.QUEUE_UNAVAILABLE)
+        page = ScrapedPage.objects.get(url='https://example.com/')
+        self.assertEqual(page.status, ScrapingStatus.COMPLETED)
+
+
+@override_settings(SCRAPE_FALLBACK_GRACE=300)
+class ReconcilerTest(TestCase):
+    """Test publishing pages that could not be queued"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        now = timezone.now()
+        self.old = [
+            ScrapedPage.objects.create(user=self.user, url=f'https://example.com/{i}',
+                                       needs_enqueue_at=now - timedelta(seconds=600 - i))
+            for i in range(3)
+        ]
+        self.recent = ScrapedPage.objects.create(
+            user=self.user, url='https://example.com/recent', needs_enqueue_at=now)
+
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_publishes_pages_past_grace(self, mock_delay):
+        """Test marked pages past the grace period are published and unmarked"""
+        self.assertEqual(reconcile_pending_enqueues(), 3)
+        self.assertEqual([call.kwargs['args'][0] for call in mock_delay.call_args_list],
+                         [page.pk for page in self.old])
+        self.assertEqual(
+            list(ScrapedPage.objects.filter(needs_enqueue_at__isnull=False)), [self.recent])
+
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_stops_while_broker_down(self, mock_delay):
+        """Test pages stay marked when publishing fails"""
+        mock_delay.side_effect = [MagicMock(id='task-1'), Exception('no broker')]
+        self.assertEqual(reconcile_pending_enqueues(), 1)
+        self.assertEqual(mock_delay.call_count, 2)
+        self.assertEqual(ScrapedPage.objects.filter(needs_enqueue_at__isnull=False).count(), 3)
+
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_skips_started_fallback_scrape(self, mock_delay):
+        """Test a page the pool started after the grace period is not published too"""
+        page = self.old[0]
+
+        def scrape(scraped_page):
+            self.assertEqual(reconcile_pending_enqueues(), 2)
+            # Marked again by another request while this scrape runs
+            ScrapedPage.objects.filter(pk=page.pk).update(needs_enqueue_at=timezone.now())
+
+        with patch('scraper.utils.scrape_page_links', side_effect=scrape) as mock_scrape:
+            scrape_in_process(page.pk, page.needs_enqueue_at)
+        mock_scrape.assert_called_once()
+        self.assertNotIn(page.pk, [call.kwargs['args'][0] for call in mock_delay.call_args_list])
+        page.refresh_from_db()
+        self.assertIsNotNone(page.needs_enqueue_at)
+
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_fallback_skips_published_page(self, mock_delay):
+        """Test the pool does not scrape a page the reconciler already published"""
+        reconcile_pending_enqueues()
+        with patch('scraper.utils.scrape_page_links') as mock_scrape:
+            scrape_in_process(self.old[0].pk, self.old[0].needs_enqueue_at)
+        mock_scrape.assert_not_called()
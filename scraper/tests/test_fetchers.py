@@ -0,0 +1,140 @@
+import gzip
+import zlib
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+import brotli
+import httpx
+import requests
+import responses
+import zstandard
+from ..models import ScrapedPage
+from ..fetchers import (
+    ACCEPT_ENCODING, RequestsFetcher, HttpxFetcher, decode_content, new_httpx_client,
+)
+from ..latency import Timeouts
+from ..retries import classify_failure
+from ..utils import scrape_page_links, get_fetcher, http_session
+from ..constants import FailureClass
+from .test_common import TEST_HTML_WITH_LINKS
+
+HTML = TEST_HTML_WITH_LINKS.encode()
+TIMEOUTS = Timeouts(5, 30)
+
+
+def mock_client(handler):
+    return new_httpx_client(transport=httpx.MockTransport(handler))
+
+
+class BodyStream(httpx.SyncByteStream):
+    """A response body that is streamed, as from a real connection"""
+
+    def __init__(self, body):
+        self.body = body
+
+    def __iter__(self):
+        yield self.body
+
+
+def respond(status_code, body=b'', headers=None):
+    return httpx.Response(status_code, headers=headers, stream=BodyStream(body))
+
+
+class FetchBackendTest(TestCase):
+    """Test the requests and httpx fetch backends"""
+
+    def test_accept_encoding(self):
+        """Test every coding with an installed decoder is advertised, best first"""
+        self.assertEqual(ACCEPT_ENCODING, 'zstd, br, gzip, deflate')
+
+    def test_decode_content(self):
+        """Test each content coding, stacked codings and unknown codings"""
+        self.assertEqual(decode_content(gzip.compress(HTML), 'gzip'), HTML)
+        self.assertEqual(decode_content(zlib.compress(HTML), 'deflate'), HTML)
+        raw_deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        self.assertEqual(decode_content(raw_deflate.compress(HTML) + raw_deflate.flush(),
+                                        'deflate'), HTML)
+        self.assertEqual(decode_content(brotli.compress(HTML), 'br'), HTML)
+        streamed = zstandard.ZstdCompressor(write_content_size=False).compress(HTML)
+        self.assertEqual(decode_content(streamed, 'zstd'), HTML)
+        self.assertEqual(decode_content(brotli.compress(gzip.compress(HTML)), 'gzip, br'), HTML)
+        self.assertEqual(decode_content(HTML, 'identity'), HTML)
+
+        with self.assertRaises(requests.exceptions.ContentDecodingError):
+            decode_content(HTML, 'compress')
+        with self.assertRaises(requests.exceptions.ContentDecodingError):
+            decode_content(HTML, 'gzip')
+
+    @responses.activate
+    def test_requests_backend(self):
+        """Test the requests backend negotiates compression and measures the wire size"""
+        body = gzip.compress(HTML)
+        responses.add(responses.GET, 'https://example.com/', body=body,
+                      headers={'Content-Encoding': 'gzip'})
+        result = RequestsFetcher(http_session()).fetch('https://example.com/', TIMEOUTS)
+
+        self.assertEqual(responses.calls[0].request.headers['Accept-Encoding'], ACCEPT_ENCODING)
+        self.assertEqual(result.content, HTML)
+        self.assertEqual(result.stats()['wire_bytes'], len(body))
+        self.assertEqual(result.stats()['content_bytes'], len(HTML))
+        self.assertEqual(result.stats()['backend'], 'requests')
+
+    def test_httpx_backend(self):
+        """Test the httpx backend negotiates compression and measures the wire size"""
+        body = brotli.compress(HTML)
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            return respond(200, body, {'Content-Encoding': 'br'})
+
+        result = HttpxFetcher(mock_client(handler)).fetch('https://example.com/', TIMEOUTS)
+        self.assertEqual(requests_seen[0].headers['Accept-Encoding'], ACCEPT_ENCODING)
+        self.assertEqual(result.content, HTML)
+        self.assertEqual(result.stats()['wire_bytes'], len(body))
+        self.assertEqual(result.stats()['content_encoding'], 'br')
+        self.assertEqual(result.stats()['backend'], 'httpx')
+
+    def test_httpx_errors_raised_as_requests_errors(self):
+        """Test httpx failures classify exactly like requests failures"""
+        def raising(error):
+            def handler(request):
+                raise error
+            return HttpxFetcher(mock_client(handler))
+
+        with self.assertRaises(requests.exceptions.ConnectTimeout):
+            raising(httpx.ConnectTimeout('timed out')).fetch('https://example.com/', TIMEOUTS)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            raising(httpx.ConnectError('refused')).fetch('https://example.com/', TIMEOUTS)
+
+        result = HttpxFetcher(mock_client(lambda request: respond(
+            503, headers={'Retry-After': '120'}))).fetch('https://example.com/', TIMEOUTS)
+        with self.assertRaises(requests.HTTPError) as raised:
+            result.raise_for_status()
+        self.assertEqual(classify_failure(raised.exception), (FailureClass.TRANSIENT, 120))
+
+    @override_settings(SCRAPER_FETCH_BACKEND='httpx')
+    def test_scrape_with_httpx_backend(self):
+        """Test scrape_page_links uses the configured backend and stores its stats"""
+        user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        page = ScrapedPage.objects.create(user=user, url='https://example.com/')
+        client = mock_client(lambda request: respond(
+            200, gzip.compress(HTML), {'Content-Encoding': 'gzip'}))
+
+        with patch('scraper.utils.httpx_client', return_value=client):
+            self.assertEqual(scrape_page_links(page), 3)
+        page.refresh_from_db()
+        self.assertEqual(page.title, 'Test Page')
+        self.assertEqual(page.fetch_stats['backend'], 'httpx')
+        self.assertEqual(page.fetch_stats['content_bytes'], len(HTML))
+
+    @override_settings(SCRAPER_FETCH_BACKEND='curl')
+    def test_unknown_backend(self):
+        """Test an unknown SCRAPER_FETCH_BACKEND is reported as misconfiguration"""
+        with self.assertRaises(ImproperlyConfigured):
+            get_fetcher()
@@ -0,0 +1,93 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.urls import reverse
+import responses
+from ..models import ScrapedPage
+from ..fragments import FRAGMENT_CACHE
+from ..utils import scrape_page_links
+from ..constants import ScrapingStatus
+
+
+class FragmentCacheTest(TestCase):
+    """Test cached page fragments and their invalidation by re-scrapes"""
+
+    def setUp(self):
+        caches[FRAGMENT_CACHE].clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.page = ScrapedPage.objects.create(user=self.user, url='https://example.com')
+        self.client.login(username='test@example.com', password='testpass123')
+
+    def scrape(self, *names):
+        html = ''.join(f'<a href="/{name}">{name}</a>' for name in names)
+        with responses.RequestsMock() as mock:
+            mock.add(responses.GET, 'https://example.com', body=html,
+                     content_type='text/html')
+            scrape_page_links(self.page)
+
+    def get_detail(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('scraper:page_detail', kwargs={'pk': self.page.pk}))
+        link_queries = [q['sql'] for q in queries if 'scraper_pagelink' in q['sql']]
+        return response, link_queries
+
+    def test_repeat_views_skip_link_queries(self):
+        """Test a completed page's links are rendered once, then cached"""
+        self.scrape('alpha', 'bravo')
+
+        response, link_queries = self.get_detail()
+        self.assertContains(response, 'https://example.com/alpha')
+        self.assertTrue(link_queries)
+
+        response, link_queries = self.get_detail()
+        self.assertContains(response, 'https://example.com/alpha')
+        self.assertEqual(response.context['total_links'], 2)
+        self.assertEqual(link_queries, [])
+
+    def test_rescrape_invalidates_cached_links(self):
+        """Test users never see the previous link set after a re-scrape"""
+        self.scrape('alpha')
+        self.get_detail()
+
+        self.scrape('charlie')
+        response, _ = self.get_detail()
+        self.assertContains(response, 'https://example.com/charlie')
+        self.assertNotContains(response, 'https://example.com/alpha')
+
+    def test_unfinished_pages_not_cached(self):
+        """Test pages still being scraped are always rendered fresh"""
+        self.page.status = ScrapingStatus.PROCESSING
+        self.page.save()
+
+        _, link_queries = self.get_detail()
+        _, link_queries = self.get_detail()
+        self.assertTrue(link_queries)
+
+    def test_stale_instance_does_not_roll_back_version(self):
+        """Test saving an instance loaded before a scrape keeps the new version"""
+        stale = ScrapedPage.objects.get(pk=self.page.pk)
+        self.scrape('alpha')
+
+        stale.title = 'Renamed'
+        stale.save()
+        stale.refresh_from_db()
+        self.assertEqual(stale.scrape_version, 1)
+        self.assertEqual(stale.title, 'Renamed')
+
+    def test_page_list_rows_follow_scrape_version(self):
+        """Test cached page list rows show the link count of the latest scrape"""
+        self.scrape('alpha')
+        response = self.client.get(reverse('scraper:page_list'))
+        self.assertContains(response, '<span class=" text-primary">1</span>')
+
+        self.scrape('alpha', 'bravo', 'charlie')
+        response = self.client.get(reverse('scraper:page_list'))
+        self.assertContains(response, '<span class=" text-primary">3</span>')
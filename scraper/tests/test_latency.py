@@ -0,0 +1,127 @@
+import math
+import random
+from unittest.mock import patch
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+import redis
+import requests
+import responses
+from ..models import ScrapedPage
+from ..latency import (
+    Timeouts, update_sketch, record_latency, get_host_latency, fetch_timeouts,
+    get_tail_latencies,
+)
+from ..utils import scrape_page_links
+from .test_common import FakeRedis
+
+
+@override_settings(SCRAPING_TIMEOUT=30, SCRAPING_TIMEOUT_MIN=2, SCRAPING_TIMEOUT_MAX=60,
+                   SCRAPING_CONNECT_TIMEOUT_MAX=10)
+class AdaptiveTimeoutTest(TestCase):
+    """Test per-host latency sketches and the fetch timeouts derived from them"""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        for target in ('scraper.latency.redis_client', 'scraper.breakers.redis_client'):
+            patcher = patch(target, return_value=self.redis)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+
+    def record(self, host, seconds, times=50):
+        for _ in range(times):
+            record_latency(host, seconds)
+
+    def test_sketch_tracks_percentiles(self):
+        """Test the sketch estimates p50 and p99 of log-normal latencies"""
+        rng = random.Random(42)
+        sketch = (0, 0.0, 0.0)
+        for _ in range(5000):
+            sketch = update_sketch(sketch, rng.lognormvariate(math.log(0.2), 0.5))
+        samples, mean, variance = sketch
+        self.assertEqual(samples, 5000)
+        self.assertAlmostEqual(math.exp(mean), 0.2, delta=0.05)
+        self.assertAlmostEqual(math.exp(mean + 2.326 * math.sqrt(variance)),
+                               0.2 * math.exp(2.326 * 0.5), delta=0.4)
+
+    def test_sketch_follows_host_changes(self):
+        """Test recent samples outweigh old ones"""
+        self.record('example.com', 0.1, times=200)
+        self.record('example.com', 2.0, times=100)
+        self.assertAlmostEqual(get_host_latency('example.com').p50, 2.0, delta=0.1)
+
+    def test_default_until_enough_samples(self):
+        """Test hosts with few samples use the configured timeout"""
+        self.assertEqual(fetch_timeouts('new.example.com'), Timeouts(10, 30))
+        self.record('new.example.com', 0.1, times=4)
+        self.assertEqual(fetch_timeouts('new.example.com'), Timeouts(10, 30))
+        self.record('new.example.com', 0.1, times=1)
+        self.assertEqual(fetch_timeouts('new.example.com'), Timeouts(2, 2))
+
+    def test_timeouts_clamped(self):
+        """Test fast and slow hosts stay within the configured bounds"""
+        self.record('slow.example.com', 40)
+        self.assertEqual(fetch_timeouts('slow.example.com'), Timeouts(10, 60))
+
+        self.record('mid.example.com', 1.5)
+        connect, read = fetch_timeouts('mid.example.com')
+        self.assertAlmostEqual(connect, 4.5)
+        self.assertAlmostEqual(read, 4.5)
+
+    def test_redis_down_uses_default(self):
+        """Test fetches keep the default timeout when Redis is unreachable"""
+        broken = redis.Redis(port=1)
+        record_latency('example.com', 1.0, client=broken)
+        self.assertEqual(fetch_timeouts('example.com', client=broken), Timeouts(10, 30))
+
+    def test_scrape_records_latency(self):
+        """Test scrape_page_links passes the host's timeouts and records the fetch"""
+        page = ScrapedPage.objects.create(user=self.user, url='https://example.com/')
+        self.record('example.com', 0.5)
+        with responses.RequestsMock() as mock:
+            mock.add(responses.GET, 'https://example.com/', body='<html></html>')
+            scrape_page_links(page)
+            self.assertEqual(mock.calls[0].request.req_kwargs['timeout'], Timeouts(2, 2))
+        self.assertEqual(get_host_latency('example.com').samples, 51)
+
+    def test_timeout_raises_deadline(self):
+        """Test a timed-out fetch counts as taking its whole deadline"""
+        page = ScrapedPage.objects.create(user=self.user, url='https://example.com/')
+        self.record('example.com', 0.5)
+        with responses.RequestsMock() as mock:
+            mock.add(responses.GET, 'https://example.com/', body=requests.ReadTimeout())
+            for _ in range(20):
+                scrape_page_links(page)
+        self.assertGreater(fetch_timeouts('example.com').read, 2)
+
+    def test_queue_status_shows_slowest_hosts(self):
+        """Test the queue status page lists hosts by p99 with their deadlines"""
+        self.record('fast.example.com', 0.1)
+        self.record('slow.example.com', 5)
+        rows = get_tail_latencies()
+        self.assertEqual([row['host'] for row in rows], ['slow.example.com', 'fast.example.com'])
+        self.assertAlmostEqual(rows[0]['read_timeout'], 15)
+
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('scraper:queue_status'))
+        self.assertContains(response, 'Slowest Hosts')
+        self.assertContains(response, 'slow.example.com')
+
+    def test_slowest_hosts_read_from_ranking(self):
+        """Test the slowest hosts come from the p99 ranking, dropping expired sketches"""
+        for i in range(5):
+            self.record(f'host{i}.example.com', 0.1 * (i + 1))
+        self.redis.delete('latency:host4.example.com')
+        with patch.object(self.redis, 'scan_iter') as scan:
+            rows = get_tail_latencies(limit=2)
+        scan.assert_not_called()
+        self.assertEqual([row['host'] for row in rows],
+                         ['host3.example.com', 'host2.example.com'])
+        self.assertEqual(self.redis.zcard('latency_p99'), 4)
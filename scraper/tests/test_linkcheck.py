@@ -0,0 +1,184 @@
+import asyncio
+from collections import Counter
+from datetime import timedelta
+from unittest.mock import patch
+import httpx
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.db.models import Q
+from django.utils import timezone
+from ..models import ScrapedPage, LinkCheck, Url
+from ..linkstore import store_page_links
+from ..linkcheck import check_page_links, check_user_links, claim_due_urls
+from ..constants import ScrapingStatus, Messages
+
+LINKS = {
+    'https://ok.example.com/': 'Fine',
+    'https://gone.example.com/': 'Gone',
+    'https://nohead.example.com/': 'No HEAD',
+    'https://moved.example.com/': 'Moved',
+    'https://down.example.com/': 'Down',
+}
+
+
+def handler(request):
+    host = request.url.host
+    if host == 'gone.example.com':
+        return httpx.Response(404)
+    if host == 'nohead.example.com':
+        return httpx.Response(405 if request.method == 'HEAD' else 200)
+    if host == 'moved.example.com':
+        return httpx.Response(301, headers={'Location': 'https://ok.example.com/'})
+    if host == 'down.example.com':
+        raise httpx.ConnectError('Connection refused', request=request)
+    return httpx.Response(200)
+
+
+class LinkCheckTest(TestCase):
+    """Test concurrent link health checks and the broken links filter"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.page = self.create_page(self.user, 'https://example.com', LINKS)
+        self.client.login(username='test@example.com', password='testpass123')
+
+        self.requests = Counter()
+
+        def counting_handler(request):
+            self.requests[request.method, str(request.url)] += 1
+            return handler(request)
+        self.transport = httpx.MockTransport(counting_handler)
+
+    def create_page(self, user, url, links):
+        page = ScrapedPage.objects.create(user=user, url=url, status=ScrapingStatus.COMPLETED)
+        store_page_links(page, links)
+        page.save()
+        return page
+
+    def check(self, url):
+        return LinkCheck.objects.get(url__url=url)
+
+    def test_check_results_stored(self):
+        """Test status, final URL, latency and errors are stored per URL"""
+        self.assertEqual(check_page_links(self.page, self.transport), len(LINKS))
+
+        ok = self.check('https://ok.example.com/')
+        self.assertEqual((ok.status_code, ok.is_broken), (200, False))
+        self.assertIsNotNone(ok.latency_ms)
+
+        gone = self.check('https://gone.example.com/')
+        self.assertEqual((gone.status_code, gone.is_broken), (404, True))
+
+        moved = self.check('https://moved.example.com/')
+        self.assertEqual(moved.status_code, 200)
+        self.assertEqual(moved.final_url, 'https://ok.example.com/')
+
+        down = self.check('https://down.example.com/')
+        self.assertIsNone(down.status_code)
+        self.assertTrue(down.is_broken)
+        self.assertIn('ConnectError', down.error)
+
+    def test_head_falls_back_to_get(self):
+        """Test servers rejecting HEAD are checked with GET"""
+        check_page_links(self.page, self.transport)
+        self.assertEqual(self.check('https://nohead.example.com/').status_code, 200)
+        self.assertEqual(self.requests['GET', 'https://nohead.example.com/'], 1)
+
+    def test_each_url_checked_once_within_ttl(self):
+        """Test a URL linked from several pages and users is fetched once"""
+        other = User.objects.create_user(
+            username='other@example.com', email='other@example.com',
+            password='testpass123')
+        self.create_page(other, 'https://example.org', LINKS)
+
+        check_user_links(self.user, self.transport)
+        self.assertEqual(check_user_links(other, self.transport), 0)
+        self.assertEqual(self.requests['HEAD', 'https://gone.example.com/'], 1)
+
+        LinkCheck.objects.update(checked_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(check_user_links(other, self.transport), len(LINKS))
+
+    def test_claim_is_a_lease(self):
+        """Test a claimed URL is not checked again until its lease runs out"""
+        url_ids = list(Url.objects.values_list('id', flat=True))
+        self.assertCountEqual(claim_due_urls(url_ids), url_ids)
+        self.assertEqual(claim_due_urls(url_ids), [])
+        self.assertFalse(LinkCheck.objects.filter(checked_at__isnull=False).exists())
+
+        # The checker died without storing results
+        LinkCheck.objects.update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(check_page_links(self.page, self.transport), len(LINKS))
+        self.assertFalse(LinkCheck.objects.filter(
+            Q(checked_at__isnull=True) | Q(claimed_until__isnull=False)).exists())
+
+    def test_failed_check_releases_claim(self):
+        """Test URLs are left unchecked and unclaimed when fetching fails"""
+        with patch('scraper.linkcheck.check_urls', side_effect=RuntimeError('loop died')):
+            with self.assertRaises(RuntimeError):
+                check_page_links(self.page, self.transport)
+        self.assertFalse(LinkCheck.objects.filter(
+            Q(checked_at__isnull=False) | Q(claimed_until__isnull=False)).exists())
+        self.assertEqual(check_page_links(self.page, self.transport), len(LINKS))
+
+    @override_settings(LINK_CHECK_PER_HOST=2)
+    def test_per_host_limit(self):
+        """Test no more than LINK_CHECK_PER_HOST requests hit one host at once"""
+        links = {f'https://busy.example.com/{i}': str(i) for i in range(10)}
+        page = self.create_page(self.user, 'https://example.net', links)
+        in_flight = Counter()
+        peak = Counter()
+
+        async def slow_handler(request):
+            host = request.url.host
+            in_flight[host] += 1
+            peak[host] = max(peak[host], in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+            return httpx.Response(200)
+
+        check_page_links(page, httpx.MockTransport(slow_handler))
+        self.assertEqual(peak['busy.example.com'], 2)
+
+    def test_broken_links_filter(self):
+        """Test the page detail view can list only broken links"""
+        check_page_links(self.page, self.transport)
+        response = self.client.get(
+            reverse('scraper:page_detail', kwargs={'pk': self.page.pk}), {'broken': '1'})
+        self.assertEqual(response.context['total_links'], 2)
+        self.assertContains(response, 'https://gone.example.com/')
+        self.assertContains(response, '404')
+        self.assertNotContains(response, 'https://ok.example.com/" target')
+
+    @override_settings(COMPACT_LINK_THRESHOLD=3)
+    def test_broken_links_filter_compact_page(self):
+        """Test the broken filter also works for compact link storage"""
+        page = self.create_page(self.user, 'https://example.net', LINKS)
+        check_page_links(page, self.transport)
+        response = self.client.get(
+            reverse('scraper:page_detail', kwargs={'pk': page.pk}), {'broken': '1'})
+        self.assertEqual(response.context['total_links'], 2)
+        self.assertContains(response, 'ConnectError')
+
+    @patch('scraper.views.check_links_task.delay')
+    def test_check_view_queues_task(self, mock_delay):
+        """Test the check links button queues a background check"""
+        response = self.client.post(
+            reverse('scraper:check_page_links', kwargs={'pk': self.page.pk}))
+        mock_delay.assert_called_once_with(page_id=self.page.pk)
+        self.assertRedirects(
+            response,
+            reverse('scraper:page_detail', kwargs={'pk': self.page.pk}) + '?broken=1')
+
+    @patch('scraper.linkcheck.check_urls')
+    @patch('scraper.views.check_links_task.delay', side_effect=Exception('no broker'))
+    def test_check_view_without_celery(self, mock_delay, mock_check):
+        """Test links are not checked in the request when the queue is unavailable"""
+        response = self.client.post(reverse('scraper:check_user_links'), follow=True)
+        mock_check.assert_not_called()
+        self.assertContains(response, Messages.QUEUE_LINK_CHECK_FAILED.format('no broker'))
@@ -0,0 +1,162 @@
+import json
+import zlib
+from unittest.mock import patch
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from ..models import ScrapedPage, PageLink, CompactLinkSet, CompactLinkChunk
+from ..linkstore import (
+    encode_links, decode_links, store_page_links, get_page_links, CompactLinkList,
+)
+from ..exports import page_link_rows
+from ..constants import LinkStorage
+
+LINKS = {
+    'https://example.com/c': 'Charlie',
+    'https://example.com/a': 'Alpha',
+    'https://example.com/b': 'Bravo',
+}
+
+
+class LinkEncodingTest(TestCase):
+    """Test the compact link blob format"""
+
+    def test_round_trip_sorted_by_name(self):
+        """Test links decode sorted by name"""
+        links = decode_links(encode_links(LINKS))
+        self.assertEqual([link.name for link in links],
+                         ['Alpha', 'Bravo', 'Charlie'])
+        self.assertEqual(links[0].url, 'https://example.com/a')
+
+
+@override_settings(COMPACT_LINK_THRESHOLD=3)
+class CompactLinkStorageTest(TestCase):
+    """Test pages above the threshold use compact storage transparently"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.page = ScrapedPage.objects.create(
+            user=self.user, url='https://example.com', status='completed')
+        self.client.login(username='test@example.com', password='testpass123')
+
+    def test_store_switches_storage_mode(self):
+        """Test the threshold picks compact or row storage"""
+        store_page_links(self.page, LINKS)
+        self.assertEqual(self.page.link_storage, LinkStorage.COMPACT)
+        self.assertEqual(PageLink.objects.filter(page=self.page).count(), 0)
+        self.assertEqual(self.page.link_count, 3)
+
+        store_page_links(self.page, {'https://example.com/a': 'Alpha'})
+        self.assertEqual(self.page.link_storage, LinkStorage.ROWS)
+        self.assertFalse(CompactLinkSet.objects.filter(page=self.page).exists())
+        self.assertEqual(self.page.link_count, 1)
+
+    def test_get_page_links_search(self):
+        """Test searching a compact link set"""
+        store_page_links(self.page, LINKS)
+        links = get_page_links(self.page, 'bra')
+        self.assertEqual(links.count(), 1)
+        self.assertEqual(links[0].url, 'https://example.com/b')
+
+    def test_page_detail_view(self):
+        """Test the detail view renders compact links"""
+        store_page_links(self.page, LINKS)
+        self.page.save()
+
+        response = self.client.get(
+            reverse('scraper:page_detail', kwargs={'pk': self.page.pk}))
+        self.assertContains(response, 'https://example.com/b')
+        self.assertEqual(response.context['total_links'], 3)
+
+    def test_export_and_api(self):
+        """Test exports and the links API read compact link sets"""
+        store_page_links(self.page, LINKS)
+        self.page.save()
+
+        response = self.client.get(
+            reverse('scraper:export_page_links', kwargs={'pk': self.page.pk}))
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[1], 'https://example.com/a,Alpha')
+
+        response = self.client.get(reverse('scraper:export_user_links'))
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('https://example.com,https://example.com/c,Charlie', content)
+
+        url = reverse('scraper:page_links_api', kwargs={'pk': self.page.pk})
+        data = json.loads(self.client.get(url, {'limit': 2}).content)
+        self.assertEqual([link['name'] for link in data['results']],
+                         ['Alpha', 'Bravo'])
+        data = json.loads(
+            self.client.get(url, {'cursor': data['next_cursor']}).content)
+        self.assertEqual(data['results'],
+                         [{'id': 3, 'url': 'https://example.com/c', 'name': 'Charlie'}])
+        self.assertIsNone(data['next_cursor'])
+
+    @patch('scraper.linkstore.COMPACT_CHUNK_SIZE', 2)
+    def test_chunks_decoded_on_demand(self):
+        """Test slices only decode the chunks they overlap and iteration streams them"""
+        links = {f'https://example.com/{i}': f'Link {i}' for i in range(7)}
+        store_page_links(self.page, links)
+        self.assertEqual(CompactLinkChunk.objects.filter(page=self.page).count(), 4)
+
+        with patch('scraper.linkstore.decode_links', wraps=decode_links) as decode:
+            page_links = get_page_links(self.page)
+            self.assertEqual(page_links.count(), 7)
+            self.assertEqual([link.name for link in page_links[3:5]], ['Link 3', 'Link 4'])
+            self.assertEqual(page_links[-1].name, 'Link 6')
+            self.assertEqual(decode.call_count, 3)
+
+            rows = page_link_rows(self.page)
+            self.assertEqual(next(rows), ('https://example.com/0', 'Link 0'))
+            self.assertEqual(decode.call_count, 4)
+            self.assertEqual(len(list(rows)), 6)
+
+        self.assertEqual([link.name for link in get_page_links(self.page, 'link 5')],
+                         ['Link 5'])
+        self.assertEqual(get_page_links(self.page, 'link')[6:], [page_links[6]])
+        with self.assertRaises(IndexError):
+            page_links[7]
+
+
+class CompactLinkMigrationTest(TransactionTestCase):
+    """Test single blob link sets are split into chunks on migrate"""
+
+    migrate_from = [('scraper', '0018_linkcheck_claimed_until')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.addCleanup(self.migrate)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_link_sets_split(self):
+        """Test the links of an existing compact page read back in order"""
+        OldUser = self.apps.get_model('auth', 'User')
+        OldPage = self.apps.get_model('scraper', 'ScrapedPage')
+        OldLinkSet = self.apps.get_model('scraper', 'CompactLinkSet')
+        user = OldUser.objects.create(username='test@example.com', email='test@example.com')
+        page = OldPage.objects.create(user=user, url='https://example.com/', url_hash='a',
+                                      link_storage=LinkStorage.COMPACT)
+        urls = [f'https://example.com/{i:05}' for i in range(5001)]
+        names = [f'Link {i:05}' for i in range(5001)]
+        OldLinkSet.objects.create(page=page, link_count=len(urls), data=zlib.compress(
+            json.dumps([urls, names]).encode('utf-8')))
+
+        self.migrate()
+        page = ScrapedPage.objects.get(pk=page.pk)
+        self.assertEqual(list(CompactLinkChunk.objects.filter(page=page).order_by(
+            'start').values_list('start', 'link_count')), [(0, 5000), (5000, 1)])
+        links = CompactLinkList(page)
+        self.assertEqual(links.count(), 5001)
+        self.assertEqual([link.url for link in links[4999:]], urls[4999:])
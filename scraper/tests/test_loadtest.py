@@ -0,0 +1,74 @@
+from io import StringIO
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from ..models import ScrapedPage, PageLink
+from ..middleware import QUERY_COUNT_HEADER
+from ..management.commands.loadtest_views import Command, parse_scale
+
+
+class LoadTestTest(TestCase):
+    """Test the load test kit: query counting, seeding and baselines"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        ScrapedPage.objects.create(user=self.user, url='https://example.com/')
+
+    @override_settings(REPORT_QUERY_COUNT=True)
+    def test_query_count_header(self):
+        """Test responses report their queries when enabled"""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('scraper:page_list'))
+        self.assertGreater(int(response[QUERY_COUNT_HEADER]), 0)
+
+    def test_query_count_header_off(self):
+        """Test no header is added by default"""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('scraper:page_list'))
+        self.assertNotIn(QUERY_COUNT_HEADER, response)
+
+    def test_seed_user(self):
+        """Test a scale seeds one user's pages and links, and is reused when complete"""
+        self.assertEqual(parse_scale('3x4'), (3, 4))
+        with self.assertRaises(CommandError):
+            parse_scale('3 pages')
+
+        command = Command(stdout=StringIO())
+        user = command.seed_user(3, 4, skip_seed=False)
+        self.assertEqual(ScrapedPage.objects.filter(user=user).count(), 3)
+        self.assertEqual(PageLink.objects.filter(page__user=user).count(), 12)
+        self.assertEqual(command.seed_user(3, 4, skip_seed=False), user)
+
+    def test_baseline_regressions(self):
+        """Test slower views and extra queries fail against a baseline"""
+        row = {'rps': 100, 'p50_ms': 10, 'p95_ms': 20, 'p99_ms': 30, 'queries': 4.0, 'errors': 0}
+        baseline = {'database': 'sqlite', 'scales': {'1x1': {'page_status_api': row}}}
+        command = Command(stdout=StringIO())
+
+        command.compare({'database': 'sqlite', 'scales': {'1x1': {
+            'page_status_api': dict(row, rps=90, queries=4.5)}}}, baseline, 0.25)
+        for change in ({'rps': 70}, {'p95_ms': 30}, {'queries': 5.0}):
+            with self.assertRaises(CommandError):
+                command.compare({'database': 'sqlite', 'scales': {'1x1': {
+                    'page_status_api': dict(row, **change)}}}, baseline, 0.25)
+
+
+class QueryBenchmarkTest(TestCase):
+    """Test the query benchmark seeds a corpus and reports every query"""
+
+    def test_benchmark_queries_smoke(self):
+        """Test a tiny corpus seeds against the current schema and is benchmarked"""
+        out = StringIO()
+        call_command('benchmark_queries', pages=20, links=40, users=2, distinct_urls=5,
+                     repeat=1, stdout=out)
+        self.assertEqual(ScrapedPage.objects.filter(url__startswith='https://bench.').count(), 20)
+        self.assertEqual(PageLink.objects.count(), 40)
+        self.assertIn('== EmailBackend.authenticate', out.getvalue())
@@ -2,7 +2,7 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.db import IntegrityError
-from ..models import ScrapedPage, PageLink
+from ..models import ScrapedPage, PageLink, Url, hash_url
 
 
 class ScrapedPageModelTest(TestCase):
@@ -51,6 +51,26 @@ class ScrapedPageModelTest(TestCase):
                 title='Duplicate Page'
             )
 
+    def test_scraped_page_url_hash(self):
+        """Test url_hash is maintained and used for URL lookups"""
+        page = ScrapedPage.objects.create(
+            user=self.user,
+            url='https://example.com/page',
+            title='Test Page'
+        )
+        self.assertEqual(page.url_hash, hash_url('https://example.com/page'))
+        self.assertEqual(
+            ScrapedPage.objects.for_url(self.user, 'https://example.com/page').get(),
+            page
+        )
+        self.assertFalse(
+            ScrapedPage.objects.for_url(self.user, 'https://example.com/other').exists())
+
+        ScrapedPage.objects.bulk_create(
+            [ScrapedPage(user=self.user, url='https://example.com/bulk')])
+        self.assertTrue(
+            ScrapedPage.objects.for_url(self.user, 'https://example.com/bulk').exists())
+
     def test_page_link_creation(self):
         """Test creating page links"""
         page = ScrapedPage.objects.create(
@@ -66,3 +86,38 @@ class ScrapedPageModelTest(TestCase):
         self.assertEqual(page.link_count, 1)
         self.assertTrue(str(link).startswith('Test Link'))
         self.assertIn('https://example.com/link1', str(link))
+
+    def test_page_links_share_interned_url(self):
+        """Test links to the same URL reference one Url row"""
+        first = ScrapedPage.objects.create(user=self.user, url='https://a.com')
+        second = ScrapedPage.objects.create(user=self.user, url='https://b.com')
+        PageLink.objects.create(page=first, url='https://example.com/x', name='A')
+        PageLink.objects.create(page=second, url='https://example.com/x', name='B')
+
+        self.assertEqual(Url.objects.count(), 1)
+        target = Url.objects.get()
+        self.assertEqual(target.url_hash, hash_url('https://example.com/x'))
+        self.assertEqual(target.page_links.count(), 2)
+        self.assertEqual(
+            list(first.links.values_list('url', flat=True)),
+            ['https://example.com/x']
+        )
+
+
+class UrlModelTest(TestCase):
+    """Test the interned Url table"""
+
+    def test_intern_many(self):
+        """Test bulk interning returns ids and skips existing rows"""
+        existing = Url.objects.intern('https://example.com/a')
+        ids = Url.objects.intern_many(
+            ['https://example.com/a', 'https://example.com/b'])
+
+        self.assertEqual(ids['https://example.com/a'], existing.pk)
+        self.assertEqual(Url.objects.count(), 2)
+
+    def test_lookup(self):
+        """Test looking up a URL by its hash"""
+        url = Url.objects.intern('https://example.com/a')
+        self.assertEqual(Url.objects.lookup('https://example.com/a'), url)
+        self.assertIsNone(Url.objects.lookup('https://example.com/missing'))
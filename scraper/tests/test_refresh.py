@@ -0,0 +1,173 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from ..models import ScrapedPage, ScrapeHistory
+from ..refresh import (
+    links_hash, estimate_change_rate, record_scrape, record_failed_scrape,
+)
+from ..tasks import refresh_due_pages
+from ..constants import ScrapingStatus, Lane, REFRESH_JITTER, REFRESH_LEASE
+
+HOUR = 3600
+
+
+@override_settings(REFRESH_MIN_INTERVAL=HOUR, REFRESH_MAX_INTERVAL=7 * 24 * HOUR)
+class AdaptiveRefreshTest(TestCase):
+    """Test change history and scheduling of re-scrapes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.page = ScrapedPage.objects.create(
+            user=self.user, url='https://example.com',
+            status=ScrapingStatus.COMPLETED)
+
+    def add_history(self, changes, every_hours=1):
+        """Create past scrapes, oldest first, every_hours apart"""
+        now = timezone.now()
+        for index, changed in enumerate(changes):
+            ScrapeHistory.objects.create(
+                page=self.page, links_hash=str(index), changed=changed,
+                scraped_at=now - timedelta(hours=every_hours * (len(changes) - index)))
+
+    def assertInterval(self, interval, expected):
+        self.assertAlmostEqual(interval, expected, delta=expected * REFRESH_JITTER + 1)
+
+    def test_links_hash_ignores_order(self):
+        """Test the link set hash depends on content only"""
+        links = {'https://a.example.com': 'A', 'https://b.example.com': 'B'}
+        reordered = dict(reversed(list(links.items())))
+        self.assertEqual(links_hash(links), links_hash(reordered))
+        self.assertNotEqual(
+            links_hash(links), links_hash({**links, 'https://a.example.com': 'Other'}))
+
+    def test_record_scrape_detects_changes(self):
+        """Test each scrape records whether the link set changed"""
+        links = {'https://a.example.com': 'A'}
+        self.assertTrue(record_scrape(self.page, links).changed)
+        self.assertFalse(record_scrape(self.page, links).changed)
+        self.assertTrue(record_scrape(self.page, {}).changed)
+        self.assertEqual(self.page.history.count(), 3)
+
+    def test_new_page_checked_at_min_interval(self):
+        """Test a page without history is checked again soon"""
+        record_scrape(self.page, {})
+        self.assertInterval(self.page.refresh_interval, HOUR)
+        self.assertGreater(self.page.next_check_at, timezone.now())
+
+    def test_change_rate_estimate(self):
+        """Test the estimate follows how often changes were seen"""
+        self.add_history([True, True, True, False, False])
+        history = list(self.page.history.all())
+        # 2 changes in 4 hourly checks (the oldest scrape only marks the start)
+        self.assertAlmostEqual(estimate_change_rate(history) * HOUR, 0.5878, places=3)
+
+    def test_frequently_changing_page_checked_often(self):
+        """Test pages that change on every check stay near the minimum"""
+        self.add_history([True] * 6)
+        self.page.refresh_interval = HOUR
+        record_scrape(self.page, {'https://new.example.com': 'New'})
+        self.assertInterval(self.page.refresh_interval, HOUR)
+
+    def test_unchanged_page_backs_off(self):
+        """Test pages that never change back off up to the maximum"""
+        self.add_history([True] + [False] * 5, every_hours=2)
+        self.page.history.update(links_hash=links_hash({}))
+        self.page.refresh_interval = 2 * HOUR
+        record_scrape(self.page, {})
+        self.assertInterval(self.page.refresh_interval, 4 * HOUR)
+
+        self.page.refresh_interval = 7 * 24 * HOUR
+        record_scrape(self.page, {})
+        self.assertLessEqual(self.page.refresh_interval, 7 * 24 * HOUR)
+
+    def test_failed_scrape_backs_off(self):
+        """Test a failed scrape doubles the interval"""
+        self.page.refresh_interval = 3 * HOUR
+        record_failed_scrape(self.page)
+        self.assertInterval(self.page.refresh_interval, 6 * HOUR)
+        self.assertFalse(self.page.history.exists())
+
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    @override_settings(REFRESH_SWEEP_INTERVAL=300, REFRESH_SWEEP_BATCH_SIZE=2)
+    def test_sweep_enqueues_due_pages_spread_out(self, mock_apply):
+        """Test a sweep enqueues one spread-out batch of due pages"""
+        past = timezone.now() - timedelta(minutes=1)
+        pages = [self.page] + [
+            ScrapedPage.objects.create(
+                user=self.user, url=f'https://example.com/{i}',
+                status=ScrapingStatus.COMPLETED)
+            for i in range(2)
+        ]
+        for offset, page in enumerate(pages):
+            page.next_check_at = past - timedelta(minutes=offset)
+            page.save()
+        ScrapedPage.objects.create(
+            user=self.user, url='https://example.com/later',
+            status=ScrapingStatus.COMPLETED,
+            next_check_at=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(refresh_due_pages(), 2)
+        self.assertEqual(
+            [(call.kwargs['args'], call.kwargs['countdown']) for call in mock_apply.call_args_list],
+            [([pages[2].pk], 0), ([pages[1].pk], 150)])
+        for call in mock_apply.call_args_list:
+            self.assertEqual(call.kwargs['kwargs']['lane'], Lane.BULK)
+            self.assertEqual(call.kwargs['queue'], Lane.QUEUES[Lane.BULK])
+        self.assertEqual(
+            ScrapedPage.objects.filter(status=ScrapingStatus.PENDING).count(), 2)
+
+        # Leased pages are not swept again; the remaining due page is
+        mock_apply.reset_mock()
+        self.assertEqual(refresh_due_pages(), 1)
+        self.assertEqual(mock_apply.call_args.kwargs['args'], [self.page.pk])
+
+        # Until their lease runs out, whatever their status
+        mock_apply.reset_mock()
+        ScrapedPage.objects.filter(pk=pages[2].pk).update(
+            next_check_at=past, updated_at=past - timedelta(seconds=REFRESH_LEASE))
+        self.assertEqual(refresh_due_pages(), 1)
+        self.assertEqual(mock_apply.call_args.kwargs['args'], [pages[2].pk])
+
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_sweep_publish_failure(self, mock_apply):
+        """Test pages a sweep could not publish are due at the next sweep"""
+        self.page.next_check_at = timezone.now() - timedelta(minutes=1)
+        self.page.save()
+        mock_apply.side_effect = ConnectionError('broker down')
+
+        self.assertEqual(refresh_due_pages(), 0)
+        self.page.refresh_from_db()
+        self.assertLessEqual(self.page.next_check_at, timezone.now())
+
+        self.assertEqual(self.page.status, ScrapingStatus.COMPLETED)
+
+        mock_apply.side_effect = None
+        self.assertEqual(refresh_due_pages(), 1)
+        self.assertEqual(mock_apply.call_args.kwargs['args'], [self.page.pk])
+
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_sweep_skips_pages_being_scraped(self, mock_apply):
+        """Test a due page being scraped or waiting for a retry is not swept"""
+        self.page.status = ScrapingStatus.PROCESSING
+        self.page.next_check_at = timezone.now() - timedelta(minutes=1)
+        self.page.save()
+        retrying = ScrapedPage.objects.create(
+            user=self.user, url='https://example.com/retrying',
+            status=ScrapingStatus.PENDING, next_check_at=self.page.next_check_at)
+
+        self.assertEqual(refresh_due_pages(), 0)
+        mock_apply.assert_not_called()
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.status, ScrapingStatus.PROCESSING)
+
+        # A scrape that was lost is swept once it has been stuck for a lease
+        ScrapedPage.objects.filter(pk=retrying.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=REFRESH_LEASE + 60))
+        self.assertEqual(refresh_due_pages(), 1)
+        self.assertEqual(mock_apply.call_args.kwargs['args'], [retrying.pk])
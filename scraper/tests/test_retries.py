@@ -0,0 +1,153 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+import requests
+import responses
+from ..models import ScrapedPage, DeadLetter
+from ..retries import classify_failure, backoff_delay
+from ..tasks import scrape_page_task
+from ..constants import ScrapingStatus, FailureClass, Lane, REFRESH_BACKOFF
+from .test_common import FakeRedis
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+@override_settings(SCRAPING_MAX_RETRIES=2, SCRAPE_RETRY_BASE_DELAY=10, SCRAPE_RETRY_MAX_DELAY=60)
+class RetryPolicyTest(TestCase):
+    """Test failure classification, backoff, dead-lettering and replay"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+        self.page = ScrapedPage.objects.create(user=self.user, url='https://example.com')
+
+    def scrape(self, **response):
+        with responses.RequestsMock() as mock:
+            mock.add(responses.GET, 'https://example.com', **response)
+            scrape_page_task.apply(args=[self.page.pk])
+            return len(mock.calls)
+
+    def test_classify_failures(self):
+        """Test network errors, HTTP statuses and bugs are told apart"""
+        self.assertEqual(classify_failure(requests.Timeout()),
+                         (FailureClass.TRANSIENT, None))
+        self.assertEqual(classify_failure(requests.ConnectionError()),
+                         (FailureClass.TRANSIENT, None))
+        self.assertEqual(classify_failure(http_error(503, {'Retry-After': '120'})),
+                         (FailureClass.TRANSIENT, 120))
+        self.assertEqual(classify_failure(http_error(404)), (FailureClass.PERMANENT, None))
+        self.assertEqual(classify_failure(requests.exceptions.MissingSchema()),
+                         (FailureClass.PERMANENT, None))
+        self.assertEqual(classify_failure(ValueError('parser bug')), (FailureClass.BUG, None))
+
+    def test_retry_after_http_date(self):
+        """Test Retry-After given as an HTTP date"""
+        later = http_date((timezone.now() + timedelta(seconds=300)).timestamp())
+        _, retry_after = classify_failure(http_error(429, {'Retry-After': later}))
+        self.assertAlmostEqual(retry_after, 300, delta=2)
+
+    def test_backoff_grows_and_is_capped(self):
+        """Test the jitter window doubles per retry up to the maximum delay"""
+        with patch('scraper.retries.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual([backoff_delay(retries) for retries in range(4)], [10, 20, 40, 60])
+        with patch('scraper.retries.random.uniform', return_value=0):
+            self.assertEqual(backoff_delay(0, retry_after=30), 30)
+            self.assertEqual(backoff_delay(0, retry_after=3600), 60)
+
+    def test_transient_failure_retried_then_dead_lettered(self):
+        """Test transient failures are retried until retries run out"""
+        self.assertEqual(self.scrape(status=503), 3)
+
+        letter = DeadLetter.objects.get(page=self.page)
+        self.assertEqual(letter.failure_class, FailureClass.TRANSIENT)
+        self.assertEqual(letter.attempts, 3)
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.status, ScrapingStatus.FAILED)
+
+    @override_settings(REFRESH_MIN_INTERVAL=3600)
+    def test_next_check_backed_off_once(self):
+        """Test the next check is backed off when the task gives up, not per attempt"""
+        self.page.refresh_interval = 3600
+        self.page.save()
+        with patch('scraper.refresh.random.uniform', return_value=0):
+            self.scrape(status=503)
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.refresh_interval, 3600 * REFRESH_BACKOFF)
+        self.assertGreater(self.page.next_check_at, timezone.now() + timedelta(seconds=3600))
+
+    def test_permanent_failure_not_retried(self):
+        """Test a 404 is dead-lettered after a single attempt"""
+        self.assertEqual(self.scrape(status=404), 1)
+        letter = DeadLetter.objects.get(page=self.page)
+        self.assertEqual((letter.failure_class, letter.attempts), (FailureClass.PERMANENT, 1))
+
+    @patch('scraper.utils.scrape_page_links', side_effect=KeyError('title'))
+    def test_bug_not_retried(self, mock_scrape):
+        """Test unexpected exceptions are dead-lettered as bugs without retrying"""
+        scrape_page_task.apply(args=[self.page.pk])
+        mock_scrape.assert_called_once()
+        self.assertEqual(DeadLetter.objects.get().failure_class, FailureClass.BUG)
+
+    def test_success_leaves_no_dead_letter(self):
+        """Test a successful scrape records nothing"""
+        self.scrape(body='<a href="/a">A</a>', content_type='text/html')
+        self.assertFalse(DeadLetter.objects.exists())
+
+    def assertPublishedBulk(self, mock_apply_async, page):
+        """Assert the page alone was published, through the bulk lane"""
+        mock_apply_async.assert_called_once()
+        self.assertEqual(mock_apply_async.call_args.kwargs['args'], [page.pk])
+        self.assertEqual(mock_apply_async.call_args.kwargs['kwargs']['lane'], Lane.BULK)
+        self.assertEqual(mock_apply_async.call_args.kwargs['queue'], Lane.QUEUES[Lane.BULK])
+
+    @patch('scraper.scheduling.redis_client', return_value=FakeRedis())
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_replay_view(self, mock_apply_async, mock_redis):
+        """Test replaying queues each failed page once and only once, as a bulk scrape"""
+        other = ScrapedPage.objects.create(user=self.user, url='https://example.org')
+        for page, failure_class in ((self.page, FailureClass.TRANSIENT),
+                                    (self.page, FailureClass.TRANSIENT),
+                                    (other, FailureClass.BUG)):
+            DeadLetter.objects.create(page=page, failure_class=failure_class,
+                                      error='Error', attempts=1)
+
+        response = self.client.get(reverse('scraper:queue_status'))
+        self.assertIn((FailureClass.TRANSIENT, 2), response.context['dead_letters'])
+
+        self.client.post(reverse('scraper:replay_dead_letters'),
+                         {'failure_class': FailureClass.TRANSIENT})
+        self.assertPublishedBulk(mock_apply_async, self.page)
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.status, ScrapingStatus.PENDING)
+
+        mock_apply_async.reset_mock()
+        self.client.post(reverse('scraper:replay_dead_letters'))
+        self.assertPublishedBulk(mock_apply_async, other)
+
+    @patch('scraper.scheduling.redis_client', return_value=FakeRedis())
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_replay_command(self, mock_apply_async, mock_redis):
+        """Test the management command replays pending letters by class"""
+        DeadLetter.objects.create(page=self.page, failure_class=FailureClass.PERMANENT,
+                                  error='Error', attempts=1)
+        out = StringIO()
+        call_command('replay_dead_letters', '--failure-class', FailureClass.BUG, stdout=out)
+        call_command('replay_dead_letters', '--failure-class', FailureClass.PERMANENT, stdout=out)
+        self.assertPublishedBulk(mock_apply_async, self.page)
+        self.assertEqual(out.getvalue().splitlines(), ['0 pages queued', '1 pages queued'])
@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import patch
+from django.conf import settings
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.urls import reverse
+from ..models import ScrapedPage
+from ..middleware import ReplicaPinningMiddleware, PIN_COOKIE
+from ..routers import read_from_replica
+
+
+@override_settings(DATABASE_READ_REPLICAS=['replica'])
+class PrimaryReplicaRouterTest(TestCase):
+    """Test which database reads and writes are routed to"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def read_db_in_view(self, request, write=False):
+        @read_from_replica
+        def view(request):
+            if write:
+                ScrapedPage.objects.filter(pk=0).update(title='')
+            return HttpResponse(ScrapedPage.objects.all().db)
+
+        middleware = ReplicaPinningMiddleware(view)
+        return middleware(request)
+
+    def test_reads_outside_views_use_primary(self):
+        """Test the pipeline and other code paths read from the primary"""
+        self.assertEqual(ScrapedPage.objects.all().db, 'default')
+
+    def test_read_only_view_uses_replica(self):
+        """Test safe requests in opted-in views read from the replica"""
+        response = self.read_db_in_view(self.factory.get('/'))
+        self.assertEqual(response.content, b'replica')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_unsafe_method_uses_primary(self):
+        """Test POST requests are never routed to the replica"""
+        response = self.read_db_in_view(self.factory.post('/'))
+        self.assertEqual(response.content, b'default')
+
+    def test_write_pins_request_and_client(self):
+        """Test a write routes later reads to the primary and sets the pin cookie"""
+        response = self.read_db_in_view(self.factory.get('/'), write=True)
+        self.assertEqual(response.content, b'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_primary(self):
+        """Test a client with the pin cookie reads from the primary"""
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        response = self.read_db_in_view(request)
+        self.assertEqual(response.content, b'default')
+
+    def test_no_replica_configured(self):
+        """Test reads fall back to the primary without replicas"""
+        with override_settings(DATABASE_READ_REPLICAS=[]):
+            response = self.read_db_in_view(self.factory.get('/'))
+        self.assertEqual(response.content, b'default')
+
+
+@unittest.skipUnless('replica' in settings.DATABASES,
+                     'Set DATABASE_REPLICA_URL to a second SQLite database')
+class ReplicaReadYourWritesTest(TestCase):
+    """Test against a second, unreplicated database standing in for a replica"""
+
+    databases = {'default', *settings.DATABASE_READ_REPLICAS}
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+        self.client.cookies.pop(PIN_COOKIE, None)
+
+    def test_reads_hit_replica_until_client_writes(self):
+        """Test read-only views read the replica, and the primary after a write"""
+        ScrapedPage.objects.create(user=self.user, url='https://example.com')
+
+        # The stand-in replica never receives the row
+        response = self.client.get(reverse('scraper:page_list'))
+        self.assertEqual(response.context['total_pages'], 0)
+
+        with patch('scraper.views.handle_scraping_task', return_value=True):
+            response = self.client.post(
+                reverse('scraper:page_list'), {'url': 'https://example.org'})
+        page = ScrapedPage.objects.get(url='https://example.org')
+        self.assertRedirects(
+            response, reverse('scraper:page_detail', kwargs={'pk': page.pk}),
+            fetch_redirect_response=False)
+
+        response = self.client.get(
+            reverse('scraper:page_detail', kwargs={'pk': page.pk}))
+        self.assertEqual(response.status_code, 200)
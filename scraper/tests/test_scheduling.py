@@ -0,0 +1,183 @@
+import time
+from unittest.mock import MagicMock, patch
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+import responses
+from ..models import ScrapedPage
+from ..scheduling import (
+    SLOTS_KEY, DISPATCH_LOCK_KEY, DISPATCH_LOCK_TIMEOUT, add_bulk_scrape, dispatch_bulk_scrapes, release_bulk_slot, get_lane_stats,
+    backlog_key,
+)
+from ..tasks import queue_scraping_task, scrape_page_task
+from ..breakers import CircuitOpenError
+from ..constants import Lane
+from .test_common import FakeRedis, TEST_HTML_WITH_LINKS
+
+
+@override_settings(SCRAPE_BULK_IN_FLIGHT=4, SCRAPE_USER_IN_FLIGHT=3, SCRAPE_SLOT_LEASE=600,
+                   SCRAPE_INTERACTIVE_WAIT_TARGET=5)
+class FairSchedulingTest(TestCase):
+    """Test round-robin dispatch of bulk scrapes and the interactive lane"""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch('scraper.scheduling.redis_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.published = []
+
+    def publish(self, page_id, requested_at):
+        self.published.append(page_id)
+
+    def dispatch(self):
+        return dispatch_bulk_scrapes(self.publish)
+
+    def test_users_take_turns(self):
+        """Test a large import does not hold back a small one added after it"""
+        for page_id in range(100, 110):
+            add_bulk_scrape(1, page_id)
+        for page_id in range(200, 202):
+            add_bulk_scrape(2, page_id)
+
+        self.assertEqual(self.dispatch(), 4)
+        self.assertEqual(self.published, [100, 200, 101, 201])
+
+    def test_per_user_cap(self):
+        """Test one user's scrapes never take more than their share of slots"""
+        for page_id in range(100, 110):
+            add_bulk_scrape(1, page_id)
+
+        self.assertEqual(self.dispatch(), 3)
+        self.assertEqual(self.dispatch(), 0)
+        self.assertEqual(self.redis.llen(backlog_key(1)), 7)
+
+    def test_released_slot_dispatches_next(self):
+        """Test a finished scrape frees its slot for the next page in line"""
+        for page_id in range(100, 110):
+            add_bulk_scrape(1, page_id)
+        self.dispatch()
+
+        release_bulk_slot(1, 100)
+        self.assertEqual(self.dispatch(), 1)
+        self.assertEqual(self.published, [100, 101, 102, 103])
+
+    def test_expired_leases_free_slots(self):
+        """Test slots of scrapes that died are reclaimed after the lease"""
+        for page_id in range(100, 110):
+            add_bulk_scrape(1, page_id)
+        self.dispatch()
+
+        with patch('scraper.scheduling.time.time', return_value=time.time() + 601):
+            self.assertEqual(self.dispatch(), 3)
+        self.assertEqual(self.redis.zcard(SLOTS_KEY), 3)
+
+    def test_publish_failure_keeps_page(self):
+        """Test a page that could not be published stays first in its backlog"""
+        add_bulk_scrape(1, 100)
+        self.assertEqual(dispatch_bulk_scrapes(MagicMock(side_effect=Exception('no broker'))), 0)
+        self.assertEqual(self.redis.llen(backlog_key(1)), 1)
+        self.assertEqual(self.redis.zcard(SLOTS_KEY), 0)
+
+        self.assertEqual(self.dispatch(), 1)
+        self.assertEqual(self.published, [100])
+
+    def test_expired_lock_not_released(self):
+        """Test a dispatcher that outlived its lock leaves the next dispatcher's lock alone"""
+        add_bulk_scrape(1, 100)
+
+        def slow_publish(page_id, requested_at):
+            self.redis.now += DISPATCH_LOCK_TIMEOUT + 1
+            self.redis.set(DISPATCH_LOCK_KEY, 'next', nx=True)
+
+        self.assertEqual(dispatch_bulk_scrapes(slow_publish), 1)
+        self.assertEqual(self.redis.values[DISPATCH_LOCK_KEY], 'next')
+        self.assertEqual(self.dispatch(), 0)
+
+    def test_emptied_backlog_drops_user(self):
+        """Test users leave the rotation once their backlog is drained"""
+        add_bulk_scrape(1, 100)
+        self.dispatch()
+        self.dispatch()
+        self.assertEqual(self.redis.llen('scheduler:users'), 0)
+        self.assertEqual(get_lane_stats()[1]['users'], 0)
+
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_interactive_queue(self, mock_apply_async):
+        """Test pages added by hand are published to the interactive queue"""
+        queue_scraping_task(42)
+        self.assertEqual(mock_apply_async.call_args.kwargs['queue'], 'interactive')
+        self.assertEqual(mock_apply_async.call_args.kwargs['kwargs']['lane'], Lane.INTERACTIVE)
+
+    @responses.activate
+    @override_settings(SCRAPE_USER_IN_FLIGHT=1)
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_finished_bulk_scrape_dispatches_next(self, mock_apply_async):
+        """Test a bulk scrape records its wait, frees its slot and dispatches the next page"""
+        responses.add(responses.GET, 'https://example.com/', body=TEST_HTML_WITH_LINKS)
+        user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        page = ScrapedPage.objects.create(user=user, url='https://example.com/')
+        add_bulk_scrape(user.pk, page.pk)
+        add_bulk_scrape(user.pk, 999)
+        self.dispatch()
+        self.assertEqual(self.published, [page.pk])
+
+        scrape_page_task.apply(args=[page.pk], kwargs={
+            'lane': Lane.BULK, 'requested_at': time.time() - 30})
+
+        self.assertEqual(mock_apply_async.call_args.kwargs['args'], [999])
+        self.assertEqual(mock_apply_async.call_args.kwargs['queue'], 'scraping')
+        bulk = get_lane_stats()[1]
+        self.assertEqual(bulk['samples'], 1)
+        self.assertAlmostEqual(bulk['p95'], 30, delta=1)
+        self.assertEqual(bulk['in_flight'], 1)
+
+    @override_settings(SCRAPE_USER_IN_FLIGHT=1)
+    @patch('scraper.tasks.scrape_page_task.apply_async')
+    def test_deferred_bulk_scrape_keeps_slot(self, mock_apply_async):
+        """Test a bulk scrape deferred by an open circuit keeps its slot until the retry"""
+        user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        page = ScrapedPage.objects.create(user=user, url='https://down.example.com/')
+        add_bulk_scrape(user.pk, page.pk)
+        add_bulk_scrape(user.pk, 999)
+        self.dispatch()
+
+        with patch('scraper.utils.CircuitBreaker.before_request',
+                   side_effect=CircuitOpenError('down.example.com', 120)):
+            result = scrape_page_task.apply(args=[page.pk], kwargs={
+                'lane': Lane.BULK, 'requested_at': time.time()}).get()
+
+        self.assertEqual(result['deferred'], 120)
+        mock_apply_async.assert_called_once()
+        self.assertEqual(mock_apply_async.call_args.kwargs['args'], [page.pk])
+        self.assertEqual(self.redis.zcount(SLOTS_KEY, time.time() + 600, '+inf'), 1)
+        self.dispatch()
+        self.assertEqual(self.published, [page.pk])
+
+    def test_queue_status_shows_lanes(self):
+        """Test the queue status page reports waits against the interactive target"""
+        for seconds in (1, 2, 12):
+            scrape_page_task.apply(args=[0], kwargs={
+                'lane': Lane.INTERACTIVE, 'requested_at': time.time() - seconds})
+        interactive = get_lane_stats()[0]
+        self.assertEqual(interactive['samples'], 3)
+        self.assertAlmostEqual(interactive['p50'], 2, delta=0.5)
+        self.assertAlmostEqual(interactive['p95'], 12, delta=0.5)
+
+        client = Client()
+        client.force_login(User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        ))
+        response = client.get(reverse('scraper:queue_status'))
+        self.assertContains(response, 'Queue Wait by Lane')
+        self.assertContains(response, 'text-danger')
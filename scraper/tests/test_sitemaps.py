@@ -0,0 +1,178 @@
+import gzip
+import io
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import patch
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.urls import reverse
+import responses
+from ..models import ScrapedPage, UserPageStats
+from ..sitemaps import import_sitemap, parse_sitemap, parse_lastmod, create_pages
+from ..constants import ScrapingStatus
+
+NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def urlset(entries):
+    urls = ''.join(
+        f'<url><loc>{loc}</loc>' + (f'<lastmod>{lastmod}</lastmod>' if lastmod else '') + '</url>'
+        for loc, lastmod in entries)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{NAMESPACE}">{urls}</urlset>'.encode()
+
+
+def sitemap_index(locs):
+    sitemaps = ''.join(f'<sitemap><loc>{loc}</loc></sitemap>' for loc in locs)
+    return f'<sitemapindex xmlns="{NAMESPACE}">{sitemaps}</sitemapindex>'.encode()
+
+
+class SitemapImportTest(TestCase):
+    """Test streaming sitemap parsing and imports"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client.login(username='test@example.com', password='testpass123')
+        self.dispatched = []
+
+    def import_sitemap(self, sitemaps, url='https://example.com/sitemap.xml'):
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as mock:
+            for sitemap_url, body in sitemaps.items():
+                if body is None:
+                    mock.add(responses.GET, sitemap_url, status=404)
+                else:
+                    mock.add(responses.GET, sitemap_url, body=body)
+            return import_sitemap(self.user, url, self.dispatched.append)
+
+    def test_parse_urlset(self):
+        """Test URLs and lastmod values are read from a namespaced urlset"""
+        entries = list(parse_sitemap(io.BytesIO(urlset([
+            ('https://example.com/a', '2024-05-01'),
+            ('https://example.com/b', None),
+        ]))))
+        self.assertEqual([(e.kind, e.loc) for e in entries],
+                         [('url', 'https://example.com/a'), ('url', 'https://example.com/b')])
+        self.assertEqual(entries[0].lastmod, datetime(2024, 5, 1, tzinfo=dt_timezone.utc))
+        self.assertIsNone(entries[1].lastmod)
+
+    def test_parse_lastmod_formats(self):
+        """Test W3C dates, timestamps and invalid values"""
+        self.assertEqual(parse_lastmod('2024-05-01T10:30:00+02:00'),
+                         datetime(2024, 5, 1, 8, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(parse_lastmod(' 2024-05-01 '),
+                         datetime(2024, 5, 1, tzinfo=dt_timezone.utc))
+        self.assertIsNone(parse_lastmod('yesterday'))
+        self.assertIsNone(parse_lastmod('2024-13-45'))
+
+    def test_parse_gzipped(self):
+        """Test gzipped sitemaps are detected and decompressed"""
+        body = gzip.compress(urlset([('https://example.com/a', None)]))
+        self.assertEqual([e.loc for e in parse_sitemap(io.BytesIO(body))],
+                         ['https://example.com/a'])
+
+    def test_parse_memory_stays_flat(self):
+        """Test parsing memory does not grow with the number of URLs"""
+        def peak(count):
+            body = urlset((f'https://example.com/{i}', '2024-05-01') for i in range(count))
+            tracemalloc.start()
+            for _ in parse_sitemap(io.BytesIO(body)):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        self.assertLess(peak(20000), peak(2000) * 2)
+
+    def test_import_follows_index(self):
+        """Test sitemap indexes are followed, including gzipped sitemaps"""
+        stats = self.import_sitemap({
+            'https://example.com/sitemap.xml': sitemap_index([
+                'https://example.com/a.xml.gz',
+                'https://example.com/missing.xml',
+                'https://example.com/b.xml',
+            ]),
+            'https://example.com/a.xml.gz': gzip.compress(urlset([
+                ('https://example.com/one', '2024-05-01'),
+                ('https://Example.com/two#top', None),
+            ])),
+            'https://example.com/missing.xml': None,
+            'https://example.com/b.xml': urlset([
+                ('https://example.com/three', None),
+                ('mailto:someone@example.com', None),
+            ]),
+        })
+
+        self.assertEqual(stats, {'found': 3, 'created': 3, 'changed': 0, 'skipped': 0})
+        pages = ScrapedPage.objects.filter(user=self.user)
+        self.assertEqual(sorted(pages.values_list('url', flat=True)), [
+            'https://example.com/one', 'https://example.com/three', 'https://example.com/two',
+        ])
+        self.assertEqual(sorted(self.dispatched), sorted(pages.values_list('pk', flat=True)))
+        self.assertEqual(pages.get(url='https://example.com/one').sitemap_lastmod,
+                         datetime(2024, 5, 1, tzinfo=dt_timezone.utc))
+
+    def test_reimport_skips_unchanged(self):
+        """Test a later import only queues pages whose lastmod moved forward"""
+        self.import_sitemap({'https://example.com/sitemap.xml': urlset([
+            ('https://example.com/one', '2024-05-01'),
+            ('https://example.com/two', '2024-05-01'),
+            ('https://example.com/three', None),
+        ])})
+        ScrapedPage.objects.update(status=ScrapingStatus.COMPLETED)
+        self.dispatched.clear()
+
+        stats = self.import_sitemap({'https://example.com/sitemap.xml': urlset([
+            ('https://example.com/one', '2024-05-01'),
+            ('https://example.com/two', '2024-06-01'),
+            ('https://example.com/three', None),
+        ])})
+
+        two = ScrapedPage.objects.get(url='https://example.com/two')
+        self.assertEqual(stats, {'found': 3, 'created': 0, 'changed': 1, 'skipped': 2})
+        self.assertEqual(self.dispatched, [two.pk])
+        self.assertEqual(two.sitemap_lastmod, datetime(2024, 6, 1, tzinfo=dt_timezone.utc))
+
+    def test_long_urls_skipped(self):
+        """Test sitemap URLs too long for a page are left out"""
+        long_url = 'https://example.com/' + 'a' * 2030
+        stats = self.import_sitemap({'https://example.com/sitemap.xml': urlset([
+            ('https://example.com/one', None), (long_url, None),
+        ])})
+        self.assertEqual(stats['found'], 1)
+        self.assertFalse(ScrapedPage.objects.filter(url=long_url).exists())
+
+    def test_concurrently_added_page_not_dispatched(self):
+        """Test a page another request inserts during the import is not counted or queued"""
+        def racing_create_pages(pages):
+            ScrapedPage.objects.create(user=self.user, url='https://example.com/two')
+            return create_pages(pages)
+
+        with patch('scraper.sitemaps.create_pages', side_effect=racing_create_pages):
+            stats = self.import_sitemap({'https://example.com/sitemap.xml': urlset([
+                ('https://example.com/one', None), ('https://example.com/two', None),
+            ])})
+
+        one = ScrapedPage.objects.get(url='https://example.com/one')
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(self.dispatched, [one.pk])
+        self.assertEqual(UserPageStats.objects.get(user=self.user).pending, 2)
+
+    @patch('scraper.views.import_sitemap_task.delay')
+    def test_import_view_queues_task(self, mock_delay):
+        """Test the import form queues a background import"""
+        response = self.client.post(reverse('scraper:import_sitemap'),
+                                    {'url': 'https://example.com/sitemap.xml'})
+        mock_delay.assert_called_once_with(self.user.pk, 'https://example.com/sitemap.xml')
+        self.assertRedirects(response, reverse('scraper:page_list'))
+
+    @patch('scraper.views.import_sitemap_task.delay', side_effect=Exception('no broker'))
+    def test_import_view_without_celery(self, mock_delay):
+        """Test a sitemap is not imported synchronously when the queue is down"""
+        response = self.client.post(reverse('scraper:import_sitemap'),
+                                    {'url': 'https://example.com/sitemap.xml'}, follow=True)
+        self.assertContains(response, 'Failed to queue sitemap import')
+        self.assertFalse(ScrapedPage.objects.exists())
@@ -0,0 +1,37 @@
+import sys
+from unittest import mock
+from django.test import SimpleTestCase
+from ..apps import preload_worker_modules
+from ..constants import (
+    WEB_IMPORT_BUDGET_SECONDS, WEB_RSS_BUDGET_MB, WEB_FORBIDDEN_MODULES, WORKER_PRELOAD_MODULES
+)
+from ..management.commands.benchmark_startup import measure_startup, top_level_imports
+
+
+class StartupBudgetTest(SimpleTestCase):
+    """Test web processes start without the scraping stack, within their budget"""
+
+    def test_web_process_budget(self):
+        """Test importing the URLconf in a fresh interpreter stays light and fast"""
+        report, _ = measure_startup(['web_scraping_app.urls'])
+        loaded = [module for module in WEB_FORBIDDEN_MODULES if module in report['modules']]
+        self.assertEqual(loaded, [])
+        self.assertLess(report['seconds'], WEB_IMPORT_BUDGET_SECONDS)
+        self.assertLess(report['rss_mb'], WEB_RSS_BUDGET_MB)
+
+    def test_worker_preload(self):
+        """Test the worker's parent imports the scraping stack before forking"""
+        with mock.patch('scraper.apps.import_module') as import_module:
+            preload_worker_modules(sender=None)
+        self.assertEqual([call.args[0] for call in import_module.call_args_list],
+                         list(WORKER_PRELOAD_MODULES))
+        preload_worker_modules(sender=None)
+        self.assertIn('bs4', sys.modules)
+
+    def test_top_level_imports(self):
+        """Test only imports made directly are ranked, slowest first"""
+        log = ('import time: self [us] | cumulative | imported package\n'
+               'import time:       100 |        100 |   nested\n'
+               'import time:       200 |        300 | fast\n'
+               'import time:       500 |       2000 | slow\n')
+        self.assertEqual(top_level_imports(log, 5), [(0.002, 'slow'), (0.0003, 'fast')])
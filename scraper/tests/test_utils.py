@@ -1,8 +1,10 @@
+from unittest.mock import patch
 from django.test import TestCase
 from django.contrib.auth.models import User
 import responses
 from ..models import ScrapedPage
-from ..utils import scrape_page_links
+from ..utils import scrape_page_links, http_session
+from ..urlnorm import canonicalize_url, LinkNormalizer
 
 
 class ScrapingUtilsTest(TestCase):
@@ -106,3 +108,98 @@ class ScrapingUtilsTest(TestCase):
         page.refresh_from_db()
         self.assertEqual(page.status, 'failed')
         self.assertIsNotNone(page.error_message)
+
+
+class LinkNormalizerTest(TestCase):
+    """Test URL resolution and canonicalization"""
+
+    def test_canonicalize_url(self):
+        """Test trivially different URLs canonicalize to the same value"""
+        expected = 'https://example.com/page?q=1'
+        for url in (
+            'https://example.com/page?q=1',
+            'HTTPS://Example.COM/page?q=1#top',
+            'https://example.com:443/page?q=1',
+        ):
+            self.assertEqual(canonicalize_url(url), expected)
+
+        self.assertEqual(canonicalize_url('http://example.com:8080'),
+                         'http://example.com:8080/')
+        self.assertEqual(canonicalize_url('https://example.com/page?'),
+                         'https://example.com/page')
+        self.assertIsNone(canonicalize_url('https://example.com:bad/'))
+
+    def test_normalize_relative_links(self):
+        """Test relative hrefs resolve against the base URL"""
+        normalizer = LinkNormalizer('https://example.com/blog/post')
+        self.assertEqual(normalizer.normalize('/about'),
+                         'https://example.com/about')
+        self.assertEqual(normalizer.normalize('other'),
+                         'https://example.com/blog/other')
+        self.assertEqual(normalizer.normalize('../up'),
+                         'https://example.com/up')
+        self.assertEqual(normalizer.normalize('/a/../b'),
+                         'https://example.com/b')
+        self.assertEqual(normalizer.normalize('//cdn.example.com/x'),
+                         'https://cdn.example.com/x')
+
+    def test_normalize_skips_non_http_schemes(self):
+        """Test mailto:, javascript: and friends are skipped"""
+        normalizer = LinkNormalizer('https://example.com')
+        for href in ('mailto:test@example.com', 'javascript:void(0)',
+                     'tel:+123', 'ftp://example.com/file', '   '):
+            self.assertIsNone(normalizer.normalize(href))
+
+    def test_normalize_memoizes_hrefs(self):
+        """Test repeated hrefs are served from the per-page cache"""
+        normalizer = LinkNormalizer('https://example.com')
+        normalizer.normalize('/page')
+        normalizer.cache['/page'] = 'https://cached.example.com/'
+        self.assertEqual(normalizer.normalize('/page'),
+                         'https://cached.example.com/')
+
+    @responses.activate
+    def test_scrape_page_links_dedupes_canonical_urls(self):
+        """Test equivalent URLs on a page are stored once"""
+        user = User.objects.create_user(
+            username='test@example.com',
+            email='test@example.com',
+            password='testpass123'
+        )
+        page = ScrapedPage.objects.create(user=user, url='https://example.com')
+
+        html_content = '''
+        <html><body>
+            <a href="/page">First</a>
+            <a href="/page#section">Fragment</a>
+            <a href="HTTPS://EXAMPLE.COM:443/page">Uppercase</a>
+            <a href="mailto:test@example.com">Email</a>
+        </body></html>
+        '''
+        responses.add(responses.GET, 'https://example.com',
+                      body=html_content, status=200, content_type='text/html')
+
+        self.assertEqual(scrape_page_links(page), 1)
+        self.assertEqual(
+            list(page.links.values_list('url', 'name')),
+            [('https://example.com/page', 'First')]
+        )
+
+
+class HttpSessionTest(TestCase):
+    """Test the shared scraping HTTP session"""
+
+    def test_session_shared_within_process(self):
+        """Test scrapes reuse one session, and a forked child gets its own"""
+        session = http_session()
+        self.assertIs(http_session(), session)
+        with patch('scraper.utils.os.getpid', return_value=-1):
+            self.assertIsNot(http_session(), session)
+
+    @responses.activate
+    def test_session_stores_no_cookies(self):
+        """Test cookies set by one site are not sent on later scrapes"""
+        responses.add(responses.GET, 'https://example.com/',
+                      headers={'Set-Cookie': 'session=secret; Path=/'})
+        http_session().get('https://example.com/')
+        self.assertEqual(len(http_session().cookies), 0)
@@ -0,0 +1,100 @@
+"""
+URL validation and canonicalization.
+
+Kept apart from the scraping pipeline in ``utils`` so that web processes,
+which canonicalize submitted URLs, do not import the HTTP and parsing
+stack.
+"""
+import re
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
+
+
+def is_valid_url(url):
+    """Check if the URL is valid"""
+    try:
+        result = urlparse(url)
+        return all([result.scheme, result.netloc])
+    except:
+        return False
+
+
+SCHEME_PATTERN = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*):')
+HTTP_SCHEMES = ('http', 'https')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url):
+    """
+    Canonicalize an absolute http(s) URL: lowercase scheme and host, drop the
+    default port, the fragment and an empty query. Returns None if invalid.
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    if scheme not in HTTP_SCHEMES or not host:
+        return None
+
+    if ':' in host:
+        host = f'[{host}]'
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = f'{host}:{port}'
+
+    netloc = parts.netloc
+    if '@' in netloc:
+        host = netloc.rsplit('@', 1)[0] + '@' + host
+
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+
+class LinkNormalizer:
+    """
+    Resolve and canonicalize the hrefs of a single page.
+
+    The base URL is parsed once, results are memoized per href so repeated
+    anchors are only resolved once, and non-HTTP schemes are rejected before
+    any URL parsing happens.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        base = urlsplit(base_url)
+        self.base_scheme = base.scheme.lower()
+        self.base_origin = f'{base.scheme}://{base.netloc}'
+        self.cache = {}
+
+    def resolve(self, href):
+        """Turn an href into an absolute URL without canonicalizing it"""
+        match = SCHEME_PATTERN.match(href)
+        if match:
+            if match.group(1).lower() not in HTTP_SCHEMES:
+                return None
+            if href[match.end():match.end() + 2] == '//':
+                return href
+        elif href.startswith('//'):
+            return f'{self.base_scheme}:{href}'
+        elif href.startswith('/') and '/.' not in href:
+            return self.base_origin + href
+
+        return urljoin(self.base_url, href)
+
+    def normalize(self, href):
+        """Return the canonical absolute URL for an href, or None to skip it"""
+        try:
+            return self.cache[href]
+        except KeyError:
+            pass
+
+        url = None
+        stripped = href.strip()
+        if stripped:
+            absolute_url = self.resolve(stripped)
+            if absolute_url:
+                url = canonicalize_url(absolute_url)
+
+        self.cache[href] = url
+        return url
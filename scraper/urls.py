@@ -6,13 +6,26 @@ app_name = 'scraper'
 urlpatterns = [
     path('', views.page_list_view, name='page_list'),
     path('pages/', views.page_list_view, name='page_list'),
+    path('pages/export/', views.export_user_links_view, name='export_user_links'),
+    path('pages/check-links/', views.check_user_links_view, name='check_user_links'),
+    path('pages/delete/', views.delete_pages_view, name='delete_pages'),
+    path('pages/import-sitemap/', views.import_sitemap_view, name='import_sitemap'),
     path('pages/<int:pk>/', views.page_detail_view, name='page_detail'),
+    path('pages/<int:pk>/export/',
+         views.export_page_links_view, name='export_page_links'),
     path('pages/<int:pk>/rescrape/',
          views.rescrape_page_view, name='rescrape_page'),
+    path('pages/<int:pk>/check-links/',
+         views.check_page_links_view, name='check_page_links'),
     path('pages/<int:pk>/delete/', views.delete_page_view, name='delete_page'),
+    path('api/pages/', views.pages_api, name='pages_api'),
+    path('api/pages/<int:pk>/links/',
+         views.page_links_api, name='page_links_api'),
+    path('api/backlinks/', views.backlinks_api, name='backlinks_api'),
     path('api/pages/<int:pk>/status/',
          views.page_status_api, name='page_status_api'),
     path('queue-status/', views.queue_status_view, name='queue_status'),
+    path('queue-status/replay/', views.replay_dead_letters_view, name='replay_dead_letters'),
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
 ]
@@ -1,56 +1,107 @@
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlsplit
 import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.utils import timezone
-from .models import ScrapedPage, PageLink
-from .constants import ScrapingStatus
-
-
-def is_valid_url(url):
-    """Check if the URL is valid"""
-    try:
-        result = urlparse(url)
-        return all([result.scheme, result.netloc])
-    except:
-        return False
-
-
-def clean_link_text(text):
-    """Clean and truncate link text"""
-    if not text:
-        return 'No text'
-
-    # Remove extra whitespace and newlines
-    text = ' '.join(text.split())
-
-    # Truncate if too long
-    if len(text) > 200:
-        text = text[:197] + '...'
-
-    return text or 'No text'
-
+from .models import ScrapedPage
+from .linkstore import store_page_links, store_page_resources
+from .aggregates import record_link_domains
+from .extractors import run_extractors
+from .refresh import record_scrape, record_failed_scrape
+from .connections import release_connections
+from .breakers import CircuitBreaker, CircuitOpenError
+from .latency import fetch_timeouts, record_latency
+from .fetchers import RequestsFetcher, HttpxFetcher, httpx_client
+from .charsets import decode_html
+from .urlnorm import LinkNormalizer
+from .constants import ScrapingStatus, Extractor, FetchBackend, USER_AGENT
+
+
+_session_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+
+def http_session():
+    """
+    The requests session shared by every scrape in this process.
 
-def scrape_page_links(scraped_page):
+    Sharing one session keeps connections to a site alive across scrapes
+    and across the threads or greenlets of a worker. Its connection pool is
+    thread-safe and it never stores cookies, so scrapes cannot see each
+    other's state. A pool child gets a new session instead of the sockets
+    it inherited from its parent.
     """
-    Scrape all links from a given page and save them to the database
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            session.headers['User-Agent'] = USER_AGENT
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(
+                pool_connections=settings.SCRAPER_HTTP_POOL_SIZE,
+                pool_maxsize=settings.SCRAPER_HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+def get_fetcher():
+    """The page fetch backend selected by SCRAPER_FETCH_BACKEND"""
+    backend = settings.SCRAPER_FETCH_BACKEND
+    if backend == FetchBackend.REQUESTS:
+        return RequestsFetcher(http_session())
+    if backend == FetchBackend.HTTPX:
+        return HttpxFetcher(httpx_client())
+    raise ImproperlyConfigured(
+        f"SCRAPER_FETCH_BACKEND must be one of {', '.join(FetchBackend.CHOICES)}, not {backend!r}")
+
+
+def scrape_page_links(scraped_page, raise_errors=False):
+    """
+    Scrape all links from a given page and save them to the database.
+    Failures mark the page failed; with raise_errors the exception is then
+    re-raised so the caller can decide whether to retry.
     """
     try:
         # Update status to processing
         scraped_page.status = ScrapingStatus.PROCESSING
         scraped_page.save()
 
-        # Set headers to mimic a real browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-
-        # Make the request with timeout
-        response = requests.get(scraped_page.url, headers=headers, timeout=30)
-        response.raise_for_status()
-
-        # Parse the HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
+        # Make the request with timeout, without holding a database
+        # connection while waiting under a green-thread pool. Hosts whose
+        # circuit is open are not contacted at all.
+        host = urlsplit(scraped_page.url).hostname
+        breaker = CircuitBreaker(host)
+        breaker.before_request()
+        timeouts = fetch_timeouts(host)
+        release_connections()
+        try:
+            response = get_fetcher().fetch(scraped_page.url, timeouts)
+            record_latency(host, response.elapsed)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.Timeout):
+                # The host took at least as long as the deadline it missed
+                record_latency(host, timeouts.connect if isinstance(
+                    e, requests.exceptions.ConnectTimeout) else timeouts.read)
+            breaker.record(e)
+            raise
+        breaker.record()
+        # Decode the HTML once, without detection when the encoding is
+        # declared, and parse the text
+        page = decode_html(response.content, response.headers.get('Content-Type'))
+        scraped_page.fetch_stats = dict(response.stats(), charset=page.encoding,
+                                        charset_source=page.source,
+                                        charset_ms=round(page.seconds * 1000, 3))
+        soup = BeautifulSoup(page.text, 'html.parser')
 
         # Get the page title
         title_tag = soup.find('title')
@@ -59,40 +110,28 @@ def scrape_page_links(scraped_page):
         else:
             scraped_page.title = scraped_page.url
 
-        # Find all anchor tags with href attributes
-        links = soup.find_all('a', href=True)
-
-        # Clear existing links for this page
-        scraped_page.links.all().delete()
-
-        # Process each link
-        links_created = 0
-        for link in links:
-            href = link.get('href')
-            if not href:
-                continue
-
-            # Convert relative URLs to absolute URLs
-            absolute_url = urljoin(scraped_page.url, href)
-
-            # Skip if not a valid URL
-            if not is_valid_url(absolute_url):
-                continue
-
-            # Get link text (could be text or HTML elements)
-            link_text = clean_link_text(link.get_text())
-
-            # Create the PageLink object
-            try:
-                PageLink.objects.get_or_create(
-                    page=scraped_page,
-                    url=absolute_url,
-                    defaults={'name': link_text}
-                )
-                links_created += 1
-            except Exception as e:
-                # Skip duplicate or invalid links
-                continue
+        # Run the page's extractors in a single pass over the document
+        normalizer = LinkNormalizer(scraped_page.url)
+        extracted = run_extractors(soup, scraped_page.extractors, normalizer)
+        found_links = extracted.get(Extractor.LINKS, {})
+
+        scraped_page.canonical_url = extracted.get(Extractor.CANONICAL, '')
+        meta = extracted.get(Extractor.META, {})
+        scraped_page.meta_description = meta.get('description', '')
+        scraped_page.meta_robots = meta.get('robots', '')[:200]
+        store_page_resources(scraped_page, {
+            kind: extracted[kind] for kind in Extractor.RESOURCES if kind in extracted
+        })
+
+        # Replace the stored links for this page
+        links_created = store_page_links(scraped_page, found_links)
+        record_link_domains(scraped_page, found_links)
+        record_scrape(scraped_page, found_links)
+
+        # New links invalidate cached fragments. Bump before marking the
+        # page completed, so it never shows as completed with new links
+        # under the old version.
+        scraped_page.bump_scrape_version()
 
         # Update status to completed
         scraped_page.status = ScrapingStatus.COMPLETED
@@ -102,18 +141,35 @@ def scrape_page_links(scraped_page):
 
         return links_created
 
+    except CircuitOpenError as e:
+        # Nothing was fetched: a queued scrape is deferred, not failed
+        scraped_page.status = ScrapingStatus.PENDING if raise_errors else ScrapingStatus.FAILED
+        scraped_page.error_message = str(e)
+        scraped_page.save()
+        if raise_errors:
+            raise
+        return 0
+
     except requests.exceptions.RequestException as e:
         # Handle network-related errors
         scraped_page.status = ScrapingStatus.FAILED
         scraped_page.error_message = f'Network error: {str(e)}'
+        if not raise_errors:
+            record_failed_scrape(scraped_page)
         scraped_page.save()
+        if raise_errors:
+            raise
         return 0
 
     except Exception as e:
         # Handle other errors
         scraped_page.status = ScrapingStatus.FAILED
         scraped_page.error_message = f'Error: {str(e)}'
+        if not raise_errors:
+            record_failed_scrape(scraped_page)
         scraped_page.save()
+        if raise_errors:
+            raise
         return 0
 
 
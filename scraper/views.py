@@ -1,18 +1,46 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Q, Count
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, require_GET
+from django.views.decorators.gzip import gzip_page
 from django.conf import settings
 from celery.exceptions import WorkerLostError, Retry
-from .models import ScrapedPage, PageLink
-from .forms import CustomUserCreationForm, AddUrlForm, EmailAuthenticationForm
-from .utils import scrape_page_links
-from .tasks import queue_scraping_task, get_queue_stats
-from .constants import ScrapingStatus, PAGES_PER_PAGE, LINKS_PER_PAGE, Messages
+from .models import ScrapedPage, PageLink, Url, DeadLetter
+from .forms import (
+    CustomUserCreationForm, AddUrlForm, EmailAuthenticationForm, SitemapImportForm,
+)
+from .urlnorm import canonicalize_url
+from .tasks import (
+    queue_scraping_task, get_queue_stats, check_links_task, import_sitemap_task,
+    queue_bulk_scrape, dispatch_bulk_scrapes_task, delete_pages_task,
+)
+from .api import (
+    ApiError, paginate, paginate_compact_links, parse_fields, parse_limit, parse_since,
+)
+from .routers import read_from_replica
+from .linkstore import get_page_links, is_compact, CompactLinkList
+from .exports import streaming_export_response, page_link_rows, user_link_rows
+from .connections import get_connection_stats
+from .fragments import cached_page_fragment
+from .linkcheck import get_broken_links
+from .retries import replay_dead_letters
+from .breakers import get_tripped_circuits
+from .fallback import fallback_scrape
+from .deletion import soft_delete_pages
+from .aggregates import get_page_stats, histogram_link_total
+from .scheduling import get_lane_stats
+from .latency import get_tail_latencies
+from .constants import (
+    ScrapingStatus, Extractor, FailureClass, PAGES_PER_PAGE, LINKS_PER_PAGE, Messages, ExportFormat,
+    PAGE_API_FIELDS, PAGE_API_DEFAULT_FIELDS, LINK_API_FIELDS, LINK_API_DEFAULT_FIELDS,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -47,18 +75,16 @@ def handle_scraping_task(scraped_page, request, is_rescrape=False):
         return False
 
 
-def fallback_synchronous_scraping(scraped_page, request):
+def fallback_background_scraping(scraped_page, request):
     """
-    Fallback to synchronous scraping when Celery is unavailable
+    Fallback when Celery is unavailable: scrape on the web server's bounded
+    fallback pool without waiting for it, or leave the page for the queue
+    when that pool is full
     """
-    scraped_page.status = ScrapingStatus.PROCESSING
-    scraped_page.save()
-
-    try:
-        scrape_page_links(scraped_page)
-        messages.success(request, Messages.URL_SCRAPED_SUCCESS)
-    except Exception as scrape_error:
-        messages.error(request, Messages.SCRAPING_FAILED.format(scrape_error))
+    if fallback_scrape(scraped_page):
+        messages.warning(request, Messages.QUEUE_UNAVAILABLE)
+    else:
+        messages.error(request, Messages.SCRAPER_BUSY)
 
 
 def register_view(request):
@@ -110,6 +136,7 @@ def login_view(request):
 
 
 @login_required
+@read_from_replica
 def page_list_view(request):
     """Display list of scraped pages for the current user"""
     pages = ScrapedPage.objects.filter(user=request.user)
@@ -122,8 +149,12 @@ def page_list_view(request):
             Q(url__icontains=search_query)
         )
 
-    # Pagination
-    paginator = Paginator(pages, PAGES_PER_PAGE)
+    # The stats panel reads the aggregates; paging counts the pages, so
+    # drift in the aggregates never hides one
+    stats, top_domains = get_page_stats(request.user)
+
+    # Pagination, with each page's link total from its domain histogram
+    paginator = Paginator(pages.annotate(histogram_links=histogram_link_total()), PAGES_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -135,10 +166,8 @@ def page_list_view(request):
             scraped_page.user = request.user
 
             # Check if URL already exists for this user
-            existing_page = ScrapedPage.objects.filter(
-                user=request.user,
-                url=scraped_page.url
-            ).first()
+            existing_page = ScrapedPage.objects.for_url(
+                request.user, scraped_page.url).first()
 
             if existing_page:
                 messages.warning(request, Messages.URL_ALREADY_EXISTS)
@@ -148,8 +177,7 @@ def page_list_view(request):
 
             # Queue scraping task for background processing
             if not handle_scraping_task(scraped_page, request):
-                # Fallback to synchronous scraping
-                fallback_synchronous_scraping(scraped_page, request)
+                fallback_background_scraping(scraped_page, request)
 
             return redirect('scraper:page_detail', pk=scraped_page.pk)
     else:
@@ -158,39 +186,72 @@ def page_list_view(request):
     context = {
         'page_obj': page_obj,
         'form': form,
+        'sitemap_form': SitemapImportForm(),
         'search_query': search_query,
-        'total_pages': pages.count(),
+        'total_pages': paginator.count,
+        'stats': stats,
+        'top_domains': top_domains,
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     }
 
     return render(request, 'scraper/page_list.html', context)
 
 
 @login_required
+@read_from_replica
 def page_detail_view(request, pk):
     """Display details of a specific scraped page and its links"""
     page = get_object_or_404(ScrapedPage, pk=pk, user=request.user)
-    links = page.links.all()
 
     # Search functionality for links
     search_query = request.GET.get('search', '')
-    if search_query:
-        links = links.filter(
-            Q(name__icontains=search_query) |
-            Q(url__icontains=search_query)
-        )
-
-    # Pagination for links
-    paginator = Paginator(links, LINKS_PER_PAGE)
     page_number = request.GET.get('page')
-    links_page_obj = paginator.get_page(page_number)
+    broken_only = request.GET.get('broken') == '1'
+
+    def render_links():
+        if broken_only:
+            links = get_broken_links(page, search_query)
+        else:
+            links = get_page_links(page, search_query)
+
+        # Pagination for links
+        paginator = Paginator(links, LINKS_PER_PAGE)
+        links_page_obj = paginator.get_page(page_number)
+        total_links = paginator.count
+
+        html = render_to_string('scraper/includes/page_links.html', {
+            'page': page,
+            'links_page_obj': links_page_obj,
+            'search_query': search_query,
+            'broken_only': broken_only,
+            'total_links': total_links,
+        })
+        return {'html': html, 'total_links': total_links}
+
+    if broken_only:
+        # Check results change without a re-scrape, so they are never cached
+        links_fragment = render_links()
+    else:
+        # Completed pages are served from the fragment cache without touching
+        # their links until the next scrape bumps the page's scrape_version
+        links_fragment = cached_page_fragment(
+            page, 'page_links', [search_query, page_number], render_links)
 
     context = {
         'page': page,
-        'links_page_obj': links_page_obj,
+        'links_html': mark_safe(links_fragment['html']),
         'search_query': search_query,
-        'total_links': links.count(),
+        'broken_only': broken_only,
+        'total_links': links_fragment['total_links'],
     }
 
+    if page.status == ScrapingStatus.COMPLETED and set(page.extractors) & set(Extractor.RESOURCES):
+        context['resources_html'] = mark_safe(cached_page_fragment(
+            page, 'page_resources', [],
+            lambda: render_to_string('scraper/includes/page_resources.html', {
+                'resources': page.resources.select_related('target'),
+            })))
+
     return render(request, 'scraper/page_detail.html', context)
 
 
@@ -207,13 +268,63 @@ def rescrape_page_view(request, pk):
 
     # Queue scraping task for background processing
     if not handle_scraping_task(page, request, is_rescrape=True):
-        # Fallback to synchronous scraping
-        fallback_synchronous_scraping(page, request)
+        fallback_background_scraping(page, request)
 
     return redirect('scraper:page_detail', pk=page.pk)
 
 
+def queue_link_check(request, **target):
+    """Queue a link check for a page or a user"""
+    # Checking every link of a user is a network scan of unbounded size,
+    # so there is no synchronous fallback when the queue is unavailable
+    try:
+        check_links_task.delay(**target)
+        messages.success(request, Messages.LINK_CHECK_QUEUED)
+    except Exception as e:
+        logger.error(Messages.QUEUE_LINK_CHECK_FAILED.format(e))
+        messages.error(request, Messages.QUEUE_LINK_CHECK_FAILED.format(e))
+
+
+@login_required
+@require_POST
+def check_page_links_view(request, pk):
+    """Check the health of every link of a page"""
+    page = get_object_or_404(ScrapedPage, pk=pk, user=request.user)
+    queue_link_check(request, page_id=page.pk)
+    return redirect(f"{reverse('scraper:page_detail', kwargs={'pk': page.pk})}?broken=1")
+
+
+@login_required
+@require_POST
+def check_user_links_view(request):
+    """Check the health of the links of all of the user's pages"""
+    queue_link_check(request, user_id=request.user.pk)
+    return redirect('scraper:page_list')
+
+
+@login_required
+@require_POST
+def import_sitemap_view(request):
+    """Import the pages listed in a sitemap in the background"""
+    form = SitemapImportForm(request.POST)
+    if not form.is_valid():
+        for error in form.errors.get('url', []):
+            messages.error(request, error)
+        return redirect('scraper:page_list')
+
+    # A sitemap can list millions of URLs, so there is no synchronous
+    # fallback when the queue is unavailable
+    try:
+        import_sitemap_task.delay(request.user.pk, form.cleaned_data['url'])
+        messages.success(request, Messages.SITEMAP_IMPORT_QUEUED)
+    except Exception as e:
+        logger.error(Messages.QUEUE_SITEMAP_FAILED.format(e))
+        messages.error(request, Messages.QUEUE_SITEMAP_FAILED.format(e))
+    return redirect('scraper:page_list')
+
+
 @login_required
+@read_from_replica
 def page_status_api(request, pk):
     """API endpoint to check page scraping status"""
     page = get_object_or_404(ScrapedPage, pk=pk, user=request.user)
@@ -226,19 +337,185 @@ def page_status_api(request, pk):
     })
 
 
+@login_required
+@read_from_replica
+@require_GET
+@gzip_page
+def pages_api(request):
+    """JSON list of the current user's pages with cursor pagination"""
+    pages = ScrapedPage.objects.filter(user=request.user)
+
+    try:
+        status = request.GET.get('status')
+        if status:
+            pages = pages.filter(status=status)
+
+        updated_since = parse_since(request.GET.get('updated_since'))
+        if updated_since:
+            pages = pages.filter(updated_at__gte=updated_since)
+
+        data = paginate(
+            pages,
+            parse_fields(request.GET.get('fields'),
+                         PAGE_API_FIELDS, PAGE_API_DEFAULT_FIELDS),
+            request.GET.get('cursor'),
+            parse_limit(request.GET.get('limit')),
+            descending=True,
+        )
+    except ApiError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse(data)
+
+
+@login_required
+@read_from_replica
+@require_GET
+@gzip_page
+def page_links_api(request, pk):
+    """JSON list of the links of a page with cursor pagination"""
+    links = PageLink.objects.filter(
+        page_id=pk, page__user=request.user, page__deleted_at__isnull=True)
+
+    try:
+        data = paginate(
+            links,
+            parse_fields(request.GET.get('fields'),
+                         LINK_API_FIELDS, LINK_API_DEFAULT_FIELDS),
+            request.GET.get('cursor'),
+            parse_limit(request.GET.get('limit')),
+        )
+    except ApiError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Only look at the page itself when there are no link rows to show
+    if not data['results']:
+        page = ScrapedPage.objects.filter(pk=pk, user=request.user).only(
+            'id', 'link_storage').first()
+        if page is None:
+            return JsonResponse({'error': 'Page not found.'}, status=404)
+        if is_compact(page):
+            try:
+                data = paginate_compact_links(
+                    CompactLinkList(page),
+                    parse_fields(request.GET.get('fields'),
+                                 LINK_API_FIELDS, LINK_API_DEFAULT_FIELDS),
+                    request.GET.get('cursor'),
+                    parse_limit(request.GET.get('limit')),
+                )
+            except ApiError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse(data)
+
+
+@login_required
+@read_from_replica
+@require_GET
+@gzip_page
+def backlinks_api(request):
+    """JSON list of the current user's pages that link to ?url="""
+    url = canonicalize_url(request.GET.get('url', '').strip())
+    if not url:
+        return JsonResponse({'error': 'A valid http(s) url is required.'}, status=400)
+
+    target = Url.objects.lookup(url)
+    if target is None:
+        return JsonResponse({'url': url, 'results': [], 'next_cursor': None})
+
+    pages = ScrapedPage.objects.filter(user=request.user, links__target=target)
+
+    try:
+        data = paginate(
+            pages,
+            parse_fields(request.GET.get('fields'),
+                         PAGE_API_FIELDS, PAGE_API_DEFAULT_FIELDS),
+            request.GET.get('cursor'),
+            parse_limit(request.GET.get('limit')),
+            descending=True,
+        )
+    except ApiError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({'url': url, **data})
+
+
 @login_required
 def delete_page_view(request, pk):
     """Delete a scraped page"""
     page = get_object_or_404(ScrapedPage, pk=pk, user=request.user)
 
     if request.method == 'POST':
-        page.delete()
+        queue_page_deletion(soft_delete_pages(request.user, [page.pk]))
         messages.success(request, Messages.PAGE_DELETED_SUCCESS)
         return redirect('scraper:page_list')
 
     return render(request, 'scraper/confirm_delete.html', {'page': page})
 
 
+@login_required
+@require_POST
+def delete_pages_view(request):
+    """Delete the pages selected in the page list"""
+    page_ids = [pk for pk in request.POST.getlist('page_ids') if pk.isdigit()]
+    deleted = soft_delete_pages(request.user, page_ids)
+    if deleted:
+        queue_page_deletion(deleted)
+        messages.success(request, Messages.PAGES_DELETED_SUCCESS.format(len(deleted)))
+    else:
+        messages.error(request, Messages.NO_PAGES_SELECTED)
+    return redirect('scraper:page_list')
+
+
+def queue_page_deletion(page_ids):
+    """
+    Purge deleted pages in the background. They are already hidden, so if
+    the queue is unavailable the purge sweep picks them up later instead.
+    """
+    try:
+        delete_pages_task.delay(page_ids)
+    except Exception as e:
+        logger.error(Messages.QUEUE_DELETE_FAILED.format(e))
+
+
+def get_export_options(request):
+    """Read the export format and gzip flag from the query string"""
+    export_format = request.GET.get('format', ExportFormat.CSV)
+    if export_format not in ExportFormat.CHOICES:
+        export_format = ExportFormat.CSV
+    compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes', 'on')
+    return export_format, compress
+
+
+@login_required
+def export_page_links_view(request, pk):
+    """Stream every link of a page as CSV or JSON Lines"""
+    page = get_object_or_404(ScrapedPage, pk=pk, user=request.user)
+    export_format, compress = get_export_options(request)
+
+    return streaming_export_response(
+        page_link_rows(page),
+        ('url', 'name'),
+        f'page-{page.pk}-links',
+        export_format,
+        compress=compress,
+    )
+
+
+@login_required
+def export_user_links_view(request):
+    """Stream every link of every page owned by the current user"""
+    export_format, compress = get_export_options(request)
+
+    return streaming_export_response(
+        user_link_rows(request.user),
+        ('page_url', 'url', 'name'),
+        'all-links',
+        export_format,
+        compress=compress,
+    )
+
+
 @login_required
 def queue_status_view(request):
     """Display Celery queue status and statistics"""
@@ -248,7 +525,12 @@ def queue_status_view(request):
             'active_tasks', 0) >= 0 and 'error' not in stats
         context = {
             'queue_stats': stats,
-            'celery_available': celery_available
+            'celery_available': celery_available,
+            'connection_stats': get_connection_stats(),
+            'dead_letters': dead_letter_counts(request.user),
+            'tripped_circuits': get_tripped_circuits(),
+            'host_latencies': get_tail_latencies(),
+            'lanes': get_lane_stats(),
         }
     except Exception as e:
         logger.error(f"Failed to get queue stats: {str(e)}")
@@ -261,6 +543,36 @@ def queue_status_view(request):
     return render(request, 'scraper/queue_status.html', context)
 
 
+def dead_letter_counts(user):
+    """Pending dead letters of a user's pages, per failure class"""
+    counts = dict(
+        DeadLetter.objects.filter(
+            page__user=user, page__deleted_at__isnull=True, replayed_at__isnull=True)
+        .values_list('failure_class').annotate(total=Count('id')).order_by()
+    )
+    return [(name, counts.get(name, 0)) for name in FailureClass.CHOICES]
+
+
+@login_required
+@require_POST
+def replay_dead_letters_view(request):
+    """Queue the user's dead-lettered pages, optionally of one failure class, again"""
+    dead_letters = DeadLetter.objects.filter(
+        page__user=request.user, page__deleted_at__isnull=True)
+    failure_class = request.POST.get('failure_class')
+    if failure_class in FailureClass.CHOICES:
+        dead_letters = dead_letters.filter(failure_class=failure_class)
+
+    try:
+        queued = replay_dead_letters(dead_letters, queue_bulk_scrape)
+        dispatch_bulk_scrapes_task()
+        messages.success(request, Messages.DEAD_LETTERS_REPLAYED.format(queued))
+    except Exception as e:
+        logger.error(Messages.QUEUE_TASK_FAILED.format(e))
+        messages.error(request, Messages.QUEUE_TASK_FAILED.format(e))
+    return redirect('scraper:queue_status')
+
+
 def logout_view(request):
     """Custom logout view that handles both GET and POST requests"""
     logout(request)
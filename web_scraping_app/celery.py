@@ -13,9 +13,9 @@ app.autodiscover_tasks()
 app.conf.update(
     task_routes={
         'scraper.tasks.scrape_page_task': {'queue': 'scraping'},
+        'scraper.tasks.import_sitemap_task': {'queue': 'scraping'},
     },
     worker_hijack_root_logger=False,
-    worker_preload=True,
 )
 
 
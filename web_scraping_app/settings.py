@@ -1,7 +1,9 @@
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables from .env file
 load_dotenv()
@@ -40,7 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'scraper.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'scraper.middleware.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -49,6 +53,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Report the database queries of each request in an X-Query-Count header,
+# for load tests (python manage.py loadtest_views)
+REPORT_QUERY_COUNT = os.getenv(
+    'REPORT_QUERY_COUNT', 'False').lower() in ('true', '1', 'yes', 'on')
+
 ROOT_URLCONF = 'web_scraping_app.urls'
 
 TEMPLATES = [
@@ -75,10 +84,72 @@ WSGI_APPLICATION = 'web_scraping_app.wsgi.application'
 
 DATABASE_URL = os.getenv(
     'DATABASE_URL', f'sqlite:///{BASE_DIR / "db.sqlite3"}')
+
+# Keep connections open between requests and tasks for this many seconds
+# (0 closes them after each one) and ping a reused connection before using it
+DATABASE_CONN_MAX_AGE = int(os.getenv('DATABASE_CONN_MAX_AGE', '60'))
+DATABASE_CONN_HEALTH_CHECKS = os.getenv(
+    'DATABASE_CONN_HEALTH_CHECKS', 'True').lower() == 'true'
+
+# Optional psycopg 3 connection pool for PostgreSQL, used instead of
+# persistent connections when DATABASE_POOL_MAX_SIZE is set. It needs
+# psycopg[pool], which is not in requirements.txt because once installed
+# Django uses psycopg 3 instead of psycopg2, the driver psycogreen patches
+DATABASE_POOL_MIN_SIZE = int(os.getenv('DATABASE_POOL_MIN_SIZE', '1'))
+DATABASE_POOL_MAX_SIZE = int(os.getenv('DATABASE_POOL_MAX_SIZE', '0'))
+
+
+def database_config(url):
+    config = dj_database_url.parse(
+        url,
+        conn_max_age=DATABASE_CONN_MAX_AGE,
+        conn_health_checks=DATABASE_CONN_HEALTH_CHECKS,
+    )
+    if DATABASE_POOL_MAX_SIZE and config['ENGINE'] == 'django.db.backends.postgresql':
+        if find_spec('psycopg_pool') is None:
+            raise ImproperlyConfigured(
+                'DATABASE_POOL_MAX_SIZE needs psycopg 3 with its connection pool, '
+                'install it with: pip install "psycopg[pool]"')
+        # Django refuses persistent connections together with a pool
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DATABASE_POOL_MIN_SIZE,
+            'max_size': DATABASE_POOL_MAX_SIZE,
+        }
+    return config
+
+
 DATABASES = {
-    'default': dj_database_url.parse(DATABASE_URL)
+    'default': database_config(DATABASE_URL)
 }
 
+# Optional read replica used by read-only views
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+DATABASE_READ_REPLICAS = []
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = database_config(DATABASE_REPLICA_URL)
+    DATABASE_READ_REPLICAS.append('replica')
+
+DATABASE_ROUTERS = ['scraper.routers.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after it wrote something
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '10'))
+
+# Cache for rendered page fragments: local memory per process by default,
+# or a Redis cache shared by every web process when FRAGMENT_CACHE_URL is set
+FRAGMENT_CACHE_URL = os.getenv('FRAGMENT_CACHE_URL')
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', '86400'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': ('django.core.cache.backends.redis.RedisCache' if FRAGMENT_CACHE_URL
+                    else 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': FRAGMENT_CACHE_URL or 'fragments',
+        'TIMEOUT': FRAGMENT_CACHE_TIMEOUT,
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -130,9 +201,11 @@ AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
 # Celery Configuration
-CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
@@ -141,6 +214,16 @@ CELERY_TIMEZONE = 'UTC'
 # Task routing
 CELERY_TASK_ROUTES = {
     'scraper.tasks.scrape_page_task': {'queue': 'scraping'},
+    'scraper.tasks.import_sitemap_task': {'queue': 'scraping'},
+}
+# Workers consuming several queues take from the first non-empty one in
+# the order given, so interactive scrapes go before bulk ones. Connecting
+# to the broker gives up after CELERY_BROKER_CONNECT_TIMEOUT seconds, so a
+# page added while it is down falls back to scraping in process quickly.
+CELERY_BROKER_CONNECT_TIMEOUT = float(os.getenv('CELERY_BROKER_CONNECT_TIMEOUT', '2'))
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'socket_connect_timeout': CELERY_BROKER_CONNECT_TIMEOUT,
 }
 
 # Task configuration
@@ -153,10 +236,101 @@ CELERY_WORKER_PREFETCH_MULTIPLIER = int(
 CELERY_TASK_ACKS_LATE = os.getenv(
     'CELERY_TASK_ACKS_LATE', 'True').lower() == 'true'
 
+# Scheduled re-scraping: every page is re-checked at an interval that follows
+# its observed change rate, bounded by these limits (seconds)
+REFRESH_MIN_INTERVAL = int(os.getenv('REFRESH_MIN_INTERVAL', '3600'))
+REFRESH_MAX_INTERVAL = int(os.getenv('REFRESH_MAX_INTERVAL', '604800'))
+# Due pages are enqueued by a sweep every REFRESH_SWEEP_INTERVAL seconds, at
+# most REFRESH_SWEEP_BATCH_SIZE per sweep, spread evenly until the next one
+REFRESH_SWEEP_INTERVAL = int(os.getenv('REFRESH_SWEEP_INTERVAL', '300'))
+REFRESH_SWEEP_BATCH_SIZE = int(os.getenv('REFRESH_SWEEP_BATCH_SIZE', '200'))
+
+# Link health checks: each distinct URL is checked at most once per TTL
+# (seconds), with at most LINK_CHECK_CONCURRENCY requests in flight and
+# LINK_CHECK_PER_HOST of them to any one host
+LINK_CHECK_TTL = int(os.getenv('LINK_CHECK_TTL', '86400'))
+LINK_CHECK_CONCURRENCY = int(os.getenv('LINK_CHECK_CONCURRENCY', '100'))
+LINK_CHECK_PER_HOST = int(os.getenv('LINK_CHECK_PER_HOST', '4'))
+LINK_CHECK_TIMEOUT = int(os.getenv('LINK_CHECK_TIMEOUT', '10'))
+
+# Transient scrape failures are retried up to SCRAPING_MAX_RETRIES times,
+# waiting a random time up to SCRAPE_RETRY_BASE_DELAY * 2 ** retry seconds,
+# capped at SCRAPE_RETRY_MAX_DELAY (which also caps Retry-After)
+SCRAPE_RETRY_BASE_DELAY = int(os.getenv('SCRAPE_RETRY_BASE_DELAY', '30'))
+SCRAPE_RETRY_MAX_DELAY = int(os.getenv('SCRAPE_RETRY_MAX_DELAY', '3600'))
+
+# A host's circuit opens after CIRCUIT_FAILURE_THRESHOLD transient failures
+# within CIRCUIT_FAILURE_WINDOW seconds; scrapes of the host are then
+# deferred for CIRCUIT_OPEN_SECONDS before a single probe is let through
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_FAILURE_WINDOW = int(os.getenv('CIRCUIT_FAILURE_WINDOW', '60'))
+CIRCUIT_OPEN_SECONDS = int(os.getenv('CIRCUIT_OPEN_SECONDS', '120'))
+
+# Connections kept alive per host by the shared scraping HTTP session; set
+# it to the worker concurrency when running a threads or gevent pool
+SCRAPER_HTTP_POOL_SIZE = int(os.getenv('SCRAPER_HTTP_POOL_SIZE', '10'))
+
+# Library used to fetch pages: 'requests' (HTTP/1.1) or 'httpx' (HTTP/2 where
+# the origin supports it, multiplexing fetches over one connection per origin)
+SCRAPER_FETCH_BACKEND = os.getenv('SCRAPER_FETCH_BACKEND', 'requests')
+
+# When a scrape cannot be queued, each web process scrapes it on a pool of
+# SCRAPE_FALLBACK_WORKERS threads with at most SCRAPE_FALLBACK_QUEUE_SIZE
+# waiting, and refuses more. Pages it did not get to are published to
+# Celery SCRAPE_FALLBACK_GRACE seconds later, every SCRAPE_RECONCILE_INTERVAL
+SCRAPE_FALLBACK_WORKERS = int(os.getenv('SCRAPE_FALLBACK_WORKERS', '2'))
+SCRAPE_FALLBACK_QUEUE_SIZE = int(os.getenv('SCRAPE_FALLBACK_QUEUE_SIZE', '8'))
+SCRAPE_FALLBACK_GRACE = int(os.getenv('SCRAPE_FALLBACK_GRACE', '300'))
+SCRAPE_RECONCILE_INTERVAL = int(os.getenv('SCRAPE_RECONCILE_INTERVAL', '60'))
+
+# Bulk scrapes are dispatched round-robin between users, with at most
+# SCRAPE_BULK_IN_FLIGHT queued or running at once (keep it below the
+# scraping worker's concurrency so interactive scrapes always find room)
+# and SCRAPE_USER_IN_FLIGHT per user. A slot is freed when its scrape ends,
+# or after SCRAPE_SLOT_LEASE seconds if the worker died. Interactive scrapes
+# aim to start within SCRAPE_INTERACTIVE_WAIT_TARGET seconds.
+SCRAPE_BULK_IN_FLIGHT = int(os.getenv('SCRAPE_BULK_IN_FLIGHT', '80'))
+SCRAPE_USER_IN_FLIGHT = int(os.getenv('SCRAPE_USER_IN_FLIGHT', '20'))
+SCRAPE_SLOT_LEASE = int(os.getenv('SCRAPE_SLOT_LEASE', '600'))
+SCRAPE_DISPATCH_INTERVAL = int(os.getenv('SCRAPE_DISPATCH_INTERVAL', '10'))
+SCRAPE_INTERACTIVE_WAIT_TARGET = int(os.getenv('SCRAPE_INTERACTIVE_WAIT_TARGET', '5'))
+
+# Deleted pages are hidden at once and purged by a task; pages whose task
+# was never queued or did not finish are purged by a sweep every
+# PAGE_PURGE_INTERVAL seconds once they have been deleted that long
+PAGE_PURGE_INTERVAL = int(os.getenv('PAGE_PURGE_INTERVAL', '300'))
+
+CELERY_BEAT_SCHEDULE = {
+    'refresh-due-pages': {
+        'task': 'scraper.tasks.refresh_due_pages',
+        'schedule': REFRESH_SWEEP_INTERVAL,
+    },
+    'reconcile-pending-enqueues': {
+        'task': 'scraper.tasks.reconcile_pending_enqueues',
+        'schedule': SCRAPE_RECONCILE_INTERVAL,
+    },
+    'dispatch-bulk-scrapes': {
+        'task': 'scraper.tasks.dispatch_bulk_scrapes_task',
+        'schedule': SCRAPE_DISPATCH_INTERVAL,
+    },
+    'purge-deleted-pages': {
+        'task': 'scraper.tasks.purge_deleted_pages',
+        'schedule': PAGE_PURGE_INTERVAL,
+    },
+}
+
 # Scraping Configuration
+# Fetch timeout for hosts without enough latency samples; other hosts get
+# deadlines from their observed p50 (connect) and p99 (read), bounded by
+# SCRAPING_TIMEOUT_MIN, SCRAPING_CONNECT_TIMEOUT_MAX and SCRAPING_TIMEOUT_MAX
 SCRAPING_TIMEOUT = int(os.getenv('SCRAPING_TIMEOUT', '30'))
+SCRAPING_TIMEOUT_MIN = float(os.getenv('SCRAPING_TIMEOUT_MIN', '2'))
+SCRAPING_TIMEOUT_MAX = float(os.getenv('SCRAPING_TIMEOUT_MAX', '60'))
+SCRAPING_CONNECT_TIMEOUT_MAX = float(os.getenv('SCRAPING_CONNECT_TIMEOUT_MAX', '10'))
 SCRAPING_MAX_RETRIES = int(os.getenv('SCRAPING_MAX_RETRIES', '3'))
 SCRAPING_DELAY = int(os.getenv('SCRAPING_DELAY', '1'))
+# Pages with at least this many links store them as compressed chunks
+COMPACT_LINK_THRESHOLD = int(os.getenv('COMPACT_LINK_THRESHOLD', '50000'))
 
 # Development - no security restrictions needed
 